@@ -1079,20 +1079,31 @@ class BacktestEngine:
             BacktestResult
         """
         from strategy.engine import StrategyEngine
+        from strategy.sandbox import StrategyError
         
         engine = StrategyEngine()
+        # 回测开始前编译一次（结果进入共享编译缓存，每个交易日直接复用）；
+        # 编译失败的代码每个交易日都会失败，直接跳过执行，不再逐日重复编译
+        try:
+            engine.executor.compile_code(strategy_code)
+            compiled = True
+        except StrategyError:
+            compiled = False
         # 解析本地 config，便于把归一化开关透传给 StrategyEngine.execute
         # （修复：之前没传，导致策略层总是默认归一化到 100%，
         #  使得 run_dynamic 里 cfg.normalize_weights 的 if/else 两条分支输出一致）
         cfg = config or self.config
         
         def strategy_func(ctx, current_date):
+            if not compiled:
+                return None
             result = engine.execute(
                 code=strategy_code,
                 tickers=ctx.tickers,
                 current_weights=ctx.get_current_weights(),
                 current_date=current_date,
                 normalize_weights=cfg.normalize_weights,
+                verbose=False,  # 回测只取目标权重，不构建策略日志
             )
             
             if result.success:
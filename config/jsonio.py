@@ -0,0 +1,75 @@
+"""
+JSON file helpers shared by the portfolio and strategy stores.
+Uses orjson when installed; the on-disk format is the same either way.
+"""
+
+import json
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，缺失时退回标准库 json
+    orjson = None
+
+
+def _default(obj):
+    """Convert numpy scalars (e.g. np.float64 weights) to Python numbers."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data) -> bytes:
+    """Serialize data to indented (2 spaces) UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def dumps_line(data) -> bytes:
+    """Serialize data to a single-line UTF-8 JSON record (for journals)."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def loads(raw: bytes):
+    """Parse UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def read_journal(path: Path) -> List[dict]:
+    """
+    Read the journal entries in order, stopping at the first unparseable line.
+
+    A torn tail (partial line left by an interrupted append) is truncated
+    away, so records appended afterwards start on a fresh line.
+
+    Raises:
+        FileNotFoundError: If there is no journal
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    entries = []
+    good = 0
+    for line in raw.splitlines(keepends=True):
+        try:
+            entries.append(loads(line))
+        except Exception:
+            break  # 末尾可能是写入中断的半行，忽略其后内容
+        good += len(line)
+
+    if good < len(raw) or (raw and not raw.endswith(b'\n')):
+        # 截掉半行并补齐换行，否则下一次追加会接在半行后面而无法解析
+        with open(path, 'r+b') as f:
+            f.truncate(good)
+            if good and not raw[:good].endswith(b'\n'):
+                f.seek(good)
+                f.write(b'\n')
+    return entries
@@ -33,10 +33,13 @@ class DataFetcher:
         self.cache_expiry_hours = settings.cache_expiry_hours
         self.cache_dir.mkdir(parents=True, exist_ok=True)
     
-    def _get_cache_path(self, tickers: List[str], start: str, end: str) -> Path:
+    def _get_cache_path(self, tickers: List[str], start: str, end: str, raw: bool = False) -> Path:
         """Generate cache file path based on request parameters."""
         # Create a unique hash for the request
         key = f"{sorted(tickers)}_{start}_{end}"
+        if raw:
+            # 未填充的数据单独缓存，避免与已填充结果互相覆盖
+            key += "_raw"
         hash_key = hashlib.md5(key.encode()).hexdigest()[:12]
         return self.cache_dir / f"prices_{hash_key}.parquet"
     
@@ -97,7 +100,8 @@ class DataFetcher:
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
         lookback_days: int = 252,
-        use_cache: bool = True
+        use_cache: bool = True,
+        fill: bool = True
     ) -> pd.DataFrame:
         """
         Fetch adjusted close prices for given tickers.
@@ -108,13 +112,14 @@ class DataFetcher:
             end_date: End date (YYYY-MM-DD format)
             lookback_days: If start_date not provided, look back this many days
             use_cache: Whether to use local cache
+            fill: Forward/back-fill gaps on the combined calendar; with False,
+                  each ticker is NaN on dates it did not trade
             
         Returns:
             DataFrame with tickers as columns and dates as index
         """
-        # Normalize tickers to list
-        if isinstance(tickers, str):
-            tickers = [tickers]
+        # Normalize tickers to list (tuples would be treated as a single key by pandas)
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
         
         # Calculate date range
         if end_date is None:
@@ -125,7 +130,7 @@ class DataFetcher:
             start_date = start_dt.strftime('%Y-%m-%d')
         
         # Check cache
-        cache_path = self._get_cache_path(tickers, start_date, end_date)
+        cache_path = self._get_cache_path(tickers, start_date, end_date, raw=not fill)
         
         if use_cache and self._is_cache_valid(cache_path):
             try:
@@ -172,7 +177,8 @@ class DataFetcher:
             
             # Clean data
             prices = prices.dropna(axis=1, how='all')
-            prices = prices.ffill().bfill()
+            if fill:
+                prices = prices.ffill().bfill()
             
             # Cache the result
             if use_cache and not prices.empty:
@@ -187,6 +193,46 @@ class DataFetcher:
             print(f"Error fetching data: {e}")
             return pd.DataFrame()
     
+    def fetch_prices_batch(
+        self,
+        tickers: List[str],
+        end_date: Optional[str] = None,
+        lookback_days: int = 252,
+        use_cache: bool = True
+    ) -> pd.DataFrame:
+        """
+        Fetch adjusted close prices for many tickers in a single request.
+        
+        Unlike fetch_prices, the result always has one column per requested
+        ticker (in request order); tickers without data are all-NaN columns.
+        Gaps are not filled: on the union calendar each column is NaN outside
+        its own trading days, so callers can recover every ticker's real bars
+        with dropna().
+        
+        Args:
+            tickers: List of tickers
+            end_date: End date (YYYY-MM-DD format)
+            lookback_days: Look back this many days from end_date
+            use_cache: Whether to use local cache
+            
+        Returns:
+            DataFrame with one column per ticker and dates as index
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return pd.DataFrame()
+        
+        df = self.fetch_prices(
+            tickers,
+            end_date=end_date,
+            lookback_days=lookback_days,
+            use_cache=use_cache,
+            fill=False
+        )
+        if isinstance(df, pd.Series):
+            df = df.to_frame(name=tickers[0])
+        return df.reindex(columns=tickers)
+    
     def fetch_vix(
         self,
         start_date: Optional[str] = None,
@@ -7,6 +7,153 @@ import numpy as np
 import pandas as pd
 from typing import Optional, Union
 
+try:
+    from numba import njit
+except ImportError:  # numba 是可选依赖，缺失时使用 pandas 实现
+    njit = None
+
+
+# ---------------------------------------------------------------------------
+# 单序列指标内核（float64 ndarray，无 NaN），语义与下方 pandas 实现一致。
+# 仅在安装了 numba 时启用；纯 Python 循环版本只用于测试对照。
+# ---------------------------------------------------------------------------
+
+def _sma_kernel(arr, period):
+    """Rolling mean with min_periods=1 via a running-sum update."""
+    n = arr.shape[0]
+    out = np.empty(n)
+    s = 0.0
+    for i in range(n):
+        s += arr[i]
+        if i >= period:
+            s -= arr[i - period]
+            out[i] = s / period
+        else:
+            out[i] = s / (i + 1)
+    return out
+
+
+def _ema_kernel(arr, period):
+    """EMA with span=period, adjust=False."""
+    n = arr.shape[0]
+    out = np.empty(n)
+    if n == 0:
+        return out
+    alpha = 2.0 / (period + 1.0)
+    out[0] = arr[0]
+    for i in range(1, n):
+        out[i] = alpha * arr[i] + (1.0 - alpha) * out[i - 1]
+    return out
+
+
+def _macd_kernel(arr, fast_period, slow_period, signal_period):
+    """MACD line, signal and histogram (EMAs with adjust=False) in one pass."""
+    n = arr.shape[0]
+    out = np.empty((n, 3))
+    if n == 0:
+        return out
+    a_fast = 2.0 / (fast_period + 1.0)
+    a_slow = 2.0 / (slow_period + 1.0)
+    a_signal = 2.0 / (signal_period + 1.0)
+    fast = arr[0]
+    slow = arr[0]
+    signal = fast - slow
+    for i in range(n):
+        if i > 0:
+            fast = a_fast * arr[i] + (1.0 - a_fast) * fast
+            slow = a_slow * arr[i] + (1.0 - a_slow) * slow
+            signal = a_signal * (fast - slow) + (1.0 - a_signal) * signal
+        out[i, 0] = fast - slow
+        out[i, 1] = signal
+        out[i, 2] = out[i, 0] - signal
+    return out
+
+
+def _rsi_kernel(arr, period):
+    """RSI from adjusted EWM (com=period-1, min_periods=period) of gains/losses."""
+    n = arr.shape[0]
+    out = np.empty(n)
+    decay = 1.0 - 1.0 / period
+    num_gain = 0.0
+    num_loss = 0.0
+    den = 0.0
+    for i in range(n):
+        gain = 0.0
+        loss = 0.0
+        if i > 0:
+            delta = arr[i] - arr[i - 1]
+            if delta > 0:
+                gain = delta
+            elif delta < 0:
+                loss = -delta
+        num_gain = gain + decay * num_gain
+        num_loss = loss + decay * num_loss
+        den = 1.0 + decay * den
+        if i + 1 < period:
+            out[i] = 50.0
+            continue
+        avg_gain = num_gain / den
+        avg_loss = num_loss / den
+        if avg_loss == 0.0:
+            # 0/0 在 pandas 中为 NaN → 填充 50；x/0 为 inf → RSI 100
+            out[i] = 50.0 if avg_gain == 0.0 else 100.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return out
+
+
+def _rsi_last_kernel(arr, period):
+    """Latest value of _rsi_kernel(arr, period) without building the series."""
+    n = arr.shape[0]
+    if n < period:
+        return 50.0
+    decay = 1.0 - 1.0 / period
+    num_gain = 0.0
+    num_loss = 0.0
+    den = 1.0
+    for i in range(1, n):
+        delta = arr[i] - arr[i - 1]
+        num_gain *= decay
+        num_loss *= decay
+        if delta > 0:
+            num_gain += delta
+        elif delta < 0:
+            num_loss -= delta
+        den = 1.0 + decay * den
+    avg_gain = num_gain / den
+    avg_loss = num_loss / den
+    if avg_loss == 0.0:
+        return 50.0 if avg_gain == 0.0 else 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+if njit is not None:
+    # 显式签名：导入时即编译（cache=True 时从磁盘缓存加载），
+    # 避免首次调用策略时才触发 JIT 编译
+    _sma_kernel = njit('float64[:](float64[:], int64)', cache=True)(_sma_kernel)
+    _ema_kernel = njit('float64[:](float64[:], int64)', cache=True)(_ema_kernel)
+    _rsi_kernel = njit('float64[:](float64[:], int64)', cache=True)(_rsi_kernel)
+    _macd_kernel = njit('float64[:, :](float64[:], int64, int64, int64)', cache=True)(_macd_kernel)
+    _rsi_last_kernel = njit('float64(float64[:], int64)', cache=True)(_rsi_last_kernel)
+
+
+# pandas rolling/ewm 聚合的执行引擎参数：安装了 numba 时使用 JIT 引擎（首次调用编译，
+# 之后复用缓存），否则为空，沿用默认的 Cython 实现
+_WINDOW_ENGINE = (
+    {'engine': 'numba', 'engine_kwargs': {'nopython': True, 'nogil': True, 'parallel': False}}
+    if njit is not None else {}
+)
+
+
+def _kernel_input(data) -> Optional[np.ndarray]:
+    """Return a float64 array for the numba fast path, or None to use pandas."""
+    if njit is None or not isinstance(data, pd.Series):
+        return None
+    arr = data.to_numpy(dtype=np.float64)
+    if np.isnan(arr).any():
+        return None
+    return arr
+
 
 class TechnicalIndicators:
     """
@@ -26,6 +173,9 @@ class TechnicalIndicators:
         Returns:
             SMA series
         """
+        arr = _kernel_input(data)
+        if arr is not None:
+            return pd.Series(_sma_kernel(arr, period), index=data.index, name=data.name)
         return data.rolling(window=period, min_periods=1).mean()
     
     @staticmethod
@@ -40,6 +190,9 @@ class TechnicalIndicators:
         Returns:
             EMA series
         """
+        arr = _kernel_input(data)
+        if arr is not None:
+            return pd.Series(_ema_kernel(arr, period), index=data.index, name=data.name)
         return data.ewm(span=period, adjust=False).mean()
     
     @staticmethod
@@ -54,6 +207,10 @@ class TechnicalIndicators:
         Returns:
             RSI series (0-100)
         """
+        arr = _kernel_input(data)
+        if arr is not None:
+            return pd.Series(_rsi_kernel(arr, period), index=data.index, name=data.name)
+        
         delta = data.diff()
         
         gain = delta.where(delta > 0, 0.0)
@@ -67,6 +224,25 @@ class TechnicalIndicators:
         
         return rsi.fillna(50)  # Fill initial NaN with neutral value
     
+    @staticmethod
+    def rsi_last(data: pd.Series, period: int = 14) -> Optional[float]:
+        """
+        Latest RSI value, same as rsi(data, period).iloc[-1].
+        
+        Args:
+            data: Price series
+            period: RSI period (default 14)
+            
+        Returns:
+            RSI (0-100), or None for an empty series
+        """
+        if len(data) == 0:
+            return None
+        arr = _kernel_input(data)
+        if arr is not None:
+            return float(_rsi_last_kernel(arr, period))
+        return float(TechnicalIndicators.rsi(data, period).iloc[-1])
+    
     @staticmethod
     def macd(
         data: pd.Series,
@@ -86,11 +262,16 @@ class TechnicalIndicators:
         Returns:
             DataFrame with 'macd', 'signal', 'histogram' columns
         """
-        fast_ema = data.ewm(span=fast_period, adjust=False).mean()
-        slow_ema = data.ewm(span=slow_period, adjust=False).mean()
+        arr = _kernel_input(data)
+        if arr is not None:
+            out = _macd_kernel(arr, fast_period, slow_period, signal_period)
+            return pd.DataFrame(out, index=data.index, columns=['macd', 'signal', 'histogram'])
+        
+        fast_ema = data.ewm(span=fast_period, adjust=False).mean(**_WINDOW_ENGINE)
+        slow_ema = data.ewm(span=slow_period, adjust=False).mean(**_WINDOW_ENGINE)
         
         macd_line = fast_ema - slow_ema
-        signal_line = macd_line.ewm(span=signal_period, adjust=False).mean()
+        signal_line = macd_line.ewm(span=signal_period, adjust=False).mean(**_WINDOW_ENGINE)
         histogram = macd_line - signal_line
         
         return pd.DataFrame({
@@ -116,8 +297,9 @@ class TechnicalIndicators:
         Returns:
             DataFrame with 'upper', 'middle', 'lower' columns
         """
-        middle = data.rolling(window=period, min_periods=1).mean()
-        std = data.rolling(window=period, min_periods=1).std()
+        window = data.rolling(window=period, min_periods=1)
+        middle = window.mean(**_WINDOW_ENGINE)
+        std = window.std(**_WINDOW_ENGINE)
         
         upper = middle + (std * std_dev)
         lower = middle - (std * std_dev)
@@ -154,7 +336,7 @@ class TechnicalIndicators:
         tr3 = (low - prev_close).abs()
         
         true_range = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        atr = true_range.ewm(span=period, adjust=False).mean()
+        atr = true_range.ewm(span=period, adjust=False).mean(**_WINDOW_ENGINE)
         
         return atr
     
@@ -173,7 +355,7 @@ class TechnicalIndicators:
         """
         # Use absolute daily returns as proxy
         returns = data.pct_change().abs()
-        atr = returns.ewm(span=period, adjust=False).mean() * data
+        atr = returns.ewm(span=period, adjust=False).mean(**_WINDOW_ENGINE) * data
         
         return atr
     
@@ -3,12 +3,13 @@ Alert scheduler module for periodic strategy checks.
 Supports automatic subscription-based strategy monitoring.
 """
 
+import asyncio
 import json
+import os
 import threading
-import time
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from pathlib import Path
-from typing import Optional, Callable, Dict, Any, List
+from typing import Optional, Callable, Dict, Any, List, Tuple
 from dataclasses import dataclass
 
 from config.settings import get_settings, NotificationSubscription
@@ -22,12 +23,18 @@ class ScheduleConfig:
     check_time: str = "09:30"
     last_run: str = ""
     
-    def should_run_now(self) -> bool:
-        """Check if scheduler should run based on current time."""
+    def should_run_now(self, now: Optional[datetime] = None) -> bool:
+        """
+        Check if scheduler should run based on current time.
+        
+        Args:
+            now: Current time (defaults to datetime.now())
+        """
         if not self.enabled:
             return False
         
-        now = datetime.now()
+        if now is None:
+            now = datetime.now()
         current_time = now.strftime("%H:%M")
         today = now.strftime("%Y-%m-%d")
         
@@ -40,6 +47,29 @@ class ScheduleConfig:
             return True
         
         return False
+    
+    def seconds_until_next_run(self, now: Optional[datetime] = None) -> float:
+        """
+        Seconds until the next scheduled run (0 if a run is due now).
+        
+        Args:
+            now: Current time (defaults to datetime.now())
+        """
+        if now is None:
+            now = datetime.now()
+        
+        try:
+            hour, minute = (int(x) for x in self.check_time.split(":"))
+            target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        except ValueError:
+            # 无法解析的时间格式：退回到逐分钟比较
+            return 0.0 if self.should_run_now(now) else 60.0
+        
+        # 今天已运行过，则下一次是明天的同一时间
+        if self.last_run == now.strftime("%Y-%m-%d"):
+            target += timedelta(days=1)
+        
+        return max(0.0, (target - now).total_seconds())
 
 
 @dataclass  
@@ -67,6 +97,9 @@ class AlertScheduler:
     Runs in background thread and triggers strategy evaluation.
     """
     
+    # 最长休眠间隔（秒）：即使距离下次运行还很久，也定期醒来感知配置变化
+    MAX_SLEEP_SECONDS = 60
+    
     # 类级别的锁，防止同一进程内多次启动
     _global_lock = threading.Lock()
     _global_instance_running = False
@@ -79,7 +112,25 @@ class AlertScheduler:
         
         self._running = False
         self._thread: Optional[threading.Thread] = None
-        self._check_callbacks: List[Callable] = []
+        self._stop_event = threading.Event()
+        
+        # 调度配置缓存（按配置文件 mtime 失效）
+        self._config_cache: Optional[ScheduleConfig] = None
+        self._config_cache_key: Optional[int] = None
+        # 写时复制：回调以不可变元组保存，调度线程直接读取当前引用即可，
+        # 只有 add/remove 需要加锁串行化写入
+        self._check_callbacks: Tuple[Callable, ...] = ()
+        self._callbacks_lock = threading.Lock()
+        
+        # 引擎缓存：(StrategyEngine, PortfolioManager, EmailSender, WeChatPush)，
+        # 以相关数据文件的 mtime 作为失效依据
+        self._engines: Optional[Tuple[Any, Any, Any, Any]] = None
+        self._engines_key: Optional[Tuple[Optional[int], ...]] = None
+        
+        # 订阅配置缓存：通知配置文件变化时才重新解析并筛选启用的订阅
+        self._notification_config = None
+        self._active_subs_cache: List[NotificationSubscription] = []
+        self._notification_config_key: Optional[Tuple[Optional[int], ...]] = None
         
         # Ensure data directory exists
         self.config_file.parent.mkdir(parents=True, exist_ok=True)
@@ -100,6 +151,14 @@ class AlertScheduler:
                 pass
         return ScheduleConfig()
     
+    def _get_cached_config(self) -> ScheduleConfig:
+        """Get scheduler configuration, re-reading the file only when it changed."""
+        key = self._file_mtime(self.config_file)
+        if self._config_cache is None or key != self._config_cache_key:
+            self._config_cache = self.load_config()
+            self._config_cache_key = key
+        return self._config_cache
+    
     def save_config(self, config: ScheduleConfig) -> bool:
         """Save scheduler configuration."""
         try:
@@ -109,16 +168,25 @@ class AlertScheduler:
                 'check_time': config.check_time,
                 'last_run': config.last_run,
             }
-            with open(self.config_file, 'w') as f:
-                json.dump(data, f, indent=4)
+            # 先写临时文件再原子替换，避免写入中途崩溃留下损坏的配置
+            tmp_file = self.config_file.with_suffix('.json.tmp')
+            tmp_file.write_text(json.dumps(data, indent=4))
+            os.replace(tmp_file, self.config_file)
             return True
         except Exception:
             return False
     
-    def update_last_run(self):
-        """Update last run timestamp."""
+    def update_last_run(self, now: Optional[datetime] = None):
+        """
+        Update last run timestamp.
+        
+        Args:
+            now: Current time (defaults to datetime.now())
+        """
+        if now is None:
+            now = datetime.now()
         config = self.load_config()
-        config.last_run = datetime.now().strftime("%Y-%m-%d")
+        config.last_run = now.strftime("%Y-%m-%d")
         self.save_config(config)
     
     def add_check_callback(self, callback: Callable):
@@ -128,12 +196,16 @@ class AlertScheduler:
         Args:
             callback: Function to call (should return Dict with results)
         """
-        self._check_callbacks.append(callback)
+        with self._callbacks_lock:
+            self._check_callbacks = self._check_callbacks + (callback,)
     
     def remove_check_callback(self, callback: Callable):
         """Remove a callback function."""
-        if callback in self._check_callbacks:
-            self._check_callbacks.remove(callback)
+        with self._callbacks_lock:
+            callbacks = list(self._check_callbacks)
+            if callback in callbacks:
+                callbacks.remove(callback)
+                self._check_callbacks = tuple(callbacks)
     
     def _acquire_lock(self) -> bool:
         """Acquire scheduler lock to prevent multiple instances."""
@@ -143,16 +215,20 @@ class AlertScheduler:
                 return False
         
         try:
-            if self.lock_file.exists():
+            try:
+                lock_stat = self.lock_file.stat()
+            except FileNotFoundError:
+                lock_stat = None
+            
+            if lock_stat is not None:
                 # Check if lock is stale (older than 1 hour)
-                mtime = datetime.fromtimestamp(self.lock_file.stat().st_mtime)
+                mtime = datetime.fromtimestamp(lock_stat.st_mtime)
                 if (datetime.now() - mtime).total_seconds() > 3600:
-                    self.lock_file.unlink()
+                    self.lock_file.unlink(missing_ok=True)
                 else:
                     return False
             
             # 写入锁文件，包含进程ID以便调试
-            import os
             self.lock_file.write_text(f"{datetime.now().isoformat()}|pid:{os.getpid()}")
             
             # 标记全局实例正在运行
@@ -166,27 +242,32 @@ class AlertScheduler:
     def _release_lock(self):
         """Release scheduler lock."""
         try:
-            if self.lock_file.exists():
-                self.lock_file.unlink()
-        except Exception:
+            self.lock_file.unlink(missing_ok=True)
+        except OSError:
             pass
         
         # 重置全局标记
         with AlertScheduler._global_lock:
             AlertScheduler._global_instance_running = False
     
-    def _run_checks(self) -> Dict[str, Any]:
+    def _run_checks(self, now: Optional[datetime] = None) -> Dict[str, Any]:
         """
         Run all registered check callbacks.
         
+        Args:
+            now: Timestamp to report (defaults to datetime.now())
+        
         Returns:
             Dictionary with results from all callbacks
         """
+        if now is None:
+            now = datetime.now()
         results = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now.isoformat(),
             'checks': [],
         }
         
+        # 读取元组引用是原子的，迭代期间的增删不会影响本次快照
         for callback in self._check_callbacks:
             try:
                 result = callback()
@@ -204,35 +285,51 @@ class AlertScheduler:
         
         return results
     
+    def _run_scheduled(self, config: ScheduleConfig, now: datetime):
+        """Run one scheduled check and record it as today's run."""
+        # 先更新 last_run，防止其他实例重复执行
+        config.last_run = now.strftime("%Y-%m-%d")
+        self.save_config(config)
+        self._config_cache = config
+        self._config_cache_key = self._file_mtime(self.config_file)
+        
+        # Run subscription checks
+        results = self.run_subscription_checks()
+        
+        # Also run any custom callbacks
+        callback_results = self._run_checks(now)
+        
+        # Log results
+        print(f"Scheduler ran at {now.isoformat()}")
+        print(f"  Subscriptions checked: {len(results)}")
+        print(f"  With changes: {sum(1 for r in results if r.has_changes)}")
+    
     def _scheduler_loop(self):
-        """Main scheduler loop running in background thread."""
+        """
+        Main scheduler loop running in background thread.
+        
+        Sleeps until the next scheduled run time (capped at MAX_SLEEP_SECONDS
+        so config edits are picked up), runs, then sleeps again.
+        """
         while self._running:
+            delay = self.MAX_SLEEP_SECONDS
             try:
-                config = self.load_config()
+                config = self._get_cached_config()
                 
-                if config.should_run_now():
-                    # 先更新 last_run，防止其他实例重复执行
-                    self.update_last_run()
-                    
-                    # Run subscription checks
-                    results = self.run_subscription_checks()
-                    
-                    # Also run any custom callbacks
-                    callback_results = self._run_checks()
-                    
-                    # Log results
-                    print(f"Scheduler ran at {datetime.now().isoformat()}")
-                    print(f"  Subscriptions checked: {len(results)}")
-                    print(f"  With changes: {sum(1 for r in results if r.has_changes)}")
+                if config.enabled:
+                    # 每轮只读取一次时钟，向下传递
+                    now = datetime.now()
+                    delay = config.seconds_until_next_run(now)
+                    if delay <= 0:
+                        self._run_scheduled(config, now)
+                        continue
+                    delay = min(delay, self.MAX_SLEEP_SECONDS)
                 
             except Exception as e:
                 print(f"Scheduler error: {e}")
             
-            # Sleep for 60 seconds before next check
-            for _ in range(60):
-                if not self._running:
-                    break
-                time.sleep(1)
+            if self._stop_event.wait(delay):
+                break
     
     def start(self) -> bool:
         """
@@ -248,6 +345,7 @@ class AlertScheduler:
             return False
         
         self._running = True
+        self._stop_event.clear()
         self._thread = threading.Thread(target=self._scheduler_loop, daemon=True)
         self._thread.start()
         
@@ -256,6 +354,7 @@ class AlertScheduler:
     def stop(self):
         """Stop the scheduler background thread."""
         self._running = False
+        self._stop_event.set()
         self._release_lock()
         
         if self._thread and self._thread.is_alive():
@@ -292,35 +391,102 @@ class AlertScheduler:
             'callbacks_count': len(self._check_callbacks),
         }
     
-    def run_subscription_checks(self) -> List[CheckResult]:
+    @staticmethod
+    def _file_mtime(path: Path) -> Optional[int]:
+        """Return file mtime in ns, or None if the file does not exist."""
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+    
+    def _load_active_subscriptions(self) -> Tuple[Any, List[NotificationSubscription]]:
         """
-        Run all enabled subscription checks.
-        This is the main method for scheduled strategy checks.
+        Get the notification config and its enabled subscriptions.
+        
+        The config is re-parsed (and the enabled list rebuilt) only when the
+        notification config file (or its legacy fallback) changes on disk.
         
         Returns:
-            List of CheckResult for each subscription
+            Tuple of (notification_config, active_subscriptions)
+        """
+        key = (
+            self._file_mtime(self.settings.notification_config_file),
+            self._file_mtime(self.settings.legacy_alert_config_file),
+        )
+        if self._notification_config is None or key != self._notification_config_key:
+            notification_config = self.settings.load_notification_config()
+            self._active_subs_cache = [
+                s for s in notification_config.subscriptions if s.enabled
+            ]
+            self._notification_config = notification_config
+            self._notification_config_key = key
+        return self._notification_config, self._active_subs_cache
+    
+    def _get_engines(self, notification_config) -> Tuple[Any, Any, Any, Any]:
         """
+        Get cached engine instances, rebuilding them only when the
+        notification (or legacy alert) / strategy / portfolio files have
+        changed on disk. The replaced WeChatPush is closed.
+        
+        Args:
+            notification_config: NotificationDefaults used to build senders
+            
+        Returns:
+            Tuple of (strategy_engine, portfolio_manager, email_sender, wechat_push)
+        """
+        key = (
+            self._file_mtime(self.settings.notification_config_file),
+            # 订阅可能迁移自旧版告警配置文件
+            self._file_mtime(self.settings.legacy_alert_config_file),
+            self._file_mtime(self.settings.strategies_file),
+            self._file_mtime(self.settings.portfolios_file),
+            # 策略/组合的增量修改写在 journal 中，主文件 mtime 不一定变化
+            self._file_mtime(self.settings.strategies_file.with_suffix('.journal.jsonl')),
+            self._file_mtime(self.settings.portfolios_file.with_suffix('.journal.jsonl')),
+        )
+        if self._engines is not None and key == self._engines_key:
+            return self._engines
+        
+        # 仅在缓存未命中时才导入重量级模块
         from strategy.engine import StrategyEngine
         from portfolio.manager import PortfolioManager
         from notification.email_sender import EmailSender
         from notification.wechat_push import WeChatPush
         
-        results: List[CheckResult] = []
+        if self._engines is not None:
+            # 释放旧推送器的 HTTP 连接池
+            self._engines[3].close()
+        self._engines = (
+            StrategyEngine(),
+            PortfolioManager(),
+            EmailSender(notification_config),
+            WeChatPush(notification_config),
+        )
+        self._engines_key = key
+        return self._engines
+    
+    def run_subscription_checks(self) -> List[CheckResult]:
+        """
+        Run all enabled subscription checks.
+        This is the main method for scheduled strategy checks.
         
-        # Load notification config with subscriptions
-        notification_config = self.settings.load_notification_config()
+        Returns:
+            List of CheckResult for each subscription
+        """
+        results: List[CheckResult] = []
         
-        # Filter to only enabled subscriptions
-        active_subs = [s for s in notification_config.subscriptions if s.enabled]
+        # Load notification config with enabled subscriptions (cached by mtime)
+        notification_config, active_subs = self._load_active_subscriptions()
         
         if not active_subs:
             return results
         
-        # Initialize engines
-        strategy_engine = StrategyEngine()
-        portfolio_manager = PortfolioManager()
-        email_sender = EmailSender(notification_config)
-        wechat_push = WeChatPush(notification_config)
+        # Initialize engines (cached across ticks)
+        strategy_engine, portfolio_manager, email_sender, wechat_push = \
+            self._get_engines(notification_config)
+        
+        # 同一轮内共享策略执行结果，多个订阅引用同一策略+组合时只执行一次
+        exec_cache: Dict[Tuple[str, str, bool], Any] = {}
         
         for sub in active_subs:
             result = self._check_single_subscription(
@@ -330,6 +496,7 @@ class AlertScheduler:
                 email_sender,
                 wechat_push,
                 notification_config,
+                exec_cache=exec_cache,
             )
             results.append(result)
         
@@ -343,6 +510,7 @@ class AlertScheduler:
         email_sender,
         wechat_push,
         notification_config,
+        exec_cache: Optional[Dict[Tuple[str, str, bool], Any]] = None,
     ) -> CheckResult:
         """
         Check a single subscription and send notifications if needed.
@@ -354,10 +522,46 @@ class AlertScheduler:
             email_sender: EmailSender instance
             wechat_push: WeChatPush instance
             notification_config: NotificationDefaults config
+            exec_cache: Optional per-run cache of strategy results keyed by
+                (strategy_name, portfolio_name, normalize_weights)
             
         Returns:
             CheckResult with the outcome
         """
+        result, alert = self._evaluate_subscription(
+            subscription, strategy_engine, portfolio_manager, exec_cache
+        )
+        
+        # Send notifications if there are changes
+        if alert is not None:
+            try:
+                self._send_email_alert(subscription, result, email_sender, alert)
+                self._send_wechat_alert(subscription, result, wechat_push, alert)
+            except Exception as e:
+                result.error = str(e)
+        
+        return result
+    
+    def _evaluate_subscription(
+        self,
+        subscription: NotificationSubscription,
+        strategy_engine,
+        portfolio_manager,
+        exec_cache: Optional[Dict[Tuple[str, str, bool], Any]] = None,
+    ) -> Tuple[CheckResult, Optional[Dict[str, Any]]]:
+        """
+        Execute a subscription's strategy and detect significant weight changes.
+        
+        Args:
+            subscription: The subscription to check
+            strategy_engine: StrategyEngine instance
+            portfolio_manager: PortfolioManager instance
+            exec_cache: Optional per-run cache of strategy results
+            
+        Returns:
+            Tuple of (CheckResult, alert) where alert holds the keyword
+            arguments for send_strategy_alert, or None if nothing to send
+        """
         result = CheckResult(
             subscription_id=subscription.id,
             strategy_name=subscription.strategy_name,
@@ -376,23 +580,32 @@ class AlertScheduler:
             
             if not strategy:
                 result.error = f"Strategy '{subscription.strategy_name}' not found"
-                return result
+                return result, None
             
             if not portfolio:
                 result.error = f"Portfolio '{subscription.portfolio_name}' not found"
-                return result
+                return result, None
             
             # Execute strategy（透传订阅级归一化开关）
-            exec_result = strategy_engine.execute(
-                code=strategy['code'],
-                tickers=portfolio.tickers,
-                current_weights=portfolio.weights,
-                normalize_weights=subscription.normalize_weights,
+            cache_key = (
+                subscription.strategy_name,
+                subscription.portfolio_name,
+                subscription.normalize_weights,
             )
+            exec_result = exec_cache.get(cache_key) if exec_cache is not None else None
+            if exec_result is None:
+                exec_result = strategy_engine.execute(
+                    code=strategy['code'],
+                    tickers=portfolio.tickers,
+                    current_weights=portfolio.weights,
+                    normalize_weights=subscription.normalize_weights,
+                )
+                if exec_cache is not None:
+                    exec_cache[cache_key] = exec_result
             
             if not exec_result.success:
                 result.error = exec_result.message
-                return result
+                return result, None
             
             result.success = True
             result.signals = exec_result.signals
@@ -413,32 +626,107 @@ class AlertScheduler:
             result.changes_count = len(changes)
             result.has_changes = len(changes) > 0
             
-            # Send notifications if there are changes
-            if result.has_changes:
-                reason = "\n".join(exec_result.signals[:5]) if exec_result.signals else "策略信号触发"
-                
-                # Send email
-                if subscription.notify_email and email_sender.is_configured():
-                    email_result = email_sender.send_strategy_alert(
-                        strategy_name=subscription.strategy_name,
-                        current_weights=current_weights,
-                        target_weights=target_weights,
-                        reason=reason,
-                    )
-                    result.email_sent = email_result.success
-                
-                # Send WeChat
-                if subscription.notify_wechat and wechat_push.is_configured():
-                    wechat_result = wechat_push.send_strategy_alert(
-                        strategy_name=subscription.strategy_name,
-                        current_weights=current_weights,
-                        target_weights=target_weights,
-                        reason=reason,
-                    )
-                    result.wechat_sent = wechat_result.success
+            if not result.has_changes:
+                return result, None
             
-            return result
+            reason = "\n".join(exec_result.signals[:5]) if exec_result.signals else "策略信号触发"
+            alert = {
+                'strategy_name': subscription.strategy_name,
+                'current_weights': current_weights,
+                'target_weights': target_weights,
+                'reason': reason,
+            }
+            return result, alert
             
         except Exception as e:
             result.error = str(e)
-            return result
+            return result, None
+    
+    @staticmethod
+    def _send_email_alert(subscription, result: CheckResult, email_sender, alert: Dict[str, Any]):
+        """Send the email alert for a subscription if enabled and configured."""
+        if subscription.notify_email and email_sender.is_configured():
+            email_result = email_sender.send_strategy_alert(**alert)
+            result.email_sent = email_result.success
+    
+    @staticmethod
+    def _send_wechat_alert(subscription, result: CheckResult, wechat_push, alert: Dict[str, Any]):
+        """Send the WeChat alert for a subscription if enabled and configured."""
+        if subscription.notify_wechat and wechat_push.is_configured():
+            wechat_result = wechat_push.send_strategy_alert(**alert)
+            result.wechat_sent = wechat_result.success
+    
+    async def _send_channels_async(
+        self,
+        subscription: NotificationSubscription,
+        result: CheckResult,
+        email_sender,
+        wechat_push,
+        alert: Dict[str, Any],
+    ):
+        """Send email and WeChat alerts for one subscription concurrently."""
+        async def _send(send_func, sender):
+            try:
+                await asyncio.to_thread(send_func, subscription, result, sender, alert)
+            except Exception as e:
+                result.error = str(e)
+        
+        await asyncio.gather(
+            _send(self._send_email_alert, email_sender),
+            _send(self._send_wechat_alert, wechat_push),
+        )
+    
+    async def run_subscription_checks_async(self) -> List[CheckResult]:
+        """
+        Async variant of run_subscription_checks.
+        
+        Strategies are still evaluated one after another (sharing the per-run
+        execution cache) in a worker thread, so the event loop is not blocked
+        while they run. All notification sends across all subscriptions are
+        then fanned out concurrently, so total send latency is roughly that of
+        the slowest single send instead of the sum.
+        
+        Returns:
+            List of CheckResult for each subscription
+        """
+        notification_config, active_subs = self._load_active_subscriptions()
+        
+        if not active_subs:
+            return []
+        
+        strategy_engine, portfolio_manager, email_sender, wechat_push = \
+            self._get_engines(notification_config)
+        
+        def _evaluate_all():
+            exec_cache: Dict[Tuple[str, str, bool], Any] = {}
+            return [
+                self._evaluate_subscription(sub, strategy_engine, portfolio_manager, exec_cache)
+                for sub in active_subs
+            ]
+        
+        # 策略执行是同步且耗时的：放到线程中运行，避免阻塞事件循环
+        evaluated = await asyncio.to_thread(_evaluate_all)
+        
+        await asyncio.gather(*[
+            self._send_channels_async(sub, result, email_sender, wechat_push, alert)
+            for sub, (result, alert) in zip(active_subs, evaluated)
+            if alert is not None
+        ])
+        
+        return [result for result, _ in evaluated]
+    
+    async def run_now_async(self) -> Dict[str, Any]:
+        """
+        Manually trigger a full check run (callbacks and subscriptions) with
+        concurrent notification sending.
+        
+        Returns:
+            Results dictionary as returned by run_now, plus a 'subscriptions'
+            list of CheckResult
+        """
+        callback_results, subscription_results = await asyncio.gather(
+            asyncio.to_thread(self._run_checks),
+            self.run_subscription_checks_async(),
+        )
+        callback_results['subscriptions'] = subscription_results
+        return callback_results
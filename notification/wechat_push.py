@@ -3,14 +3,29 @@ WeChat push notification module.
 Supports Server酱 and PushPlus services for WeChat notifications.
 """
 
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+import time
+import numpy as np
 import requests
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Dict, Any, List, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 
 from config.settings import get_settings, NotificationDefaults
 
 
+# 调仓提醒 Markdown 的静态片段，模块加载时构建一次
+_ALERT_HEADER_TMPL = "### 📊 策略调仓提醒\n\n**策略名称:** {name}\n**检测时间:** {ts}\n"
+_ALERT_REASON_TMPL = "**调仓原因:**\n> {reason}\n"
+_ALERT_TABLE_HEADER = "**建议调仓:**\n\n| 标的 | 当前 | 目标 | 变化 |\n|------|------|------|------|"
+_ALERT_FOOTER = "\n---\n*此消息由 Quant Platform 自动发送*"
+
+
 @dataclass
 class PushResult:
     """Result of push notification operation."""
@@ -34,6 +49,20 @@ class WeChatPush:
     SERVERCHAN_API = "https://sctapi.ftqq.com/{key}.send"
     PUSHPLUS_API = "http://www.pushplus.plus/send"
     
+    # 相同内容在 TTL 内只推送一次（服务端会把重复内容视为骚扰并报错）。
+    # 进程级共享，跨 WeChatPush 实例生效：key -> (过期时间, PushResult)
+    DEDUP_TTL_SECONDS = 60
+    
+    # 单条消息正文上限（PushPlus 约 64KB），批量提醒超限时拆分为多条
+    MAX_CONTENT_BYTES = 60 * 1024
+    _dedup_cache: Dict[bytes, Tuple[float, PushResult]] = {}
+    _dedup_lock = threading.Lock()
+    
+    # fire_and_forget 推送使用的后台线程池（进程级共享，首次使用时创建）
+    MAX_BACKGROUND_WORKERS = 4
+    _executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+    
     def __init__(self, config: Optional[NotificationDefaults] = None):
         """
         Initialize WeChat push sender.
@@ -47,6 +76,80 @@ class WeChatPush:
         
         self.serverchan_key = config.serverchan_key
         self.pushplus_token = config.pushplus_token
+        
+        # 复用连接池，避免每次推送都重新进行 TCP/TLS 握手。
+        # Retry 默认不对 POST 做状态码/读超时重试，只重试建连失败，避免重复推送。
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(500, 502, 503, 504),
+            ),
+        )
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+    
+    def close(self):
+        """Release pooled HTTP connections."""
+        self._session.close()
+    
+    def __enter__(self) -> 'WeChatPush':
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    @classmethod
+    def _submit(cls, fn, *args) -> PushResult:
+        """Run a send in the background pool and return a queued result."""
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=cls.MAX_BACKGROUND_WORKERS,
+                    thread_name_prefix='wechat-push',
+                )
+            cls._executor.submit(fn, *args)
+        return PushResult(success=True, message="queued", service="background")
+    
+    @classmethod
+    def shutdown(cls, wait: bool = True):
+        """
+        Flush pending fire-and-forget sends and stop the background pool.
+        
+        Args:
+            wait: Block until queued sends have finished
+        """
+        with cls._executor_lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+    
+    @staticmethod
+    def _dedup_key(service: str, *parts: str) -> bytes:
+        """Build the dedup cache key for a push."""
+        return hashlib.sha1("|".join((service,) + parts).encode('utf-8')).digest()
+    
+    @classmethod
+    def _dedup_get(cls, key: bytes) -> Optional[PushResult]:
+        """Return a cached successful result for this push, if still fresh."""
+        with cls._dedup_lock:
+            entry = cls._dedup_cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+    
+    @classmethod
+    def _dedup_put(cls, key: bytes, result: PushResult):
+        """Remember a successful push and drop expired entries."""
+        now = time.monotonic()
+        with cls._dedup_lock:
+            expired = [k for k, (expires, _) in cls._dedup_cache.items() if expires <= now]
+            for k in expired:
+                del cls._dedup_cache[k]
+            cls._dedup_cache[key] = (now + cls.DEDUP_TTL_SECONDS, result)
     
     def is_serverchan_configured(self) -> bool:
         """Check if Server酱 is configured."""
@@ -84,6 +187,11 @@ class WeChatPush:
                 service="serverchan"
             )
         
+        dedup_key = self._dedup_key("serverchan", self.serverchan_key, title, content, channel)
+        cached = self._dedup_get(dedup_key)
+        if cached is not None:
+            return cached
+        
         url = self.SERVERCHAN_API.format(key=self.serverchan_key)
         
         data = {
@@ -95,15 +203,17 @@ class WeChatPush:
             data['channel'] = channel
         
         try:
-            response = requests.post(url, data=data, timeout=10)
+            response = self._session.post(url, data=data, timeout=10)
             result = response.json()
             
             if result.get('code') == 0:
-                return PushResult(
+                push_result = PushResult(
                     success=True,
                     message="Server酱推送成功",
                     service="serverchan"
                 )
+                self._dedup_put(dedup_key, push_result)
+                return push_result
             else:
                 error_msg = result.get('message', '未知错误')
                 return PushResult(
@@ -151,6 +261,11 @@ class WeChatPush:
                 service="pushplus"
             )
         
+        dedup_key = self._dedup_key("pushplus", self.pushplus_token, title, content, template, topic)
+        cached = self._dedup_get(dedup_key)
+        if cached is not None:
+            return cached
+        
         data = {
             'token': self.pushplus_token,
             'title': title,
@@ -162,7 +277,7 @@ class WeChatPush:
             data['topic'] = topic
         
         try:
-            response = requests.post(
+            response = self._session.post(
                 self.PUSHPLUS_API,
                 json=data,
                 timeout=10
@@ -170,11 +285,13 @@ class WeChatPush:
             result = response.json()
             
             if result.get('code') == 200:
-                return PushResult(
+                push_result = PushResult(
                     success=True,
                     message="PushPlus推送成功",
                     service="pushplus"
                 )
+                self._dedup_put(dedup_key, push_result)
+                return push_result
             else:
                 error_msg = result.get('msg', '未知错误')
                 return PushResult(
@@ -200,7 +317,8 @@ class WeChatPush:
         self,
         title: str,
         content: str = "",
-        prefer_service: str = "pushplus"
+        prefer_service: str = "pushplus",
+        fire_and_forget: bool = False
     ) -> PushResult:
         """
         Send notification via available service.
@@ -209,10 +327,15 @@ class WeChatPush:
             title: Message title
             content: Message content
             prefer_service: Preferred service ('pushplus' or 'serverchan')
+            fire_and_forget: Queue the send in the background and return
+                immediately with a "queued" result
             
         Returns:
             PushResult
         """
+        if fire_and_forget:
+            return self._submit(self.send, title, content, prefer_service)
+        
         # Try preferred service first
         if prefer_service == "serverchan" and self.is_serverchan_configured():
             result = self.send_serverchan(title, content)
@@ -241,65 +364,108 @@ class WeChatPush:
             service="none"
         )
     
-    def send_strategy_alert(
+    async def send_async(
         self,
+        title: str,
+        content: str = "",
+        prefer_service: str = "pushplus"
+    ) -> PushResult:
+        """
+        Send notification without blocking the event loop.
+        
+        Services are tried one at a time in a worker thread, starting with
+        prefer_service; the next one is tried only if the previous send failed
+        (including its 10 s request timeout). Running them concurrently would
+        deliver the message twice whenever both succeed, since a send already
+        in flight cannot be cancelled.
+        
+        Args:
+            title: Message title
+            content: Message content
+            prefer_service: Service tried first ('pushplus' or 'serverchan')
+            
+        Returns:
+            PushResult of the first success, or the last failure
+        """
+        senders = []
+        if self.is_pushplus_configured():
+            senders.append(self.send_pushplus)
+        if self.is_serverchan_configured():
+            senders.append(self.send_serverchan)
+        if prefer_service == "serverchan":
+            senders.reverse()
+        
+        if not senders:
+            return PushResult(
+                success=False,
+                message="未配置任何微信推送服务",
+                service="none"
+            )
+        
+        # 同步发送函数放到线程中执行，复用已有的连接池；失败才换下一个服务
+        result = None
+        for sender in senders:
+            result = await asyncio.to_thread(sender, title, content)
+            if result.success:
+                return result
+        return result
+    
+    @staticmethod
+    def _build_alert(
         strategy_name: str,
         current_weights: Dict[str, float],
         target_weights: Dict[str, float],
-        reason: str = ""
-    ) -> PushResult:
+        reason: str = "",
+        timestamp: Optional[str] = None,
+        footer: str = ""
+    ) -> str:
         """
-        Send strategy rebalancing alert via WeChat.
+        Render the Markdown body for one strategy alert.
         
         Args:
             strategy_name: Strategy name
             current_weights: Current portfolio weights
             target_weights: Target portfolio weights
             reason: Reason for rebalancing
+            timestamp: Pre-formatted detection time (defaults to now)
+            footer: Footer appended after the table (omitted if empty)
             
         Returns:
-            PushResult
+            Markdown string
         """
-        title = f"🔄 调仓提醒: {strategy_name}"
-        
-        # Build Markdown content
-        lines = [
-            f"### 📊 策略调仓提醒",
-            f"",
-            f"**策略名称:** {strategy_name}",
-            f"**检测时间:** {datetime.now().strftime('%Y-%m-%d %H:%M')}",
-            f"",
-        ]
-        
+        parts = [_ALERT_HEADER_TMPL.format(
+            name=strategy_name,
+            ts=timestamp or datetime.now().strftime('%Y-%m-%d %H:%M'),
+        )]
         if reason:
-            lines.extend([
-                f"**调仓原因:**",
-                f"> {reason}",
-                f"",
-            ])
-        
-        lines.append("**建议调仓:**")
-        lines.append("")
-        lines.append("| 标的 | 当前 | 目标 | 变化 |")
-        lines.append("|------|------|------|------|")
-        
-        all_tickers = set(current_weights.keys()) | set(target_weights.keys())
-        for ticker in sorted(all_tickers):
-            curr = current_weights.get(ticker, 0)
-            target = target_weights.get(ticker, 0)
-            diff = target - curr
-            if abs(diff) > 0.1:
-                arrow = "⬆️" if diff > 0 else "⬇️"
-                lines.append(f"| {ticker} | {curr:.1f}% | {target:.1f}% | {arrow} {diff:+.1f}% |")
-        
-        lines.extend([
-            "",
-            "---",
-            "*此消息由 Quant Platform 自动发送*",
+            parts.append(_ALERT_REASON_TMPL.format(reason=reason))
+        parts.append(_ALERT_TABLE_HEADER)
+        parts.extend([
+            f"| {ticker} | {curr:.1f}% | {target:.1f}% | {'⬆️' if diff > 0 else '⬇️'} {diff:+.1f}% |"
+            for ticker, curr, target, diff in WeChatPush._iter_weight_changes(current_weights, target_weights)
         ])
-        
-        content = "\n".join(lines)
-        
+        if footer:
+            parts.append(footer)
+        return "\n".join(parts)
+    
+    @staticmethod
+    def _iter_weight_changes(
+        current_weights: Dict[str, float],
+        target_weights: Dict[str, float],
+    ):
+        """Yield (ticker, current, target, diff) for changes > 0.1%, sorted by ticker."""
+        tickers = sorted(current_weights.keys() | target_weights.keys())
+        if not tickers:
+            return
+        # 一次向量化计算全部差值并筛选，只格式化变化显著的行
+        curr = np.fromiter((current_weights.get(t, 0) for t in tickers), dtype=np.float64, count=len(tickers))
+        target = np.fromiter((target_weights.get(t, 0) for t in tickers), dtype=np.float64, count=len(tickers))
+        diff = target - curr
+        for i in np.flatnonzero(np.abs(diff) > 0.1):
+            yield tickers[i], float(curr[i]), float(target[i]), float(diff[i])
+    
+    def _send_markdown(self, title: str, content: str) -> PushResult:
+        """Send Markdown content, preferring PushPlus and falling back to Server酱."""
         # Try PushPlus with markdown template
         if self.is_pushplus_configured():
             return self.send_pushplus(title, content, template="markdown")
@@ -314,6 +480,84 @@ class WeChatPush:
             service="none"
         )
     
+    def send_strategy_alert(
+        self,
+        strategy_name: str,
+        current_weights: Dict[str, float],
+        target_weights: Dict[str, float],
+        reason: str = "",
+        fire_and_forget: bool = False
+    ) -> PushResult:
+        """
+        Send strategy rebalancing alert via WeChat.
+        
+        Args:
+            strategy_name: Strategy name
+            current_weights: Current portfolio weights
+            target_weights: Target portfolio weights
+            reason: Reason for rebalancing
+            fire_and_forget: Queue the send in the background and return
+                immediately with a "queued" result
+            
+        Returns:
+            PushResult
+        """
+        title = f"🔄 调仓提醒: {strategy_name}"
+        content = self._build_alert(
+            strategy_name, current_weights, target_weights, reason, footer=_ALERT_FOOTER
+        )
+        if fire_and_forget:
+            return self._submit(self._send_markdown, title, content)
+        return self._send_markdown(title, content)
+    
+    def send_strategy_alerts_batch(self, alerts: List[Dict[str, Any]]) -> PushResult:
+        """
+        Send several strategy alerts as one combined message.
+        
+        Alerts are concatenated into as few messages as fit under
+        MAX_CONTENT_BYTES, so N alerts usually cost a single HTTP request.
+        
+        Args:
+            alerts: List of dicts with send_strategy_alert keyword arguments
+                (strategy_name, current_weights, target_weights, reason)
+            
+        Returns:
+            PushResult of the first failed message, or of the last message
+        """
+        if not alerts:
+            return PushResult(success=True, message="没有需要推送的提醒", service="none")
+        
+        if len(alerts) == 1:
+            return self.send_strategy_alert(**alerts[0])
+        
+        separator = "\n\n---\n\n"
+        footer = "\n" + _ALERT_FOOTER
+        budget = self.MAX_CONTENT_BYTES - len(footer.encode('utf-8'))
+        
+        # 同一批次共用一个检测时间，只格式化一次
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
+        
+        # 按字节上限贪心分组，单条超限的提醒独占一组
+        chunks: List[List[str]] = []
+        chunk_size = 0
+        for alert in alerts:
+            body = self._build_alert(**alert, timestamp=timestamp)
+            size = len(body.encode('utf-8')) + len(separator)
+            if chunks and chunk_size + size <= budget:
+                chunks[-1].append(body)
+                chunk_size += size
+            else:
+                chunks.append([body])
+                chunk_size = size
+        
+        title = f"🔄 {len(alerts)}个策略调仓提醒"
+        result = None
+        for bodies in chunks:
+            result = self._send_markdown(title, separator.join(bodies) + footer)
+            if not result.success:
+                return result
+        return result
+    
     def send_test(self) -> PushResult:
         """
         Send test notification to verify configuration.
@@ -3,44 +3,85 @@ Portfolio management module.
 Handles portfolio CRUD operations and data persistence.
 """
 
+import hashlib
 import json
+import marshal
+import os
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime
 
+import numpy as np
+
+from config.jsonio import dumps, dumps_line, loads, read_journal
 from config.settings import get_settings
 
 
-@dataclass
+@dataclass(slots=True)
 class Portfolio:
     """
     Represents an investment portfolio.
+    
+    Derived values (total weight) are cached; call invalidate_cache() after
+    mutating `tickers`/`weights` in place. PortfolioManager.create/update do
+    this automatically.
     """
     name: str
-    tickers: List[str]
+    tickers: Tuple[str, ...]  # Immutable; reassign to add/remove tickers
     weights: Dict[str, float]  # Ticker -> Weight (percentage, 0-100)
     description: str = ""
     created_at: str = field(default_factory=lambda: datetime.now().isoformat())
     updated_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    _total_weight: Optional[float] = field(default=None, init=False, repr=False, compare=False)
+    _weight_array: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
     
     def __post_init__(self):
         """Validate and normalize portfolio data."""
-        # Ensure weights only contain tickers in the list
-        self.weights = {t: self.weights.get(t, 0.0) for t in self.tickers}
+        if not isinstance(self.tickers, tuple):
+            self.tickers = tuple(self.tickers)
+        # Ensure weights only contain tickers in the list (skip rebuild if already clean)
+        if self.weights.keys() != set(self.tickers):
+            # 重建权重的同时累加总权重，省去 total_weight 的再次遍历
+            new_weights, total = {}, 0.0
+            weights = self.weights
+            for t in self.tickers:
+                v = weights.get(t, 0.0)
+                new_weights[t] = v
+                total += v
+            self.weights = new_weights
+            self._total_weight = total
+    
+    def invalidate_cache(self):
+        """Drop cached derived values after in-place edits of tickers/weights."""
+        self._total_weight = None
+        self._weight_array = None
+    
+    def _get_weight_array(self) -> np.ndarray:
+        """Weights as a float64 array aligned with `tickers` (cached)."""
+        if self._weight_array is None:
+            self._weight_array = np.fromiter(
+                (self.weights.get(t, 0.0) for t in self.tickers),
+                dtype=np.float64,
+                count=len(self.tickers),
+            )
+        return self._weight_array
     
     @property
     def total_weight(self) -> float:
         """Get total weight sum."""
-        return sum(self.weights.values())
+        if self._total_weight is None:
+            self._total_weight = sum(self.weights.values())
+        return self._total_weight
     
     @property
     def normalized_weights(self) -> Dict[str, float]:
         """Get normalized weights (sum to 1.0)."""
-        total = self.total_weight
+        arr = self._get_weight_array()
+        total = arr.sum()
         if total == 0:
             return {t: 0.0 for t in self.tickers}
-        return {t: w / total for t, w in self.weights.items()}
+        return dict(zip(self.tickers, (arr / total).tolist()))
     
     def is_valid(self) -> bool:
         """Check if portfolio has valid configuration."""
@@ -50,7 +91,7 @@ class Portfolio:
         """Convert to dictionary for JSON serialization."""
         return {
             'name': self.name,
-            'tickers': self.tickers,
+            'tickers': list(self.tickers),
             'weights': self.weights,
             'description': self.description,
             'created_at': self.created_at,
@@ -58,15 +99,24 @@ class Portfolio:
         }
     
     @classmethod
-    def from_dict(cls, data: dict) -> 'Portfolio':
-        """Create Portfolio from dictionary."""
+    def from_dict(cls, data: dict, default_ts: Optional[str] = None) -> 'Portfolio':
+        """
+        Create Portfolio from dictionary.
+        
+        Args:
+            data: Portfolio dictionary
+            default_ts: Timestamp for missing created_at/updated_at
+                (defaults to now, computed only when actually needed)
+        """
+        if default_ts is None and ('created_at' not in data or 'updated_at' not in data):
+            default_ts = datetime.now().isoformat()
         return cls(
             name=data.get('name', 'Unnamed'),
             tickers=data.get('tickers', []),
             weights=data.get('weights', {}),
             description=data.get('description', ''),
-            created_at=data.get('created_at', datetime.now().isoformat()),
-            updated_at=data.get('updated_at', datetime.now().isoformat()),
+            created_at=data.get('created_at', default_ts),
+            updated_at=data.get('updated_at', default_ts),
         )
     
     @classmethod
@@ -102,77 +152,254 @@ class PortfolioManager:
         # Ensure data directory exists
         self.storage_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Cache for loaded portfolios
+        # 原始 JSON 数据（按名称索引，保持顺序）；Portfolio 对象在首次访问时才构建
+        self._raw: Dict[str, dict] = {}
+        # Cache for materialized portfolios
         self._portfolios: Dict[str, Portfolio] = {}
+        # 已修改、保存前需要重新序列化回 _raw 的组合名
+        self._dirty: Set[str] = set()
+        # 自上次保存以来是否有任何增删改（含删除/重命名）
+        self._modified = False
         self._loaded = False
+        # 本次加载的时间戳，供缺少时间字段的组合共用
+        self._load_ts = ""
+        
+        # 只解析 JSON（Portfolio 对象按需构建），开销小，直接在构造时加载
+        self.load()
     
-    def _ensure_loaded(self):
-        """Ensure portfolios are loaded from disk."""
-        if not self._loaded:
-            self.load()
+    def _materialize(self, name: str) -> Optional[Portfolio]:
+        """Build (and cache) the Portfolio object for `name` on first access."""
+        portfolio = self._portfolios.get(name)
+        if portfolio is None and name in self._raw:
+            portfolio = Portfolio.from_dict(self._raw[name], default_ts=self._load_ts)
+            self._portfolios[name] = portfolio
+        return portfolio
     
-    def load(self) -> Dict[str, Portfolio]:
+    def load(self) -> Dict[str, dict]:
         """
         Load portfolios from storage file.
         If no file exists, try to load from example file.
         
+        Only the JSON is parsed here; Portfolio objects are built lazily
+        on first access via get()/get_all().
+        
         Returns:
-            Dictionary of portfolios
+            Dictionary of raw portfolio data keyed by name
         """
+        self._raw = {}
         self._portfolios = {}
+        self._dirty = set()
+        self._modified = False
+        self._load_ts = datetime.now().isoformat()
+        
+        # 快速路径：二进制副本记录的 JSON 摘要与当前文件一致时直接解码
+        cached = self._load_sidecar()
+        if cached is not None:
+            self._raw = cached
+            self._replay_journal()
+            self._loaded = True
+            return self._raw
+        
+        # 直接打开文件（EAFP），省去 exists() 的额外 stat
+        missing = False
+        try:
+            with open(self.storage_path, 'rb') as f:
+                self._raw = loads(f.read())
+        except FileNotFoundError:
+            missing = True
+        except Exception as e:
+            print(f"Error loading portfolios: {e}")
         
-        if self.storage_path.exists():
+        if missing:
+            # Try to load from example file
+            example_path = self.storage_path.parent / "portfolios.json.example"
             try:
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                with open(example_path, 'rb') as f:
+                    self._raw = loads(f.read())
                 
-                for name, pdata in data.items():
-                    self._portfolios[name] = Portfolio.from_dict(pdata)
-                    
+                # Save to actual file
+                self._modified = True
+                self.save()
+                print("Loaded portfolios from example file")
+            except FileNotFoundError:
+                pass
             except Exception as e:
-                print(f"Error loading portfolios: {e}")
-        else:
-            # Try to load from example file
-            example_path = self.storage_path.parent / "portfolios.json.example"
-            if example_path.exists():
-                try:
-                    with open(example_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    for name, pdata in data.items():
-                        self._portfolios[name] = Portfolio.from_dict(pdata)
-                    
-                    # Save to actual file
-                    self.save()
-                    print("Loaded portfolios from example file")
-                except Exception as e:
-                    print(f"Error loading example portfolios: {e}")
+                print(f"Error loading example portfolios: {e}")
         
+        self._replay_journal()
         self._loaded = True
-        return self._portfolios
+        return self._raw
     
     def save(self) -> bool:
         """
         Save all portfolios to storage file.
         
+        This is a full rewrite that also compacts (removes) the journal.
+        
         Returns:
             True if successful
         """
+        if not self._modified:
+            return True
+        
         try:
-            data = {name: p.to_dict() for name, p in self._portfolios.items()}
+            # 只重新序列化被修改过的组合，其余直接沿用原始数据
+            for name in self._dirty:
+                if name in self._raw:
+                    self._raw[name] = self._portfolios[name].to_dict()
+            self._dirty.clear()
             
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            # 先写临时文件再原子替换，避免写入中途崩溃损坏组合文件
+            tmp_path = self.storage_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                self._write_json_stream(f)
+            os.replace(tmp_path, self.storage_path)
+            self._journal_path.unlink(missing_ok=True)
             
+            self._modified = False
+            self._write_sidecar()
             return True
         except Exception as e:
             print(f"Error saving portfolios: {e}")
             return False
     
+    def _write_json_stream(self, f):
+        """
+        Write _raw as a JSON object one portfolio at a time, so only a single
+        portfolio's encoded bytes are held in memory at once.
+        """
+        separator = b'{\n'
+        for name, data in self._raw.items():
+            f.write(separator)
+            f.write(dumps_line(name) + b': ' + dumps(data))
+            separator = b',\n'
+        f.write(b'\n}\n' if separator == b',\n' else b'{}\n')
+    
+    # 二进制副本格式：魔数 + JSON 文件内容摘要 + marshal 编码的 _raw
+    # （marshal 只能还原基本数据类型，读取时不会执行任何代码）
+    _SIDECAR_MAGIC = b'QPSC1'
+    
+    @property
+    def _sidecar_path(self) -> Path:
+        """Binary copy of the portfolio file used for fast reloads."""
+        return self.storage_path.with_suffix('.sidecar')
+    
+    @staticmethod
+    def _json_digest(raw: bytes) -> bytes:
+        """Content digest of the portfolio JSON stored in the sidecar header."""
+        return hashlib.blake2b(raw, digest_size=16).digest()
+    
+    def _load_sidecar(self) -> Optional[Dict[str, dict]]:
+        """
+        Load raw portfolio data from the sidecar if it was written for the
+        current JSON contents (digest match). Returns None on any mismatch/error.
+        """
+        try:
+            with open(self.storage_path, 'rb') as f:
+                header = self._SIDECAR_MAGIC + self._json_digest(f.read())
+            with open(self._sidecar_path, 'rb') as f:
+                blob = f.read()
+            if not blob.startswith(header):
+                return None
+            data = marshal.loads(blob[len(header):])
+            return data if isinstance(data, dict) else None
+        except Exception:
+            return None
+    
+    def _write_sidecar(self):
+        """Write the sidecar, stamped with the digest of the saved JSON file."""
+        try:
+            with open(self.storage_path, 'rb') as f:
+                header = self._SIDECAR_MAGIC + self._json_digest(f.read())
+            tmp_path = self._sidecar_path.with_suffix('.sidecar.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                f.write(marshal.dumps(self._raw))
+            os.replace(tmp_path, self._sidecar_path)
+        except Exception:
+            # 副本只是缓存（例如含 marshal 不支持的类型），失败时下次加载走 JSON 即可
+            try:
+                self._sidecar_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+    
+    def _put(self, portfolio: Portfolio):
+        """Store a (new or modified) portfolio and mark it for serialization."""
+        portfolio.invalidate_cache()
+        if portfolio.name not in self._raw:
+            self._raw[portfolio.name] = {}
+        self._portfolios[portfolio.name] = portfolio
+        self._dirty.add(portfolio.name)
+        self._modified = True
+    
+    @property
+    def _journal_path(self) -> Path:
+        """Append-only log of mutations not yet compacted into the main file."""
+        return self.storage_path.with_suffix('.journal.jsonl')
+    
+    def _replay_journal(self):
+        """Apply journaled operations on top of the freshly loaded base data."""
+        try:
+            entries = read_journal(self._journal_path)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error reading portfolio journal: {e}")
+            return
+        
+        for entry in entries:
+            op = entry.get('op')
+            if op == 'put':
+                self._raw[entry['name']] = entry['data']
+            elif op == 'delete':
+                self._raw.pop(entry['name'], None)
+            elif op == 'rename':
+                self._raw.pop(entry['old'], None)
+                self._raw[entry['name']] = entry['data']
+        
+        # 主文件已落后于日志，下次 save() 时需要压缩
+        self._modified = bool(entries)
+    
+    def _append_journal(self, entry: dict) -> bool:
+        """
+        Append one operation to the journal (O(1) regardless of portfolio count).
+        Compacts into the main file once the journal exceeds half its size.
+        
+        Returns:
+            True if successful
+        """
+        try:
+            with open(self._journal_path, 'ab') as f:
+                f.write(dumps_line(entry) + b'\n')
+        except Exception as e:
+            print(f"Error saving portfolios: {e}")
+            return False
+        
+        try:
+            journal_size = self._journal_path.stat().st_size
+        except OSError:
+            return True
+        try:
+            storage_size = self.storage_path.stat().st_size
+        except OSError:
+            storage_size = 0
+        if journal_size > storage_size / 2:
+            return self.save()
+        return True
+    
+    def _journal_put(self, name: str, old_name: Optional[str] = None) -> bool:
+        """Serialize one portfolio into _raw and journal it as put/rename."""
+        self._raw[name] = self._portfolios[name].to_dict()
+        self._dirty.discard(name)
+        if old_name is None:
+            entry = {'op': 'put', 'name': name, 'data': self._raw[name]}
+        else:
+            entry = {'op': 'rename', 'old': old_name, 'name': name, 'data': self._raw[name]}
+        return self._append_journal(entry)
+    
     def get_all(self) -> Dict[str, Portfolio]:
         """Get all portfolios."""
-        self._ensure_loaded()
-        return self._portfolios.copy()
+        return {name: self._materialize(name) for name in self._raw}
     
     def get(self, name: str) -> Optional[Portfolio]:
         """
@@ -184,8 +411,7 @@ class PortfolioManager:
         Returns:
             Portfolio or None if not found
         """
-        self._ensure_loaded()
-        return self._portfolios.get(name)
+        return self._materialize(name)
     
     def create(self, portfolio: Portfolio) -> bool:
         """
@@ -197,16 +423,14 @@ class PortfolioManager:
         Returns:
             True if successful
         """
-        self._ensure_loaded()
-        
-        if portfolio.name in self._portfolios:
+        if portfolio.name in self._raw:
             return False  # Already exists
         
         portfolio.created_at = datetime.now().isoformat()
         portfolio.updated_at = portfolio.created_at
-        self._portfolios[portfolio.name] = portfolio
+        self._put(portfolio)
         
-        return self.save()
+        return self._journal_put(portfolio.name)
     
     def update(self, portfolio: Portfolio) -> bool:
         """
@@ -218,15 +442,13 @@ class PortfolioManager:
         Returns:
             True if successful
         """
-        self._ensure_loaded()
-        
-        if portfolio.name not in self._portfolios:
+        if portfolio.name not in self._raw:
             return False  # Not found
         
         portfolio.updated_at = datetime.now().isoformat()
-        self._portfolios[portfolio.name] = portfolio
+        self._put(portfolio)
         
-        return self.save()
+        return self._journal_put(portfolio.name)
     
     def delete(self, name: str) -> bool:
         """
@@ -238,13 +460,14 @@ class PortfolioManager:
         Returns:
             True if successful
         """
-        self._ensure_loaded()
-        
-        if name not in self._portfolios:
+        if name not in self._raw:
             return False
         
-        del self._portfolios[name]
-        return self.save()
+        del self._raw[name]
+        self._portfolios.pop(name, None)
+        self._dirty.discard(name)
+        self._modified = True
+        return self._append_journal({'op': 'delete', 'name': name})
     
     def rename(self, old_name: str, new_name: str) -> bool:
         """
@@ -257,20 +480,22 @@ class PortfolioManager:
         Returns:
             True if successful
         """
-        self._ensure_loaded()
-        
-        if old_name not in self._portfolios:
+        if old_name not in self._raw:
             return False
         
-        if new_name in self._portfolios:
+        if new_name in self._raw:
             return False  # New name already exists
         
-        portfolio = self._portfolios.pop(old_name)
+        portfolio = self._materialize(old_name)
+        del self._raw[old_name]
+        self._portfolios.pop(old_name, None)
+        self._dirty.discard(old_name)
+        
         portfolio.name = new_name
         portfolio.updated_at = datetime.now().isoformat()
-        self._portfolios[new_name] = portfolio
+        self._put(portfolio)
         
-        return self.save()
+        return self._journal_put(new_name, old_name=old_name)
     
     def import_legacy(self) -> int:
         """
@@ -282,7 +507,6 @@ class PortfolioManager:
         if not self.legacy_path.exists():
             return 0
         
-        self._ensure_loaded()
         imported = 0
         
         try:
@@ -291,11 +515,11 @@ class PortfolioManager:
             
             for name, pdata in legacy_data.items():
                 # Skip if already exists
-                if name in self._portfolios:
+                if name in self._raw:
                     continue
                 
                 portfolio = Portfolio.from_legacy_format(name, pdata)
-                self._portfolios[name] = portfolio
+                self._put(portfolio)
                 imported += 1
             
             if imported > 0:
@@ -327,8 +551,7 @@ class PortfolioManager:
     
     def get_portfolio_names(self) -> List[str]:
         """Get list of all portfolio names."""
-        self._ensure_loaded()
-        return list(self._portfolios.keys())
+        return list(self._raw.keys())
     
     def duplicate(self, source_name: str, new_name: str) -> bool:
         """
@@ -345,13 +568,13 @@ class PortfolioManager:
         if source is None:
             return False
         
-        if new_name in self._portfolios:
+        if new_name in self._raw:
             return False
         
         new_portfolio = Portfolio(
             name=new_name,
-            tickers=source.tickers.copy(),
-            weights=source.weights.copy(),
+            tickers=source.tickers,  # 不可变元组，可直接共享
+            weights={**source.weights},
             description=f"Copy of {source_name}",
         )
         
@@ -2,6 +2,6 @@
 
 from .engine import StrategyEngine, StrategyContext
 from .sandbox import SafeExecutor
-from .templates import STRATEGY_TEMPLATES
+from .templates import STRATEGY_TEMPLATES, TEMPLATE_NAMES
 
-__all__ = ['StrategyEngine', 'StrategyContext', 'SafeExecutor', 'STRATEGY_TEMPLATES']
+__all__ = ['StrategyEngine', 'StrategyContext', 'SafeExecutor', 'STRATEGY_TEMPLATES', 'TEMPLATE_NAMES']
@@ -44,6 +44,7 @@ ctx.set_target_weights(weights)
 ```
 
 ### 可用标的属性
-- `ctx.tickers` - 组合中的标的列表
+- `ctx.tickers` - 组合中的标的（只读元组，不能 `append`；需要修改时先 `list(ctx.tickers)`）
+- `ctx.current_weights` - 当前权重只读视图（需要修改时用 `ctx.get_current_weights()` 取得副本）
 - `ctx.current_date` - 当前日期
 """
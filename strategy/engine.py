@@ -3,18 +3,182 @@ Strategy engine for executing user-defined strategies.
 Provides the StrategyContext API and orchestrates strategy execution.
 """
 
-import json
+import concurrent.futures
+import os
+import re
+import types
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from datetime import datetime, date
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Union
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
 import pandas as pd
 import numpy as np
 
+from config.jsonio import dumps, dumps_line, loads, read_journal
 from config.settings import get_settings
 from data.fetcher import DataFetcher, get_data_fetcher
 from data.indicators import TechnicalIndicators
 from strategy.sandbox import SafeExecutor, StrategyError
+from strategy.templates import STRATEGY_TEMPLATES
+
+try:
+    from numba import njit
+except ImportError:  # numba 是可选依赖，缺失时使用 numpy 向量化实现
+    njit = None
+
+
+# TechnicalIndicators 全部为静态方法、无实例状态，所有上下文共享一个实例
+_INDICATORS = TechnicalIndicators()
+
+
+def _ffill_bfill_2d_numpy(arr: np.ndarray) -> np.ndarray:
+    """Forward- then backward-fill NaNs column-wise, in place (numpy fallback)."""
+    mask = np.isnan(arr)
+    if not mask.any():
+        return arr
+    n_rows, n_cols = arr.shape
+    rows = np.arange(n_rows)[:, None]
+    cols = np.arange(n_cols)
+    # 前向填充：每个位置取“最近一个非 NaN 行号”
+    idx = np.where(mask, 0, rows)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    arr[:] = arr[idx, cols]
+    # 后向填充：只剩列首的 NaN，取“之后第一个非 NaN 行号”
+    mask = np.isnan(arr)
+    if mask.any():
+        idx = np.where(mask, n_rows - 1, rows)
+        idx = np.minimum.accumulate(idx[::-1], axis=0)[::-1]
+        arr[:] = arr[idx, cols]
+    return arr
+
+
+if njit is not None:
+    # 显式签名：导入时即编译（见 data.indicators 中的内核）
+    @njit('float64[:, :](float64[:, :])', cache=True)
+    def _ffill_bfill_2d(arr):
+        """Forward- then backward-fill NaNs column-wise, in place (numba kernel)."""
+        n_rows, n_cols = arr.shape
+        for j in range(n_cols):
+            last = np.nan
+            for i in range(n_rows):
+                if np.isnan(arr[i, j]):
+                    arr[i, j] = last
+                else:
+                    last = arr[i, j]
+            last = np.nan
+            for i in range(n_rows - 1, -1, -1):
+                if np.isnan(arr[i, j]):
+                    arr[i, j] = last
+                else:
+                    last = arr[i, j]
+        return arr
+else:
+    _ffill_bfill_2d = _ffill_bfill_2d_numpy
+
+
+# JSON 词法片段：完整字符串（含转义）或结构字符，供顶层索引扫描使用
+_JSON_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\],]')
+
+
+def _index_top_level(raw: bytes) -> Optional[Dict[str, Tuple[int, int]]]:
+    """
+    Map each top-level key of a JSON object to the byte span of its value.
+    
+    Only strings and structural characters are visited (via a C-level regex),
+    so the cost is independent of how long the strategy code strings are.
+    Values are decoded later, on demand.
+    
+    Args:
+        raw: UTF-8 JSON bytes whose top level is an object
+        
+    Returns:
+        Ordered name -> (start, end) spans, or None if the layout is unexpected
+        (including top-level values that are not strings, objects or arrays)
+    """
+    index: Dict[str, Tuple[int, int]] = {}
+    depth = 0
+    key = None
+    start = None
+    expect_key = False
+    for m in _JSON_TOKEN_RE.finditer(raw):
+        ch = raw[m.start()]
+        if ch == 0x22:  # '"'
+            if depth == 1 and expect_key:
+                key = loads(m.group())
+                expect_key = False
+            elif depth == 1 and key is not None:
+                index[key] = (m.start(), m.end())
+                key = None
+        elif ch in b'{[':
+            if depth == 0:
+                if ch != 0x7B:  # top level must be an object
+                    return None
+                expect_key = True
+            elif depth == 1:
+                start = m.start()
+            depth += 1
+        elif ch in b'}]':
+            depth -= 1
+            if depth == 1 and start is not None:
+                index[key] = (start, m.end())
+                key = None
+                start = None
+            elif depth < 0 or (depth == 0 and key is not None):
+                return None  # 末个值是数字/布尔/null
+        elif depth == 1:  # ','
+            if key is not None:
+                return None  # 值是数字/布尔/null：扫描不到它的范围，改为整体解码
+            expect_key = True
+    return index if depth == 0 else None
+
+
+def _bounded_normalize(
+    values: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    target: float,
+) -> np.ndarray:
+    """
+    Scale non-negative weights to sum to `target` while respecting per-asset bounds.
+    
+    Iterative proportional adjustment: entries that violate a bound are
+    clipped and fixed, the remaining budget is spread proportionally over
+    the free entries, and this repeats until no free entry violates a bound
+    (at most N passes). Infeasible bounds yield the closest clipped result.
+    
+    Args:
+        values: Raw weights
+        lower: Per-asset lower bounds
+        upper: Per-asset upper bounds
+        target: Target sum
+        
+    Returns:
+        Bounded weights array
+    """
+    result = np.clip(values, lower, upper)
+    fixed = np.zeros(len(values), dtype=bool)
+    for _ in range(len(values)):
+        free = ~fixed
+        if not free.any():
+            break
+        remaining = target - result[fixed].sum()
+        free_total = values[free].sum()
+        if free_total > 0:
+            scaled = values * (remaining / free_total)
+        else:
+            # 自由部分全为零时平均分配剩余额度
+            scaled = np.full(len(values), remaining / free.sum())
+        result = np.where(free, scaled, result)
+        
+        too_low = free & (result < lower)
+        too_high = free & (result > upper)
+        violated = too_low | too_high
+        if not violated.any():
+            break
+        result = np.where(too_low, lower, np.where(too_high, upper, result))
+        fixed |= violated
+    return result
 
 
 @dataclass
@@ -33,6 +197,15 @@ class StrategyContext:
     Provides API for user strategies to access data and set allocations.
     """
     
+    # 回测中每个交易日都会创建一个实例：用 slots 省去实例 __dict__
+    __slots__ = (
+        '_tickers', '_ticker_set', '_current_weights', '_current_weights_view',
+        '_target_weights', '_current_date', '_lookback_days', '_data_fetcher',
+        '_indicators', '_signals', '_normalize_weights', '_price_cache',
+        '_ohlcv_cache', '_prices_df', '_latest_prices', '_close_arrays',
+        '_rolling_cache', '_indicator_cache', '_ticker_index', '_verbose',
+    )
+    
     def __init__(
         self,
         tickers: List[str],
@@ -41,6 +214,7 @@ class StrategyContext:
         data_fetcher: Optional[DataFetcher] = None,
         lookback_days: int = 252,
         normalize_weights: bool = True,
+        verbose: bool = True,
     ):
         """
         Initialize strategy context.
@@ -54,25 +228,41 @@ class StrategyContext:
             normalize_weights: Default behavior of set_target_weights when caller
                 does not specify `normalize`. True 保持历史行为；False 时按字面
                 权重执行（<100% 视为持现金，>100% 产生杠杆警告）。
+            verbose: Record ctx.log() messages. 回测等不读取信号的调用方传 False，
+                策略日志不再构建。
         """
-        self._tickers = tickers
+        self._tickers = tuple(tickers)
+        self._ticker_set = frozenset(self._tickers)
+        self._ticker_index = {t: i for i, t in enumerate(self._tickers)}
         self._current_weights = current_weights.copy()
+        self._current_weights_view = types.MappingProxyType(self._current_weights)
         self._target_weights: Optional[Dict[str, float]] = None
         self._current_date = current_date
         self._lookback_days = lookback_days
         self._data_fetcher = data_fetcher or get_data_fetcher()
-        self._indicators = TechnicalIndicators()
+        self._indicators = _INDICATORS
         self._signals: List[str] = []
+        self._verbose = verbose
         self._normalize_weights = normalize_weights
         
         # Cache for price data
         self._price_cache: Dict[str, pd.Series] = {}
         self._ohlcv_cache: Dict[str, pd.DataFrame] = {}
+        # 全部标的的对齐价格表，首次 get_prices() 时构建，之后按需切片
+        self._prices_df: Optional[pd.DataFrame] = None
+        # 最新价格标量缓存（current_price / current_vix 直接读取）
+        self._latest_prices: Dict[str, float] = {}
+        # 收盘价 ndarray 缓存（均线交叉等标量计算使用）
+        self._close_arrays: Dict[str, np.ndarray] = {}
+        # 按周期缓存的全部标的滚动均线矩阵（T×N），ma / 均线比较共用
+        self._rolling_cache: Dict[int, pd.DataFrame] = {}
+        # 其余指标按 (指标, 标的, 参数) 缓存：同一交易日内重复调用不再重算
+        self._indicator_cache: Dict[tuple, Union[pd.Series, pd.DataFrame]] = {}
     
     @property
-    def tickers(self) -> List[str]:
-        """Available tickers."""
-        return self._tickers.copy()
+    def tickers(self) -> Tuple[str, ...]:
+        """Available tickers (immutable tuple, no copy per access)."""
+        return self._tickers
     
     @property
     def current_date(self) -> date:
@@ -80,9 +270,22 @@ class StrategyContext:
         return self._current_date
     
     @property
-    def signals(self) -> List[str]:
+    def verbose(self) -> bool:
+        """Whether ctx.log() messages are recorded (guard costly log formatting with it)."""
+        return self._verbose
+    
+    @property
+    def signals(self) -> Tuple[str, ...]:
         """Generated signals/messages."""
-        return self._signals.copy()
+        return tuple(self._signals)
+    
+    @property
+    def current_weights(self) -> Mapping[str, float]:
+        """
+        Read-only view of current weights (no copy per access).
+        Use get_current_weights() for a mutable copy.
+        """
+        return self._current_weights_view
     
     @property
     def prices(self) -> pd.DataFrame:
@@ -100,15 +303,64 @@ class StrategyContext:
         """
         return self.get_prices()
     
-    def log(self, message: str):
-        """Log a signal or message."""
+    def log(self, message: Union[str, Callable[[], str]], *args):
+        """
+        Log a signal or message.
+        
+        Args:
+            message: Message text, %-style format string, or a zero-argument
+                     callable returning the text (only called when verbose,
+                     e.g. ``ctx.log(lambda: f"...")``)
+            *args: Values for the format string; formatting is deferred until
+                   the message is actually recorded
+                   (e.g. ``ctx.log("%s RSI=%.0f", ticker, rsi)``)
+        """
+        if not self._verbose:
+            return
+        if callable(message):
+            message = message()
+        elif args:
+            message = message % args
         self._signals.append(message)
     
     def get_current_weights(self) -> Dict[str, float]:
-        """Get current portfolio weights."""
+        """
+        Get a mutable copy of the current portfolio weights.
+        
+        Strategies edit the returned dict and pass it to set_target_weights(),
+        so this stays a copy; use the read-only `current_weights` view when
+        only reading.
+        """
         return self._current_weights.copy()
     
-    def set_target_weights(self, weights: Dict[str, float], normalize: Optional[bool] = None):
+    @contextmanager
+    def weights_view(
+        self,
+        normalize: Optional[bool] = None,
+        bounds: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> Iterator[Dict[str, float]]:
+        """
+        Edit a working copy of the current weights inside a ``with`` block.
+        
+        On a normal exit the edited dict is passed to set_target_weights(); if
+        nothing changed, the call (validation / normalization) is skipped and
+        the current weights are kept. An exception inside the block sets nothing.
+        
+        Args:
+            normalize: Passed to set_target_weights
+            bounds: Passed to set_target_weights
+        """
+        weights = self._current_weights.copy()
+        yield weights
+        if weights != self._current_weights:
+            self.set_target_weights(weights, normalize=normalize, bounds=bounds)
+    
+    def set_target_weights(
+        self,
+        weights: Dict[str, float],
+        normalize: Optional[bool] = None,
+        bounds: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
         """
         Set target portfolio weights.
         
@@ -120,24 +372,30 @@ class StrategyContext:
                       If None (default), fall back to the context-level default
                       (`StrategyContext(normalize_weights=...)`，由调用方/回测/信号
                       订阅决定)。
+            bounds: Optional ticker -> (min, max) weight limits (percentage).
+                    Normalization then respects the limits (see
+                    normalize_weights_bounded); without normalization the
+                    weights are just clipped.
         """
         # Filter to only include known tickers, warn about unknown ones
-        # Also ensure non-negative weights
-        filtered_weights = {}
-        for ticker, weight in weights.items():
-            if ticker in self._tickers:
-                filtered_weights[ticker] = max(0, weight)  # 确保非负
-            else:
-                self._signals.append(f"⚠️ 忽略未知标的: {ticker}")
+        known = [t for t in weights if t in self._ticker_set]
+        if len(known) < len(weights):
+            unknown = [t for t in weights if t not in self._ticker_set]
+            self._signals.append(f"⚠️ 忽略未知标的: {', '.join(map(str, unknown))}")
 
         # 解析最终 normalize 决策：显式传参优先，否则走上下文默认
         effective_normalize = self._normalize_weights if normalize is None else normalize
 
-        if not filtered_weights:
-            self._target_weights = filtered_weights
+        if not known:
+            self._target_weights = {}
             return
 
-        total = sum(filtered_weights.values())
+        # Ensure non-negative weights (一次性转为数组处理)
+        values = np.fromiter(
+            (max(0.0, weights[t]) for t in known), dtype=np.float64, count=len(known)
+        )
+        total = float(values.sum())
+        filtered_weights = dict(zip(known, values.tolist()))
 
         if effective_normalize:
             # Normalize weights to sum to 100%
@@ -145,16 +403,23 @@ class StrategyContext:
                 # Only log if there's a significant difference
                 if abs(total - 100) > 0.1:
                     self._signals.append(f"📊 权重已归一化: {total:.1f}% → 100%")
-                filtered_weights = {
-                    t: (w / total) * 100 
-                    for t, w in filtered_weights.items()
-                }
+                if bounds:
+                    lower, upper = self._bound_arrays(known, bounds, 100.0)
+                    values = _bounded_normalize(values, lower, upper, 100.0)
+                else:
+                    values *= 100.0 / total
+                filtered_weights = dict(zip(known, values.tolist()))
             else:
                 # All weights are zero - keep current weights
                 self._signals.append("⚠️ 所有权重为零，保持当前配置")
                 filtered_weights = self._current_weights.copy()
         else:
-            # 不做归一化，按字面值使用
+            # 不做归一化，按字面值使用（有上下限时仅做裁剪）
+            if bounds:
+                lower, upper = self._bound_arrays(known, bounds, 100.0)
+                values = np.clip(values, lower, upper)
+                total = float(values.sum())
+                filtered_weights = dict(zip(known, values.tolist()))
             if total > 100 + 0.1:
                 self._signals.append(
                     f"⚠️ 目标权重总和 {total:.1f}% > 100%，可能产生杠杆敞口"
@@ -167,6 +432,101 @@ class StrategyContext:
         
         self._target_weights = filtered_weights
     
+    @staticmethod
+    def _bound_arrays(
+        tickers: List[str],
+        bounds: Dict[str, Tuple[float, float]],
+        default_upper: float,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Lower/upper bound arrays aligned with tickers (unbounded -> [0, default_upper])."""
+        n = len(tickers)
+        lower = np.fromiter((bounds.get(t, (0.0, default_upper))[0] for t in tickers), dtype=np.float64, count=n)
+        upper = np.fromiter((bounds.get(t, (0.0, default_upper))[1] for t in tickers), dtype=np.float64, count=n)
+        return lower, upper
+    
+    def normalize_weights_bounded(
+        self,
+        weights: Dict[str, float],
+        bounds: Dict[str, Tuple[float, float]],
+        target_sum: float = 100,
+    ) -> Dict[str, float]:
+        """
+        Normalize weights to a target sum while keeping each weight within bounds.
+        
+        Args:
+            weights: Dictionary of ticker -> weight
+            bounds: Dictionary of ticker -> (min, max); unlisted tickers are
+                    bounded by [0, target_sum]
+            target_sum: Target sum for weights (default 100%)
+            
+        Returns:
+            Normalized weights dictionary
+            
+        Example:
+            weights = {'A': 80, 'B': 10, 'C': 10}
+            ctx.normalize_weights_bounded(weights, {'A': (0, 50)})  # {'A': 50, 'B': 25, 'C': 25}
+        """
+        tickers = list(weights)
+        values = np.fromiter(
+            (max(0.0, weights[t]) for t in tickers), dtype=np.float64, count=len(tickers)
+        )
+        lower, upper = self._bound_arrays(tickers, bounds, float(target_sum))
+        return dict(zip(tickers, _bounded_normalize(values, lower, upper, float(target_sum)).tolist()))
+    
+    # Vector weights (aligned with ctx.tickers)
+    def weights_vec(self, weights: Mapping[str, float]) -> np.ndarray:
+        """
+        Convert a ticker -> weight mapping to a float64 vector in ctx.tickers order.
+        
+        Tickers missing from `weights` get 0; unknown tickers are dropped.
+        """
+        vec = np.zeros(len(self._tickers))
+        index = self._ticker_index
+        for ticker, weight in weights.items():
+            i = index.get(ticker)
+            if i is not None:
+                vec[i] = weight
+        return vec
+    
+    def current_weights_vec(self) -> np.ndarray:
+        """Current weights as a float64 vector in ctx.tickers order."""
+        return self.weights_vec(self._current_weights)
+    
+    def set_target_weights_vec(self, weights: np.ndarray, normalize: Optional[bool] = None):
+        """
+        Set target weights from a vector in ctx.tickers order.
+        
+        Same semantics as set_target_weights(dict(zip(ctx.tickers, weights)), normalize).
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != (len(self._tickers),):
+            raise ValueError(
+                f"weights must have one entry per ticker ({len(self._tickers)}), got shape {weights.shape}"
+            )
+        self.set_target_weights(dict(zip(self._tickers, weights.tolist())), normalize=normalize)
+    
+    def rebalance_linear(
+        self,
+        current_vec: np.ndarray,
+        target_vec: np.ndarray,
+        threshold: float,
+    ) -> np.ndarray:
+        """
+        Threshold rebalance in vector form.
+        
+        Flags tickers whose |current - target| exceeds `threshold` (percentage
+        points) and, if any are flagged, sets `target_vec` as the target weights.
+        
+        Returns:
+            Boolean deviation mask in ctx.tickers order
+        """
+        current_vec = np.asarray(current_vec, dtype=np.float64)
+        target_vec = np.asarray(target_vec, dtype=np.float64)
+        mask = np.abs(current_vec - target_vec) > threshold
+        if mask.any():
+            self.set_target_weights_vec(target_vec)
+        return mask
+    
     def get_target_weights(self) -> Optional[Dict[str, float]]:
         """Get target weights if set."""
         return self._target_weights
@@ -199,8 +559,35 @@ class StrategyContext:
         
         return {t: (w / total) * target_sum for t, w in clean_weights.items()}
     
+    def _prefetch(self, tickers: List[str]):
+        """Fetch all uncached tickers in one batch request and fill the price cache."""
+        missing = [t for t in tickers if t not in self._price_cache]
+        if not missing:
+            return
+        
+        df = self._data_fetcher.fetch_prices_batch(
+            missing,
+            end_date=self._current_date.strftime('%Y-%m-%d'),
+            lookback_days=self._lookback_days
+        )
+        for ticker in missing:
+            if ticker in df.columns:
+                self._store_prices(ticker, df[ticker].dropna())
+            else:
+                self._store_prices(ticker, pd.Series(dtype=float))
+    
+    def _store_prices(self, ticker: str, prices: pd.Series):
+        """Cache a price series and its latest value as a plain float."""
+        self._price_cache[ticker] = prices
+        if not prices.empty:
+            self._latest_prices[ticker] = float(prices.iloc[-1])
+    
     def _get_price_data(self, ticker: str) -> pd.Series:
         """Get cached price data for ticker."""
+        if ticker not in self._price_cache and ticker in self._ticker_set:
+            # 首次访问组合内标的时一次性批量拉取全部标的，避免逐个请求
+            self._prefetch(self._tickers)
+        
         if ticker not in self._price_cache:
             end_date = self._current_date.strftime('%Y-%m-%d')
             df = self._data_fetcher.fetch_prices(
@@ -209,9 +596,9 @@ class StrategyContext:
                 lookback_days=self._lookback_days
             )
             if not df.empty:
-                self._price_cache[ticker] = df.iloc[:, 0] if isinstance(df, pd.DataFrame) else df
+                self._store_prices(ticker, df.iloc[:, 0] if isinstance(df, pd.DataFrame) else df)
             else:
-                self._price_cache[ticker] = pd.Series(dtype=float)
+                self._store_prices(ticker, pd.Series(dtype=float))
         
         return self._price_cache[ticker]
     
@@ -244,8 +631,32 @@ class StrategyContext:
         Returns:
             DataFrame with tickers as columns
         """
-        if tickers is None:
-            tickers = self._tickers
+        if tickers is None or self._ticker_set.issuperset(tickers):
+            df = self._get_universe_prices()
+            if tickers is not None:
+                columns = [t for t in tickers if t in df.columns]
+                if any(self._ma_column(t) is None for t in columns):
+                    # 子集中有标的不在全日历上：按子集自身的日历重建，避免引入其他市场的填充行
+                    return self._build_prices(columns, lookback)
+                df = df[columns]
+            else:
+                # 浅拷贝：策略增删列不会影响缓存
+                df = df.copy(deep=False)
+            if lookback and len(df) > lookback:
+                df = df.iloc[-lookback:]
+            return df
+        
+        return self._build_prices(tickers, lookback)
+    
+    def _get_universe_prices(self) -> pd.DataFrame:
+        """Aligned price table for all tickers, built once per context."""
+        if self._prices_df is None:
+            self._prices_df = self._build_prices(self._tickers)
+        return self._prices_df
+    
+    def _build_prices(self, tickers: List[str], lookback: int = None) -> pd.DataFrame:
+        """Assemble an aligned, gap-filled price table from per-ticker series."""
+        self._prefetch(tickers)
         
         data = {}
         for ticker in tickers:
@@ -256,8 +667,18 @@ class StrategyContext:
         if not data:
             return pd.DataFrame()
         
-        df = pd.DataFrame(data)
-        return df.ffill().bfill()
+        series = list(data.values())
+        index = series[0].index
+        if all(s.index.equals(index) for s in series[1:]):
+            # 同一批次拉取的标的共享交易日历：直接拼接数组，跳过索引对齐
+            arr = np.column_stack([s.to_numpy(dtype=np.float64) for s in series])
+        else:
+            df = pd.DataFrame(data)
+            index = df.index
+            arr = df.to_numpy(dtype=np.float64, copy=True)
+        
+        arr = _ffill_bfill_2d(arr)
+        return pd.DataFrame(arr, index=index, columns=list(data), copy=False)
     
     def get_returns(self, ticker: str, lookback: int = None) -> pd.Series:
         """
@@ -271,7 +692,19 @@ class StrategyContext:
             Daily return series
         """
         prices = self.get_price(ticker, lookback)
-        return prices.pct_change().fillna(0)
+        arr = prices.to_numpy(dtype=np.float64)
+        if len(arr) == 0 or np.isnan(arr).any():
+            # 含缺失值时沿用 pandas 的前值填充语义
+            return prices.pct_change().fillna(0)
+        
+        # 单次分配、原地计算：r[t] = p[t] / p[t-1] - 1，首日为 0
+        out = np.empty_like(arr)
+        out[0] = 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(arr[1:], arr[:-1], out=out[1:])
+        out[1:] -= 1.0
+        out[np.isnan(out)] = 0.0  # 0/0
+        return pd.Series(out, index=prices.index, name=prices.name)
     
     def vix(self, lookback: int = None) -> pd.Series:
         """
@@ -287,90 +720,391 @@ class StrategyContext:
     
     def current_vix(self) -> float:
         """Get current VIX value."""
-        vix = self.vix(5)
-        return vix.iloc[-1] if not vix.empty else 20.0
+        self._get_price_data("^VIX")
+        return self._latest_prices.get("^VIX", 20.0)
     
     # Technical Indicators
     def ma(self, ticker: str, period: int) -> pd.Series:
         """Simple Moving Average."""
+        col = self._ma_column(ticker)
+        if col is not None:
+            return self._rolling_ma(period).iloc[:, col].copy()
         prices = self.get_price(ticker)
         return self._indicators.sma(prices, period)
     
     def ema(self, ticker: str, period: int) -> pd.Series:
         """Exponential Moving Average."""
-        prices = self.get_price(ticker)
-        return self._indicators.ema(prices, period)
+        return self._memo(
+            ('ema', ticker, period),
+            lambda: self._indicators.ema(self.get_price(ticker), period),
+        )
     
     def rsi(self, ticker: str, period: int = 14) -> pd.Series:
         """Relative Strength Index."""
-        prices = self.get_price(ticker)
-        return self._indicators.rsi(prices, period)
+        return self._memo(
+            ('rsi', ticker, period),
+            lambda: self._indicators.rsi(self.get_price(ticker), period),
+        )
     
     def macd(self, ticker: str, fast: int = 12, slow: int = 26, signal: int = 9) -> pd.DataFrame:
         """MACD indicator."""
-        prices = self.get_price(ticker)
-        return self._indicators.macd(prices, fast, slow, signal)
+        return self._memo(
+            ('macd', ticker, fast, slow, signal),
+            lambda: self._indicators.macd(self.get_price(ticker), fast, slow, signal),
+        )
     
     def bollinger(self, ticker: str, period: int = 20, std: float = 2.0) -> pd.DataFrame:
         """Bollinger Bands."""
-        prices = self.get_price(ticker)
-        return self._indicators.bollinger_bands(prices, period, std)
+        return self._memo(
+            ('bollinger', ticker, period, std),
+            lambda: self._indicators.bollinger_bands(self.get_price(ticker), period, std),
+        )
     
     def atr(self, ticker: str, period: int = 14) -> pd.Series:
         """Average True Range (simplified using close prices)."""
-        prices = self.get_price(ticker)
-        return self._indicators.atr_from_close(prices, period)
+        return self._memo(
+            ('atr', ticker, period),
+            lambda: self._indicators.atr_from_close(self.get_price(ticker), period),
+        )
     
     def volatility(self, ticker: str, period: int = 20, annualize: bool = True) -> pd.Series:
         """Rolling volatility."""
-        prices = self.get_price(ticker)
-        return self._indicators.volatility(prices, period, annualize)
+        return self._memo(
+            ('volatility', ticker, period, annualize),
+            lambda: self._indicators.volatility(self.get_price(ticker), period, annualize),
+        )
     
     def momentum(self, ticker: str, period: int = 10) -> pd.Series:
         """Price momentum."""
-        prices = self.get_price(ticker)
-        return self._indicators.momentum(prices, period)
+        return self._memo(
+            ('momentum', ticker, period),
+            lambda: self._indicators.momentum(self.get_price(ticker), period),
+        )
     
     def drawdown(self, ticker: str) -> pd.DataFrame:
         """Drawdown analysis."""
-        prices = self.get_price(ticker)
-        return self._indicators.drawdown(prices)
+        return self._memo(
+            ('drawdown', ticker),
+            lambda: self._indicators.drawdown(self.get_price(ticker)),
+        )
+    
+    def _memo(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        """Indicator result cached per context; callers get a copy so edits don't leak."""
+        value = self._indicator_cache.get(key)
+        if value is None:
+            value = compute()
+            self._indicator_cache[key] = value
+        return value.copy()
+    
+    # Batch indicators (all tickers at once, computed on ctx.prices)
+    def ma_all(self, period: int) -> pd.DataFrame:
+        """Simple Moving Average for every ticker (one column per ticker)."""
+        return self._memo(
+            ('ma_all', period),
+            lambda: self._own_calendar_columns(self._rolling_ma(period).copy(), lambda t: self.ma(t, period)),
+        )
+    
+    def ema_all(self, period: int) -> pd.DataFrame:
+        """Exponential Moving Average for every ticker (one column per ticker)."""
+        return self._memo(
+            ('ema_all', period),
+            lambda: self._own_calendar_columns(
+                self._indicators.ema(self._get_universe_prices(), period), lambda t: self.ema(t, period)),
+        )
+    
+    def rsi_all(self, period: int = 14) -> pd.DataFrame:
+        """Relative Strength Index for every ticker (one column per ticker)."""
+        return self._memo(
+            ('rsi_all', period),
+            lambda: self._own_calendar_columns(
+                self._indicators.rsi(self._get_universe_prices(), period), lambda t: self.rsi(t, period)),
+        )
+    
+    def momentum_all(self, period: int = 10) -> pd.DataFrame:
+        """Price momentum (%) for every ticker (one column per ticker)."""
+        return self._memo(
+            ('momentum_all', period),
+            lambda: self._own_calendar_columns(
+                self._indicators.momentum(self._get_universe_prices(), period), lambda t: self.momentum(t, period)),
+        )
+    
+    def volatility_all(self, period: int = 20, annualize: bool = True) -> pd.DataFrame:
+        """Rolling volatility for every ticker (one column per ticker)."""
+        return self._memo(
+            ('volatility_all', period, annualize),
+            lambda: self._own_calendar_columns(
+                self._indicators.volatility(self._get_universe_prices(), period, annualize),
+                lambda t: self.volatility(t, period, annualize)),
+        )
+    
+    def price_above_ma_all(self, period: int) -> pd.Series:
+        """Whether each ticker's latest price is above its SMA (bool Series indexed by ticker)."""
+        prices = self._get_universe_prices()
+        if prices.empty:
+            return pd.Series(dtype=bool)
+        rm = self._rolling_cache.get(period)
+        # 只需最新一行均线：对最后 period 行求均值（与 min_periods=1 的 rolling 一致）
+        latest_ma = rm.iloc[-1] if rm is not None else prices.iloc[-period:].mean().rename(prices.index[-1])
+        above = prices.iloc[-1] > latest_ma
+        # 不在全日历上的标的逐个计算（与 price_above_ma 保持一致）
+        for ticker in above.index:
+            if self._ma_column(ticker) is None:
+                above[ticker] = self.price_above_ma(ticker, period)
+        return above
+    
+    def ma_cross_all(self, short_period: int, long_period: int) -> pd.Series:
+        """
+        MA crossover signal for every ticker on the latest bar.
+        
+        Returns:
+            int Series indexed by ticker: 1 where ma_cross_up(), -1 where
+            ma_cross_down(), otherwise 0
+        """
+        prices = self._get_universe_prices()
+        signals = pd.Series(0, index=list(self._tickers), dtype=np.int64)
+        if len(prices) >= 2:
+            # 两条均线各取最后两行，一次比较出全部标的的金叉/死叉
+            short = self._rolling_ma(short_period).to_numpy()[-2:]
+            long = self._rolling_ma(long_period).to_numpy()[-2:]
+            prev, cur = short - long
+            up = (prev <= 0) & (cur > 0)
+            down = (prev >= 0) & (cur < 0)
+            signals.loc[prices.columns] = up.astype(np.int64) - down.astype(np.int64)
+        
+        # 不在对齐表内或序列较短的标的逐个计算（与 ma_cross_up/down 保持一致）
+        for ticker in self._tickers:
+            if self._ma_column(ticker) is None:
+                if self.ma_cross_up(ticker, short_period, long_period):
+                    signals[ticker] = 1
+                elif self.ma_cross_down(ticker, short_period, long_period):
+                    signals[ticker] = -1
+                else:
+                    signals[ticker] = 0
+        return signals
+    
+    def get_prices_matrix(self) -> np.ndarray:
+        """
+        Aligned price table as a read-only (T, N) float64 array.
+        
+        Columns follow ctx.prices.columns; no copy is made.
+        """
+        arr = self._get_universe_prices().to_numpy(dtype=np.float64).view()
+        arr.flags.writeable = False
+        return arr
+    
+    # Scalar indicators (latest value only, no Series is built)
+    def momentum_last(self, ticker: str, period: int = 10) -> Optional[float]:
+        """
+        Latest momentum (%), same as momentum(ticker, period).iloc[-1].
+        
+        Returns None when there are not more than `period` prices.
+        """
+        arr = self._close_array(ticker)
+        if len(arr) <= period:
+            return None
+        last, base = arr[-1], arr[-1 - period]
+        if np.isnan(last) or np.isnan(base):
+            return self._last_value(self.momentum(ticker, period))
+        return float((last / base - 1.0) * 100)
+    
+    def rsi_last(self, ticker: str, period: int = 14) -> Optional[float]:
+        """
+        Latest RSI, same as rsi(ticker, period).iloc[-1].
+        
+        Returns None when no prices are available.
+        """
+        return self._indicators.rsi_last(self.get_price(ticker), period)
+    
+    def volatility_last(self, ticker: str, period: int = 20, annualize: bool = True) -> Optional[float]:
+        """
+        Latest rolling volatility, same as volatility(ticker, period, annualize).iloc[-1].
+        
+        Returns None when fewer than 2 returns are available.
+        """
+        arr = self._close_array(ticker)
+        # 只需最后 period 个收益率（min_periods=1：不足时用全部已有收益率）
+        window = arr[-(period + 1):]
+        if len(window) < 3:
+            return None
+        if np.isnan(window).any():
+            return self._last_value(self.volatility(ticker, period, annualize))
+        vol = float(np.std(window[1:] / window[:-1] - 1.0, ddof=1))
+        return vol * np.sqrt(252) if annualize else vol
+    
+    def ma_last(self, ticker: str, period: int) -> Optional[float]:
+        """
+        Latest SMA, same as ma(ticker, period).iloc[-1].
+        
+        Only the final `period` prices are averaged (no rolling series is
+        built) unless the SMA matrix for this period is already cached.
+        Returns None when no prices are available.
+        """
+        col = self._ma_column(ticker)
+        if col is not None and period in self._rolling_cache:
+            rm = self._rolling_cache[period]
+            return float(rm.iat[-1, col]) if len(rm) else None
+        window = self._close_array(ticker)[-period:]
+        if len(window) == 0:
+            return None
+        if np.isnan(window).any():
+            return self._last_value(self.ma(ticker, period))
+        # min_periods=1 语义：数据不足 period 时对已有数据求均值
+        return float(window.mean())
+    
+    def bollinger_last(self, ticker: str, period: int = 20, std: float = 2.0) -> Optional[Dict[str, float]]:
+        """
+        Latest Bollinger Bands, same as bollinger(ticker, period, std).iloc[-1].
+        
+        Returns:
+            Dict with 'upper', 'middle', 'lower', or None when fewer than
+            2 prices are available
+        """
+        window = self._close_array(ticker)[-period:]
+        if len(window) < 2:
+            return None
+        if np.isnan(window).any():
+            last = self.bollinger(ticker, period, std).iloc[-1]
+            if last.isna().any():
+                return None
+            return {k: float(v) for k, v in last.items()}
+        middle = float(window.mean())
+        width = float(window.std(ddof=1)) * std
+        return {'upper': middle + width, 'middle': middle, 'lower': middle - width}
+    
+    def drawdown_last(self, ticker: str) -> Optional[float]:
+        """
+        Current drawdown from the running peak in percent (<= 0),
+        same as drawdown(ticker)['drawdown_pct'].iloc[-1].
+        
+        Returns None when no prices are available.
+        """
+        arr = self._close_array(ticker)
+        if len(arr) == 0:
+            return None
+        if np.isnan(arr).any():
+            return self._last_value(self.drawdown(ticker)['drawdown_pct'])
+        return float((arr[-1] / arr.max() - 1.0) * 100)
     
     # Utility methods
     def current_price(self, ticker: str) -> float:
         """Get current price for ticker."""
-        prices = self.get_price(ticker, 5)
-        return prices.iloc[-1] if not prices.empty else 0.0
+        self._get_price_data(ticker)
+        return self._latest_prices.get(ticker, 0.0)
     
     def price_above_ma(self, ticker: str, period: int) -> bool:
         """Check if price is above moving average."""
         price = self.current_price(ticker)
-        ma = self.ma(ticker, period)
-        return price > ma.iloc[-1] if not ma.empty else False
+        ma = self.ma_last(ticker, period)
+        return price > ma if ma is not None else False
     
     def price_below_ma(self, ticker: str, period: int) -> bool:
         """Check if price is below moving average."""
         return not self.price_above_ma(ticker, period)
     
+    def _close_array(self, ticker: str) -> np.ndarray:
+        """Price series of ticker as a cached float64 ndarray."""
+        arr = self._close_arrays.get(ticker)
+        if arr is None:
+            arr = self._get_price_data(ticker).to_numpy(dtype=np.float64)
+            self._close_arrays[ticker] = arr
+        return arr
+    
+    @staticmethod
+    def _last_value(series: pd.Series) -> Optional[float]:
+        """Last value of an indicator series, or None if empty/NaN."""
+        if series.empty:
+            return None
+        value = float(series.iloc[-1])
+        return None if np.isnan(value) else value
+    
+    def _rolling_ma(self, period: int) -> pd.DataFrame:
+        """SMA matrix for all tickers, computed once per period and cached."""
+        rm = self._rolling_cache.get(period)
+        if rm is None:
+            rm = self._indicators.sma(self._get_universe_prices(), period)
+            self._rolling_cache[period] = rm
+        return rm
+    
+    def _own_calendar_columns(self, frame: pd.DataFrame, compute: Callable[[str], pd.Series]) -> pd.DataFrame:
+        """
+        Replace columns of tickers off the aligned calendar with compute(ticker).
+        
+        Indicators on the gap-filled column would differ from the per-ticker
+        call; the ticker's own result is reindexed onto the table's dates and
+        carried forward over its non-trading days. frame is modified in place.
+        """
+        for ticker in frame.columns:
+            if self._ma_column(ticker) is None:
+                frame[ticker] = compute(ticker).reindex(frame.index).ffill()
+        return frame
+    
+    def _ma_column(self, ticker: str) -> Optional[int]:
+        """
+        Column position of ticker in the cached SMA matrices.
+        
+        Returns None for tickers outside the universe, or whose own series
+        is shorter than the aligned table (the gap-filled column would give
+        a different moving average).
+        """
+        if ticker not in self._ticker_set:
+            return None
+        prices = self._get_universe_prices()
+        if ticker not in prices.columns or len(self._price_cache[ticker]) != len(prices):
+            return None
+        return prices.columns.get_loc(ticker)
+    
+    def _ma_tail(self, ticker: str, period: int) -> Optional[tuple]:
+        """
+        Last two SMA values (previous, latest) for ticker, same as ma(...).iloc[-2:].
+        
+        Universe tickers read the last two rows of the cached SMA matrix;
+        other tickers only average the final period+1 samples, so no full
+        rolling series is built. Returns None if fewer than 2 prices are available.
+        """
+        col = self._ma_column(ticker)
+        if col is not None:
+            rm = self._rolling_ma(period)
+            if len(rm) < 2:
+                return None
+            tail = rm.to_numpy()[-2:, col]
+            return float(tail[0]), float(tail[1])
+        
+        arr = self._close_array(ticker)
+        
+        n = len(arr)
+        if n < 2:
+            return None
+        
+        window = arr[max(0, n - 1 - period):]
+        if np.isnan(window).any():
+            # 含缺失值时沿用 rolling 的 NaN 处理语义
+            ma = self.ma(ticker, period)
+            return float(ma.iloc[-2]), float(ma.iloc[-1])
+        
+        # min_periods=1 语义：数据不足 period 时对已有数据求均值
+        latest = window[-period:].mean()
+        previous = window[:-1][-period:].mean()
+        return float(previous), float(latest)
+    
     def ma_cross_up(self, ticker: str, short_period: int, long_period: int) -> bool:
         """Check if short MA crossed above long MA recently."""
-        short_ma = self.ma(ticker, short_period)
-        long_ma = self.ma(ticker, long_period)
+        short_ma = self._ma_tail(ticker, short_period)
+        long_ma = self._ma_tail(ticker, long_period)
         
-        if len(short_ma) < 2 or len(long_ma) < 2:
+        if short_ma is None or long_ma is None:
             return False
         
-        return (short_ma.iloc[-2] <= long_ma.iloc[-2]) and (short_ma.iloc[-1] > long_ma.iloc[-1])
+        return (short_ma[0] <= long_ma[0]) and (short_ma[1] > long_ma[1])
     
     def ma_cross_down(self, ticker: str, short_period: int, long_period: int) -> bool:
         """Check if short MA crossed below long MA recently."""
-        short_ma = self.ma(ticker, short_period)
-        long_ma = self.ma(ticker, long_period)
+        short_ma = self._ma_tail(ticker, short_period)
+        long_ma = self._ma_tail(ticker, long_period)
         
-        if len(short_ma) < 2 or len(long_ma) < 2:
+        if short_ma is None or long_ma is None:
             return False
         
-        return (short_ma.iloc[-2] >= long_ma.iloc[-2]) and (short_ma.iloc[-1] < long_ma.iloc[-1])
+        return (short_ma[0] >= long_ma[0]) and (short_ma[1] < long_ma[1])
 
 
 class StrategyEngine:
@@ -379,31 +1113,110 @@ class StrategyEngine:
     Handles strategy storage, validation, and execution.
     """
     
+    # 每次执行都相同的策略全局变量，只构建一次
+    _BASE_CONTEXT: Dict[str, Any] = {
+        # Expose numpy and pandas for calculations
+        'np': np,
+        'pd': pd,
+        # Expose common math functions
+        'abs': abs,
+        'round': round,
+        'min': min,
+        'max': max,
+        'sum': sum,
+        'len': len,
+    }
+    
+    # 内置模板是否已预编译进共享编译缓存（进程内只做一次）
+    _templates_warmed = False
+    
     def __init__(self):
         """Initialize strategy engine."""
         self.settings = get_settings()
         self.storage_path = self.settings.strategies_file
         self.executor = SafeExecutor(timeout_seconds=self.settings.strategy_timeout_seconds)
+        self._warm_templates()
         
         # Ensure data directory exists
         self.storage_path.parent.mkdir(parents=True, exist_ok=True)
         
-        self._strategies: Dict[str, dict] = {}
+        self._strategies: Dict[str, dict] = {}  # 已解码的策略
+        # 磁盘文件原始字节及各策略的字节区间，按需解码
+        self._raw: bytes = b""
+        self._index: Dict[str, Tuple[int, int]] = {}
         self._loaded = False
     
+    def _warm_templates(self):
+        """
+        Precompile the built-in templates once per process.
+        
+        Each template becomes a cached code object plus its `strategy` function
+        code, so every execution (including the first backtest bar) is a direct
+        function call with no parse/compile step. Templates are reviewed code and
+        are registered as trusted (see SafeExecutor.warmup).
+        """
+        if StrategyEngine._templates_warmed:
+            return
+        for code in STRATEGY_TEMPLATES.values():
+            self.executor.warmup(code)
+        StrategyEngine._templates_warmed = True
+    
     def _ensure_loaded(self):
         """Load strategies from disk if not already loaded."""
         if not self._loaded:
             self.load()
     
+    def _decode(self, name: str) -> Optional[dict]:
+        """Decode one not-yet-decoded strategy from the raw file bytes."""
+        start, end = self._index[name]
+        try:
+            strategy = loads(self._raw[start:end])
+        except Exception as e:
+            print(f"Error loading strategy '{name}': {e}")
+            return None
+        self._strategies[name] = strategy
+        return strategy
+    
+    def _decode_all(self):
+        """Decode every remaining strategy, preserving file order."""
+        if not self._index:
+            return
+        merged = {}
+        for name in self._index:
+            strategy = self._strategies.get(name)
+            if strategy is None:
+                strategy = self._decode(name)
+            if strategy is not None:
+                merged[name] = strategy
+        # 新增的策略排在文件中已有策略之后
+        for name, strategy in self._strategies.items():
+            merged.setdefault(name, strategy)
+        self._strategies = merged
+        self._index = {}
+        self._raw = b""
+    
     def load(self) -> Dict[str, dict]:
-        """Load strategies from storage. If no file exists, try example file."""
+        """
+        Load strategies from storage. If no file exists, try example file.
+        
+        Only the top-level layout is scanned here; individual strategies are
+        decoded on first access (get/get_all), so the returned dict may be
+        partially populated.
+        """
         self._strategies = {}
+        self._raw = b""
+        self._index = {}
         
         if self.storage_path.exists():
             try:
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    self._strategies = json.load(f)
+                with open(self.storage_path, 'rb') as f:
+                    raw = f.read()
+                index = _index_top_level(raw)
+                if index is None:
+                    # 非预期结构：整体解码（出错时由下方统一报告）
+                    self._strategies = loads(raw)
+                else:
+                    self._raw, self._index = raw, index
             except Exception as e:
                 print(f"Error loading strategies: {e}")
         else:
@@ -411,36 +1224,100 @@ class StrategyEngine:
             example_path = self.storage_path.parent / "strategies.json.example"
             if example_path.exists():
                 try:
-                    with open(example_path, 'r', encoding='utf-8') as f:
-                        self._strategies = json.load(f)
+                    with open(example_path, 'rb') as f:
+                        self._strategies = loads(f.read())
                     # Save to actual file
                     self.save()
                     print("Loaded strategies from example file")
                 except Exception as e:
                     print(f"Error loading example strategies: {e}")
         
+        self._replay_journal()
         self._loaded = True
         return self._strategies
     
     def save(self) -> bool:
-        """Save strategies to storage."""
+        """
+        Save strategies to storage.
+        
+        This is a full rewrite that also compacts (removes) the journal.
+        """
+        self._decode_all()
         try:
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(self._strategies, f, indent=4, ensure_ascii=False)
+            # 先写临时文件再原子替换，避免写入中断留下损坏的 JSON
+            tmp_path = self.storage_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(dumps(self._strategies))
+            os.replace(tmp_path, self.storage_path)
+            self._journal_path.unlink(missing_ok=True)
             return True
         except Exception as e:
             print(f"Error saving strategies: {e}")
             return False
     
+    @property
+    def _journal_path(self) -> Path:
+        """Append-only log of mutations not yet compacted into the main file."""
+        return self.storage_path.with_suffix('.journal.jsonl')
+    
+    def _replay_journal(self):
+        """Apply journaled operations on top of the freshly loaded base data."""
+        try:
+            entries = read_journal(self._journal_path)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error reading strategy journal: {e}")
+            return
+        
+        for entry in entries:
+            op = entry.get('op')
+            if op == 'put':
+                self._strategies[entry['name']] = entry['data']
+            elif op == 'delete':
+                self._strategies.pop(entry['name'], None)
+                self._index.pop(entry['name'], None)
+    
+    def _append_journal(self, entry: dict) -> bool:
+        """
+        Append one operation to the journal (O(1) regardless of strategy count).
+        Compacts into the main file once the journal exceeds half its size.
+        
+        Returns:
+            True if successful
+        """
+        try:
+            with open(self._journal_path, 'ab') as f:
+                f.write(dumps_line(entry) + b'\n')
+        except Exception as e:
+            print(f"Error saving strategies: {e}")
+            return False
+        
+        try:
+            journal_size = self._journal_path.stat().st_size
+        except OSError:
+            return True
+        try:
+            storage_size = self.storage_path.stat().st_size
+        except OSError:
+            storage_size = 0
+        if journal_size > storage_size / 2:
+            return self.save()
+        return True
+    
     def get_all(self) -> Dict[str, dict]:
         """Get all saved strategies."""
         self._ensure_loaded()
+        self._decode_all()
         return self._strategies.copy()
     
     def get(self, name: str) -> Optional[dict]:
         """Get a strategy by name."""
         self._ensure_loaded()
-        return self._strategies.get(name)
+        strategy = self._strategies.get(name)
+        if strategy is None and name in self._index:
+            strategy = self._decode(name)
+        return strategy
     
     def save_strategy(
         self,
@@ -472,15 +1349,16 @@ class StrategyEngine:
             'updated_at': datetime.now().isoformat(),
         }
         
-        return self.save()
+        return self._append_journal({'op': 'put', 'name': name, 'data': self._strategies[name]})
     
     def delete_strategy(self, name: str) -> bool:
         """Delete a strategy."""
         self._ensure_loaded()
         
-        if name in self._strategies:
-            del self._strategies[name]
-            return self.save()
+        if name in self._strategies or name in self._index:
+            self._strategies.pop(name, None)
+            self._index.pop(name, None)
+            return self._append_journal({'op': 'delete', 'name': name})
         
         return False
     
@@ -504,6 +1382,7 @@ class StrategyEngine:
         current_date: date = None,
         lookback_days: int = 252,
         normalize_weights: bool = True,
+        verbose: bool = True,
     ) -> StrategyResult:
         """
         Execute a strategy.
@@ -517,6 +1396,8 @@ class StrategyEngine:
             normalize_weights: 默认 True，传入 StrategyContext 作为
                 `set_target_weights` 未显式指定 normalize 时的默认行为。
                 False 时允许策略按字面值设置权重（<100% 持现金，>100% 杠杆警告）。
+            verbose: Record strategy logs in StrategyResult.signals
+                (False skips ctx.log() entirely, e.g. in backtests)
             
         Returns:
             StrategyResult
@@ -534,22 +1415,11 @@ class StrategyEngine:
             current_date=current_date,
             lookback_days=lookback_days,
             normalize_weights=normalize_weights,
+            verbose=verbose,
         )
         
-        # Create execution context with API
-        execution_context = {
-            'ctx': ctx,
-            # Expose numpy and pandas for calculations
-            'np': np,
-            'pd': pd,
-            # Expose common math functions
-            'abs': abs,
-            'round': round,
-            'min': min,
-            'max': max,
-            'sum': sum,
-            'len': len,
-        }
+        # Create execution context with API (only ctx changes between runs)
+        execution_context = {**self._BASE_CONTEXT, 'ctx': ctx}
         
         try:
             # Execute strategy
@@ -568,7 +1438,7 @@ class StrategyEngine:
                 success=True,
                 target_weights=target_weights,
                 message="Strategy executed successfully",
-                signals=ctx.signals,
+                signals=ctx._signals,  # 上下文执行后即丢弃，无需复制
                 execution_time=execution_time,
             )
             
@@ -587,6 +1457,67 @@ class StrategyEngine:
                 execution_time=time.time() - start_time,
             )
     
+    def execute_batch(
+        self,
+        code: str,
+        tickers: List[str],
+        dates: List[date],
+        current_weights_per_date: List[Dict[str, float]],
+        lookback_days: int = 252,
+        normalize_weights: bool = True,
+        max_workers: Optional[int] = None,
+        verbose: bool = True,
+    ) -> List[StrategyResult]:
+        """
+        Execute a strategy independently for several dates in parallel.
+        
+        Each date gets its own StrategyContext, so this only suits evaluations
+        that do not depend on each other's results (e.g. signal scans over
+        history). Path-dependent backtests must still call execute() in order.
+        
+        Args:
+            code: Strategy Python code
+            tickers: Available tickers
+            dates: Evaluation dates
+            current_weights_per_date: Current weights for each date (same length as dates)
+            lookback_days: Historical data days
+            normalize_weights: Passed through to execute()
+            max_workers: Thread count (default: CPU count)
+            verbose: Passed through to execute()
+            
+        Returns:
+            StrategyResult per date, in the order of `dates`
+        """
+        if len(dates) != len(current_weights_per_date):
+            raise ValueError("dates and current_weights_per_date must have the same length")
+        
+        if not dates:
+            return []
+        
+        # 先在主线程编译一次，工作线程只读编译缓存
+        try:
+            self.executor.compile_code(code)
+        except StrategyError as e:
+            return [
+                StrategyResult(success=False, target_weights=weights.copy(), message=str(e))
+                for weights in current_weights_per_date
+            ]
+        
+        workers = min(len(dates), max_workers or os.cpu_count() or 1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(
+                lambda args: self.execute(
+                    code=code,
+                    tickers=tickers,
+                    current_weights=args[1],
+                    current_date=args[0],
+                    lookback_days=lookback_days,
+                    normalize_weights=normalize_weights,
+                    verbose=verbose,
+                ),
+                zip(dates, current_weights_per_date),
+            ))
+    
     def run_strategy_check(
         self,
         strategy_name: str,
@@ -3,11 +3,18 @@ Safe execution sandbox for user-defined strategies.
 Uses RestrictedPython to prevent malicious code execution.
 """
 
+import ast
+import atexit
+import io
+import os
 import sys
+import token
+import tokenize
+import hashlib
 import threading
-from typing import Any, Dict, Optional, Callable
-from contextlib import contextmanager
-import traceback
+import types
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Callable, Tuple, Union
 import concurrent.futures
 
 # RestrictedPython imports
@@ -16,30 +23,57 @@ from RestrictedPython.Guards import safe_builtins as rp_safe_builtins
 from RestrictedPython.Eval import default_guarded_getiter, default_guarded_getitem
 
 
+# Potentially dangerous attributes (checked on every attribute access)
+_DANGEROUS_ATTRS = frozenset({
+    '__class__', '__bases__', '__subclasses__', '__mro__',
+    '__dict__', '__globals__', '__code__', '__closure__',
+    '__self__', '__func__', 'func_globals', 'func_code',
+    'gi_frame', 'gi_code', 'co_code', 'f_globals', 'f_locals',
+})
+
+
+def _deny_attribute(name: str):
+    """Raise the AttributeError for a blocked attribute name (cold path)."""
+    if name[:1] == '_':
+        raise AttributeError(
+            f"Access to private attribute '{name}' is not allowed"
+        )
+    raise AttributeError(
+        f"Access to attribute '{name}' is not allowed"
+    )
+
+
 def _safe_getattr(obj, name, default=None):
     """
     Safe getattr implementation for RestrictedPython.
     Blocks access to private/dunder attributes.
     """
-    # Block access to private attributes (starting with _)
-    if name.startswith('_'):
-        raise AttributeError(
-            f"Access to private attribute '{name}' is not allowed"
-        )
+    # 每次属性访问都会经过这里：允许的情况只做一次切片比较和一次集合查找
+    if name[:1] == '_' or name in _DANGEROUS_ATTRS:
+        _deny_attribute(name)
     
-    # Block access to potentially dangerous attributes
-    dangerous_attrs = {
-        '__class__', '__bases__', '__subclasses__', '__mro__',
-        '__dict__', '__globals__', '__code__', '__closure__',
-        '__self__', '__func__', 'func_globals', 'func_code',
-        'gi_frame', 'gi_code', 'co_code', 'f_globals', 'f_locals',
-    }
-    if name in dangerous_attrs:
-        raise AttributeError(
-            f"Access to attribute '{name}' is not allowed"
-        )
+    if default is None:
+        return getattr(obj, name)
+    return getattr(obj, name, default)
+
+
+# 精简模式下被拒绝访问时的固定错误信息（不做格式化）
+_ACCESS_DENIED = "attribute access denied"
+
+
+def _safe_getattr_fast(obj, name, default=None):
+    """
+    _safe_getattr without per-name diagnostics.
     
-    return getattr(obj, name, default) if default is not None else getattr(obj, name)
+    Same checks, but denied lookups raise AttributeError with a fixed message
+    instead of formatting one that names the attribute.
+    """
+    if name[:1] == '_' or name in _DANGEROUS_ATTRS:
+        raise AttributeError(_ACCESS_DENIED)
+    
+    if default is None:
+        return getattr(obj, name)
+    return getattr(obj, name, default)
 
 
 def _safe_iter_unpack_sequence(it, spec, _getiter_):
@@ -61,7 +95,17 @@ def _safe_iter_unpack_sequence(it, spec, _getiter_):
         expected_len = 2
     
     for item in _getiter_(it):
-        if isinstance(item, (list, tuple)):
+        # 常见情况：dict.items() 产生的定长 tuple，直接放行
+        if type(item) is tuple and len(item) == expected_len:
+            yield item
+        elif isinstance(item, (list, tuple)):
+            if len(item) != expected_len:
+                raise ValueError(
+                    f"not enough values to unpack (expected {expected_len}, got {len(item)})"
+                )
+            yield item
+        elif hasattr(type(item), '__len__') and hasattr(type(item), '__iter__'):
+            # 其他定长容器（str、ndarray 等）：按长度检查后原样交给解包，不复制
             if len(item) != expected_len:
                 raise ValueError(
                     f"not enough values to unpack (expected {expected_len}, got {len(item)})"
@@ -80,6 +124,68 @@ def _safe_iter_unpack_sequence(it, spec, _getiter_):
                 raise TypeError(f"cannot unpack non-iterable {type(item).__name__} object")
 
 
+def _safe_write(obj):
+    """Allow writes to any object (identity guard)."""
+    return obj
+
+
+def _safe_print(*args, **kwargs):
+    """Safe print function that collects output."""
+    # In sandbox, print just returns the string
+    return ' '.join(str(a) for a in args)
+
+
+def _top_level_function_names(tree: ast.Module) -> Optional[Tuple[str, ...]]:
+    """
+    Names of the module's top-level functions, if that is all it defines.
+    
+    When the module body is only plain `def` statements (no decorators,
+    defaults or other top-level statements), executing it just binds those
+    functions, so callers can build them directly instead of re-running exec.
+    Returns None for any other module shape.
+    """
+    body = tree.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]  # 模块文档字符串
+    
+    names = []
+    for node in body:
+        if not isinstance(node, ast.FunctionDef) or node.decorator_list:
+            return None
+        if node.args.defaults or any(d is not None for d in node.args.kw_defaults):
+            return None
+        names.append(node.name)
+    if len(set(names)) != len(names):
+        return None
+    return tuple(names)
+
+
+def _top_level_functions(
+    names: Optional[Tuple[str, ...]], code: types.CodeType
+) -> Optional[Dict[str, types.CodeType]]:
+    """Map the function names from _top_level_function_names to their code objects."""
+    if names is None:
+        return None
+    consts = {
+        c.co_name: c for c in code.co_consts
+        if isinstance(c, types.CodeType) and c.co_name in names
+    }
+    if len(consts) != len(names):
+        return None
+    return {name: consts[name] for name in names}
+
+
+def _strategy_location(exc: BaseException) -> str:
+    """' (line N)' for the innermost strategy-code frame of exc's traceback, or ''."""
+    lineno = None
+    tb = exc.__traceback__
+    while tb is not None:
+        if tb.tb_frame.f_code.co_filename == '<strategy>':
+            lineno = tb.tb_lineno
+        tb = tb.tb_next
+    return f" (line {lineno})" if lineno is not None else ""
+
+
 class ExecutionTimeout(Exception):
     """Raised when strategy execution exceeds time limit."""
     pass
@@ -95,25 +201,14 @@ class StrategyError(Exception):
     pass
 
 
-@contextmanager
-def timeout_handler(seconds: int):
-    """
-    Context manager for execution timeout.
-    Uses ThreadPoolExecutor for cross-platform and thread-safe timeout.
-    This is a simple wrapper that just yields - actual timeout is handled in execute().
-    """
-    # Just yield - timeout is handled at a higher level using ThreadPoolExecutor
-    yield
-
-
 class SafeExecutor:
     """
     Sandbox executor for user strategy code.
     Provides restricted Python execution environment.
     """
     
-    # Allowed built-in functions (safe subset)
-    ALLOWED_BUILTINS = {
+    # Allowed built-in functions (safe subset, read-only)
+    ALLOWED_BUILTINS = types.MappingProxyType({
         # Basic types
         'True': True,
         'False': False,
@@ -162,10 +257,30 @@ class SafeExecutor:
         'TypeError': TypeError,
         'KeyError': KeyError,
         'IndexError': IndexError,
+    })
+    
+    # 所有执行共享的 __builtins__ 字典（exec 需要真正的 dict 才能走快速查找；
+    # 受限编译禁止访问 __builtins__，策略代码无法修改它）
+    _BUILTINS: Dict[str, Any] = dict(ALLOWED_BUILTINS)
+    
+    # 每次执行都相同的受限执行辅助函数，只构建一次
+    _GLOBALS_TEMPLATE: Dict[str, Any] = {
+        '__builtins__': _BUILTINS,
+        '_getiter_': default_guarded_getiter,
+        '_getitem_': default_guarded_getitem,
+        '_getattr_': _safe_getattr,  # Allow safe attribute access
+        '_iter_unpack_sequence_': _safe_iter_unpack_sequence,  # Allow tuple unpacking in loops
+        '_write_': _safe_write,  # Allow basic writes
+        '_print_': _safe_print,  # Safe print function
+    }
+    # verbose=False 时使用的模板：拒绝访问时不格式化错误信息
+    _FAST_GLOBALS_TEMPLATE: Dict[str, Any] = {
+        **_GLOBALS_TEMPLATE,
+        '_getattr_': _safe_getattr_fast,
     }
     
     # Explicitly blocked names
-    BLOCKED_NAMES = {
+    BLOCKED_NAMES = frozenset({
         'open', 'file', 'input', 'raw_input',
         'exec', 'eval', 'compile', 'execfile',
         '__import__', 'importlib',
@@ -175,16 +290,98 @@ class SafeExecutor:
         'getattr', 'setattr', 'delattr', 'hasattr',
         '__builtins__', '__dict__', '__class__',
         '__bases__', '__subclasses__', '__mro__',
-    }
+    })
+    
+    # 编译缓存上限（按源码哈希缓存 RestrictedPython 编译结果及顶层函数，进程内共享）
+    CODE_CACHE_SIZE = 64
+    _CODE_CACHE: "OrderedDict[bytes, tuple]" = OrderedDict()
+    _CODE_CACHE_LOCK = threading.Lock()
+    
+    # validate_code 结果缓存（同样按源码哈希；与编译缓存共用锁）
+    VALIDATE_CACHE_SIZE = 256
+    _VALIDATE_CACHE: "OrderedDict[bytes, tuple]" = OrderedDict()
+    
+    # 通过 warmup() 登记为可信的源码哈希；仅当 timeout_seconds <= 0 时
+    # 这些策略才在调用线程内直接执行（无超时保护）
+    _TRUSTED_HASHES: set = set()
     
-    def __init__(self, timeout_seconds: int = 10):
+    # 共享执行线程池（首次执行时创建），避免每次执行都新建/销毁线程
+    MAX_WORKERS = max(4, os.cpu_count() or 1)
+    _pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+    
+    # 超时后仍在运行的任务（线程无法被强制终止）。当前线程池的工作线程被占满时
+    # 换一个新池；被放弃的线程总数达到上限后直接拒绝执行，避免线程无限增长
+    MAX_ABANDONED_WORKERS = 4 * MAX_WORKERS
+    _stuck: set = set()       # 占用当前线程池工作线程的任务
+    _abandoned: set = set()   # 占用已退役线程池工作线程的任务
+    
+    def __init__(self, timeout_seconds: int = 10, verbose: bool = True):
         """
         Initialize safe executor.
         
         Args:
             timeout_seconds: Maximum execution time
+            verbose: Name the offending attribute in access-denied errors.
+                False uses a fixed message (cheaper for strategies that probe
+                many blocked attributes, e.g. in batch backtests)
         """
         self.timeout_seconds = timeout_seconds
+        self.verbose = verbose
+        self._globals_template = self._GLOBALS_TEMPLATE if verbose else self._FAST_GLOBALS_TEMPLATE
+        
+        # 上一次 context 的键集合及其中被禁用的键（回测中键集合通常不变）
+        self._context_keys: Tuple[frozenset, frozenset] = (frozenset(), frozenset())
+    
+    @classmethod
+    def _get_pool(cls) -> concurrent.futures.ThreadPoolExecutor:
+        """Shared worker pool for strategy execution, created on first use."""
+        with cls._pool_lock:
+            if cls._pool is None:
+                if len(cls._abandoned) >= cls.MAX_ABANDONED_WORKERS:
+                    raise StrategyError(
+                        f"Sandbox workers exhausted: {len(cls._abandoned)} timed-out "
+                        f"strategies are still running"
+                    )
+                cls._pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=cls.MAX_WORKERS,
+                    thread_name_prefix='sandbox',
+                )
+                atexit.register(cls._pool.shutdown, wait=False)
+            return cls._pool
+    
+    @classmethod
+    def _abandon(cls, pool: concurrent.futures.ThreadPoolExecutor, future: concurrent.futures.Future):
+        """
+        Give up on a timed-out task.
+        
+        A task still waiting in the queue is cancelled, so it never runs
+        against a context its caller has abandoned. A running task keeps its
+        worker; once every worker of the current pool is held this way, the
+        pool is retired and the next execution starts a fresh one.
+        """
+        if future.cancel():
+            return
+        with cls._pool_lock:
+            if pool is cls._pool:
+                cls._stuck.add(future)
+                if len(cls._stuck) >= cls.MAX_WORKERS:
+                    # 不等待也不取消：排队中的任务由各自的调用方超时取消
+                    pool.shutdown(wait=False)
+                    cls._abandoned |= cls._stuck
+                    cls._stuck = set()
+                    cls._pool = None
+            else:
+                cls._abandoned.add(future)
+        # 任务最终结束时释放计数（若已结束会立即回调）
+        future.add_done_callback(cls._release)
+    
+    @classmethod
+    def _release(cls, future: concurrent.futures.Future):
+        """Forget a timed-out task once it has finished."""
+        with cls._pool_lock:
+            cls._stuck.discard(future)
+            cls._abandoned.discard(future)
     
     def _create_safe_globals(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -196,32 +393,29 @@ class SafeExecutor:
         Returns:
             Safe globals dictionary
         """
-        safe_globals = {
-            '__builtins__': self.ALLOWED_BUILTINS.copy(),
-            '_getiter_': default_guarded_getiter,
-            '_getitem_': default_guarded_getitem,
-            '_getattr_': _safe_getattr,  # Allow safe attribute access
-            '_iter_unpack_sequence_': _safe_iter_unpack_sequence,  # Allow tuple unpacking in loops
-            '_write_': lambda x: x,  # Allow basic writes
-            '_print_': self._safe_print,  # Safe print function
-        }
+        # 键集合与上次相同时复用已检查的结果，只有新键集合才与 BLOCKED_NAMES 求交
+        keys, blocked = self._context_keys
+        if context.keys() != keys:
+            keys = frozenset(context)
+            blocked = keys & self.BLOCKED_NAMES
+            self._context_keys = (keys, blocked)
         
         # Add context (strategy API)
-        for key, value in context.items():
-            if key not in self.BLOCKED_NAMES:
-                safe_globals[key] = value
-        
-        return safe_globals
-    
-    def _safe_print(self, *args, **kwargs):
-        """Safe print function that collects output."""
-        # In sandbox, print just returns the string
-        return ' '.join(str(a) for a in args)
+        if not blocked:
+            return {**self._globals_template, **context}
+        return {
+            **self._globals_template,
+            **{key: value for key, value in context.items() if key not in blocked},
+        }
     
     def compile_code(self, source: str) -> Any:
         """
         Compile strategy code in restricted mode.
         
+        Compiled code objects are cached by source hash (LRU), so repeated
+        executions of the same strategy (e.g. every rebalance day of a
+        backtest) only run the RestrictedPython rewrite once.
+        
         Args:
             source: Python source code
             
@@ -231,6 +425,68 @@ class SafeExecutor:
         Raises:
             StrategyError: If compilation fails
         """
+        return self._compile_entry(source)[0]
+    
+    @staticmethod
+    def _source_key(source: str) -> bytes:
+        """Cache / allowlist key for strategy source."""
+        return hashlib.blake2b(source.encode('utf-8'), digest_size=16).digest()
+    
+    def warmup(self, source: str) -> types.CodeType:
+        """
+        Compile strategy code and mark it as trusted.
+        
+        Trusted sources run inline on the calling thread, skipping the pool and
+        timeout machinery, but only on executors created with
+        timeout_seconds <= 0. The trade-off is that a trusted strategy that
+        loops forever blocks its caller, so only warm up code that has
+        already been validated and reviewed.
+        
+        Args:
+            source: Python source code
+            
+        Returns:
+            Compiled code object
+            
+        Raises:
+            StrategyError: If compilation fails
+        """
+        code = self.compile_code(source)
+        SafeExecutor._TRUSTED_HASHES.add(self._source_key(source))
+        return code
+    
+    def _compile_entry(self, source: str) -> tuple:
+        """Cached (code object, top-level functions or None) for source."""
+        key = self._source_key(source)
+        cache = SafeExecutor._CODE_CACHE
+        with SafeExecutor._CODE_CACHE_LOCK:
+            try:
+                entry = cache[key]
+            except KeyError:
+                pass
+            else:
+                cache.move_to_end(key)
+                return entry
+        
+        # 只解析一次：同一棵语法树先用于分析模块结构，再交给受限编译
+        # （编译失败会抛出 StrategyError，不进入缓存）
+        try:
+            tree = ast.parse(source, filename='<strategy>')
+        except SyntaxError as e:
+            raise StrategyError(f"Syntax error at line {e.lineno}: {e.msg}")
+        except ValueError as e:
+            raise StrategyError(f"Compilation failed: {str(e)}")
+        names = _top_level_function_names(tree)  # 受限编译会原地改写语法树，需先分析
+        code = self._compile_uncached(tree)
+        entry = (code, _top_level_functions(names, code))
+        with SafeExecutor._CODE_CACHE_LOCK:
+            cache[key] = entry
+            while len(cache) > self.CODE_CACHE_SIZE:
+                cache.popitem(last=False)
+        return entry
+    
+    def _compile_uncached(self, source: Union[str, ast.Module]) -> Any:
+        """Run compile_restricted on source (text or parsed module) and unwrap the code object."""
         try:
             result = compile_restricted(
                 source,
@@ -280,6 +536,10 @@ class SafeExecutor:
         """
         Execute strategy code safely.
         
+        Only source text is accepted: it is always compiled (or fetched from
+        the compile cache) with RestrictedPython here, so no unrestricted code
+        object can reach exec.
+        
         Args:
             source: Python source code
             context: Strategy context (API, data)
@@ -293,16 +553,27 @@ class SafeExecutor:
             SafetyViolation: If unsafe operation attempted
             StrategyError: If strategy code has errors
         """
-        # Compile code
-        compiled = self.compile_code(source)
+        if not isinstance(source, str):
+            raise TypeError(f"execute() expects strategy source text, got {type(source).__name__}")
+        
+        # Compile code (cached by source hash)
+        compiled, functions = self._compile_entry(source)
         
         # Create safe execution environment
         safe_globals = self._create_safe_globals(context)
-        safe_locals = {}
         
         def _execute_code():
             """Inner function to execute in thread pool."""
-            # Execute the module code
+            if functions is not None:
+                # 模块只包含函数定义：跳过模块级 exec，只构建入口函数
+                # （其余顶层函数在入口函数里本就不可见，也不会定义 result）
+                code = functions.get(entry_function)
+                if code is not None:
+                    return types.FunctionType(code, safe_globals, entry_function)()
+                return _context_weights()
+            
+            # Execute the module code (locals only needed on this path)
+            safe_locals = {}
             exec(compiled, safe_globals, safe_locals)
             
             # Call the entry function if it exists
@@ -315,23 +586,30 @@ class SafeExecutor:
             if 'result' in safe_locals:
                 return safe_locals['result']
             
-            # Return the target_weights if set via context
+            return _context_weights()
+        
+        def _context_weights():
+            """Return the target_weights if set via context."""
             if 'ctx' in context and hasattr(context['ctx'], 'get_target_weights'):
                 return context['ctx'].get_target_weights()
-            
             return None
         
         try:
-            # Execute with timeout using ThreadPoolExecutor
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(_execute_code)
-                try:
-                    result = future.result(timeout=self.timeout_seconds)
-                    return result
-                except concurrent.futures.TimeoutError:
-                    raise ExecutionTimeout(
-                        f"Strategy execution exceeded {self.timeout_seconds} seconds"
-                    )
+            if self.timeout_seconds <= 0 and self._source_key(source) in SafeExecutor._TRUSTED_HASHES:
+                # 可信策略：直接在当前线程执行，不经过线程池和超时
+                return _execute_code()
+            
+            # Execute with timeout on the shared pool
+            pool = self._get_pool()
+            future = pool.submit(_execute_code)
+            try:
+                result = future.result(timeout=self.timeout_seconds)
+                return result
+            except concurrent.futures.TimeoutError:
+                self._abandon(pool, future)
+                raise ExecutionTimeout(
+                    f"Strategy execution exceeded {self.timeout_seconds} seconds"
+                )
                 
         except ExecutionTimeout:
             raise
@@ -340,9 +618,11 @@ class SafeExecutor:
         except StrategyError:
             raise
         except Exception as e:
-            # Wrap execution errors
-            tb = traceback.format_exc()
-            raise StrategyError(f"Strategy execution error: {str(e)}\n{tb}")
+            # Wrap execution errors; the full traceback stays on __cause__ and is
+            # only formatted by whoever prints it
+            raise StrategyError(
+                f"Strategy execution error: {type(e).__name__}: {e}{_strategy_location(e)}"
+            ) from e
     
     def validate_code(self, source: str) -> Dict[str, Any]:
         """
@@ -357,21 +637,54 @@ class SafeExecutor:
             - 'errors': list of error messages
             - 'warnings': list of warnings
         """
+        key = self._source_key(source)
+        cache = SafeExecutor._VALIDATE_CACHE
+        with SafeExecutor._CODE_CACHE_LOCK:
+            try:
+                valid, errors, warnings = cache[key]
+            except KeyError:
+                pass
+            else:
+                cache.move_to_end(key)
+                return {'valid': valid, 'errors': list(errors), 'warnings': list(warnings)}
+        
+        result = self._validate_uncached(source)
+        with SafeExecutor._CODE_CACHE_LOCK:
+            cache[key] = (result['valid'], tuple(result['errors']), tuple(result['warnings']))
+            while len(cache) > self.VALIDATE_CACHE_SIZE:
+                cache.popitem(last=False)
+        return result
+    
+    def _validate_uncached(self, source: str) -> Dict[str, Any]:
+        """Run the validation checks; a successful compile also fills the code cache."""
         result = {
             'valid': True,
             'errors': [],
             'warnings': [],
         }
         
+        # 单次扫描源码的标识符 token（跳过字符串和注释）：
+        # 同时检查被禁用的名称和 import 关键字（只会出现在 import 语句中）
+        blocked_found: Dict[str, None] = {}
+        has_import = False
+        try:
+            for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+                if tok.type == token.NAME:
+                    if tok.string in self.BLOCKED_NAMES:
+                        blocked_found[tok.string] = None
+                    elif tok.string == 'import':
+                        has_import = True
+        except (tokenize.TokenError, SyntaxError):
+            pass  # 语法错误由下面的编译步骤报告
+        
         # Check for blocked imports/names
-        for blocked in self.BLOCKED_NAMES:
-            if blocked in source:
-                result['warnings'].append(
-                    f"Code contains potentially unsafe name: '{blocked}'"
-                )
+        for blocked in blocked_found:
+            result['warnings'].append(
+                f"Code contains potentially unsafe name: '{blocked}'"
+            )
         
         # Check for import statements
-        if 'import ' in source:
+        if has_import:
             result['warnings'].append(
                 "Import statements are not allowed in strategies. "
                 "Use the provided context API instead."
@@ -2,6 +2,8 @@
 Built-in strategy templates for user reference.
 """
 
+from types import MappingProxyType
+
 # Simple Moving Average Strategy
 MA_CROSSOVER_TEMPLATE = '''"""
 均线交叉策略 (Moving Average Crossover)
@@ -9,36 +11,30 @@ MA_CROSSOVER_TEMPLATE = '''"""
 """
 
 def strategy():
-    # 获取当前权重
-    weights = ctx.get_current_weights()
-    
     # 策略参数
     short_period = 20   # 短期均线周期
     long_period = 50    # 长期均线周期
     
-    # 遍历所有标的
-    for ticker in ctx.tickers:
-        current_weight = weights.get(ticker, 0)
-        
-        # 计算均线
-        short_ma = ctx.ma(ticker, short_period)
-        long_ma = ctx.ma(ticker, long_period)
-        
-        if len(short_ma) < 2 or len(long_ma) < 2:
-            continue
-        
-        # 金叉: 增加仓位
-        if ctx.ma_cross_up(ticker, short_period, long_period):
-            weights[ticker] = min(current_weight + 10, 50)
-            ctx.log(f"🟢 {ticker} 金叉信号, 增加仓位")
-        
-        # 死叉: 减少仓位
-        elif ctx.ma_cross_down(ticker, short_period, long_period):
-            weights[ticker] = max(current_weight - 10, 0)
-            ctx.log(f"🔴 {ticker} 死叉信号, 减少仓位")
+    # 一次计算全部标的的交叉信号：1 金叉，-1 死叉，0 无信号
+    # （只比较两条均线的最后两个值，数据不足时为 0）
+    cross = ctx.ma_cross_all(short_period, long_period)
     
-    # 设置目标权重
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        # 遍历所有标的
+        for ticker in ctx.tickers:
+            current_weight = weights.get(ticker, 0)
+            signal = cross[ticker]
+            
+            # 金叉: 增加仓位
+            if signal > 0:
+                weights[ticker] = min(current_weight + 10, 50)
+                ctx.log("🟢 %s 金叉信号, 增加仓位", ticker)
+            
+            # 死叉: 减少仓位
+            elif signal < 0:
+                weights[ticker] = max(current_weight - 10, 0)
+                ctx.log("🔴 %s 死叉信号, 减少仓位", ticker)
 '''
 
 # Momentum Strategy
@@ -48,33 +44,29 @@ MOMENTUM_TEMPLATE = '''"""
 """
 
 def strategy():
-    weights = ctx.get_current_weights()
-    
     # 策略参数
     lookback = 20       # 动量计算周期
     threshold = 5       # 动量阈值 (%)
     
-    for ticker in ctx.tickers:
-        current_weight = weights.get(ticker, 0)
-        
-        # 计算动量
-        mom = ctx.momentum(ticker, lookback)
-        if mom.empty:
-            continue
-        
-        current_momentum = mom.iloc[-1]
-        
-        # 正向动量: 增加仓位
-        if current_momentum > threshold:
-            weights[ticker] = min(current_weight + 5, 40)
-            ctx.log(f"📈 {ticker} 动量 {current_momentum:.1f}% > {threshold}%, 增仓")
-        
-        # 负向动量: 减少仓位
-        elif current_momentum < -threshold:
-            weights[ticker] = max(current_weight - 5, 0)
-            ctx.log(f"📉 {ticker} 动量 {current_momentum:.1f}% < -{threshold}%, 减仓")
-    
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        for ticker in ctx.tickers:
+            current_weight = weights.get(ticker, 0)
+            
+            # 计算动量（只取最新值）
+            current_momentum = ctx.momentum_last(ticker, lookback)
+            if current_momentum is None:
+                continue
+            
+            # 正向动量: 增加仓位
+            if current_momentum > threshold:
+                weights[ticker] = min(current_weight + 5, 40)
+                ctx.log("📈 %s 动量 %.1f%% > %s%%, 增仓", ticker, current_momentum, threshold)
+            
+            # 负向动量: 减少仓位
+            elif current_momentum < -threshold:
+                weights[ticker] = max(current_weight - 5, 0)
+                ctx.log("📉 %s 动量 %.1f%% < -%s%%, 减仓", ticker, current_momentum, threshold)
 '''
 
 # VIX-Based Strategy
@@ -84,8 +76,6 @@ VIX 波动率策略 (Volatility Strategy)
 """
 
 def strategy():
-    weights = ctx.get_current_weights()
-    
     # 策略参数
     vix_low = 15        # 低波动阈值
     vix_high = 25       # 高波动阈值
@@ -93,40 +83,40 @@ def strategy():
     
     # 获取当前 VIX
     current_vix = ctx.current_vix()
-    ctx.log(f"📊 当前 VIX: {current_vix:.1f}")
+    ctx.log("📊 当前 VIX: %.1f", current_vix)
     
     # 定义风险资产和避险资产
     risk_assets = ['IWY', 'LVHI', 'G3B.SI']  # 根据你的组合调整
     safe_assets = ['GSD.SI', 'MBH.SI']       # 黄金、债券等
     
-    if current_vix < vix_low:
-        # 低波动: 激进配置
-        ctx.log("🚀 低波动环境，增加风险资产")
-        for ticker in risk_assets:
-            if ticker in weights:
-                weights[ticker] = weights.get(ticker, 0) * 1.2
-        for ticker in safe_assets:
-            if ticker in weights:
-                weights[ticker] = weights.get(ticker, 0) * 0.8
-    
-    elif current_vix > vix_panic:
-        # 恐慌: 避险配置
-        ctx.log("🛡️ 恐慌环境，大幅减少风险资产")
-        for ticker in risk_assets:
-            if ticker in weights:
-                weights[ticker] = weights.get(ticker, 0) * 0.5
-        for ticker in safe_assets:
-            if ticker in weights:
-                weights[ticker] = weights.get(ticker, 0) * 1.5
-    
-    elif current_vix > vix_high:
-        # 高波动: 谨慎配置
-        ctx.log("⚠️ 高波动环境，适度减少风险资产")
-        for ticker in risk_assets:
-            if ticker in weights:
-                weights[ticker] = weights.get(ticker, 0) * 0.85
-    
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        if current_vix < vix_low:
+            # 低波动: 激进配置
+            ctx.log("🚀 低波动环境，增加风险资产")
+            for ticker in risk_assets:
+                if ticker in weights:
+                    weights[ticker] = weights.get(ticker, 0) * 1.2
+            for ticker in safe_assets:
+                if ticker in weights:
+                    weights[ticker] = weights.get(ticker, 0) * 0.8
+        
+        elif current_vix > vix_panic:
+            # 恐慌: 避险配置
+            ctx.log("🛡️ 恐慌环境，大幅减少风险资产")
+            for ticker in risk_assets:
+                if ticker in weights:
+                    weights[ticker] = weights.get(ticker, 0) * 0.5
+            for ticker in safe_assets:
+                if ticker in weights:
+                    weights[ticker] = weights.get(ticker, 0) * 1.5
+        
+        elif current_vix > vix_high:
+            # 高波动: 谨慎配置
+            ctx.log("⚠️ 高波动环境，适度减少风险资产")
+            for ticker in risk_assets:
+                if ticker in weights:
+                    weights[ticker] = weights.get(ticker, 0) * 0.85
 '''
 
 # RSI Mean Reversion Strategy
@@ -136,34 +126,30 @@ RSI 超买/超卖时反向操作。
 """
 
 def strategy():
-    weights = ctx.get_current_weights()
-    
     # 策略参数
     rsi_period = 14
     oversold = 30       # 超卖阈值
     overbought = 70     # 超买阈值
     
-    for ticker in ctx.tickers:
-        current_weight = weights.get(ticker, 0)
-        
-        # 计算 RSI
-        rsi = ctx.rsi(ticker, rsi_period)
-        if rsi.empty:
-            continue
-        
-        current_rsi = rsi.iloc[-1]
-        
-        # 超卖: 买入信号
-        if current_rsi < oversold:
-            weights[ticker] = min(current_weight + 10, 50)
-            ctx.log(f"🟢 {ticker} RSI={current_rsi:.0f} 超卖，增仓")
-        
-        # 超买: 卖出信号
-        elif current_rsi > overbought:
-            weights[ticker] = max(current_weight - 10, 5)
-            ctx.log(f"🔴 {ticker} RSI={current_rsi:.0f} 超买，减仓")
-    
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        for ticker in ctx.tickers:
+            current_weight = weights.get(ticker, 0)
+            
+            # 计算最新 RSI（只取最后一个值）
+            current_rsi = ctx.rsi_last(ticker, rsi_period)
+            if current_rsi is None:
+                continue
+            
+            # 超卖: 买入信号
+            if current_rsi < oversold:
+                weights[ticker] = min(current_weight + 10, 50)
+                ctx.log("🟢 %s RSI=%.0f 超卖，增仓", ticker, current_rsi)
+            
+            # 超买: 卖出信号
+            elif current_rsi > overbought:
+                weights[ticker] = max(current_weight - 10, 5)
+                ctx.log("🔴 %s RSI=%.0f 超买，减仓", ticker, current_rsi)
 '''
 
 # Trend Following Strategy
@@ -187,7 +173,7 @@ def strategy():
         if ctx.price_above_ma(ticker, ma_period):
             trending_assets.append(ticker)
     
-    ctx.log(f"📊 趋势向上的资产: {trending_assets}")
+    ctx.log("📊 趋势向上的资产: %s", trending_assets)
     
     if not trending_assets:
         # 没有趋势资产，保守配置
@@ -203,11 +189,11 @@ def strategy():
             old_weight = weights.get(ticker, 0)
             weights[ticker] = weight_per_asset
             if weights[ticker] > old_weight:
-                ctx.log(f"🟢 {ticker} 趋势向上，增仓至 {weight_per_asset:.1f}%")
+                ctx.log("🟢 %s 趋势向上，增仓至 %.1f%%", ticker, weight_per_asset)
         else:
             # 非趋势资产: 清仓
             if weights.get(ticker, 0) > 0:
-                ctx.log(f"🔴 {ticker} 趋势转弱，清仓")
+                ctx.log("🔴 %s 趋势转弱，清仓", ticker)
             weights[ticker] = 0
     
     ctx.set_target_weights(weights)
@@ -226,29 +212,22 @@ def strategy():
     vol_period = 20     # 波动率计算周期
     target_vol = 0.15   # 目标波动率 15%
     
-    volatilities = {}
-    
-    # 计算各资产波动率
-    for ticker in ctx.tickers:
-        vol = ctx.volatility(ticker, vol_period, annualize=True)
-        if not vol.empty and vol.iloc[-1] > 0:
-            volatilities[ticker] = vol.iloc[-1]
+    # 一次计算全部资产的最新波动率（NaN 与 0 一并剔除）
+    volatilities = ctx.volatility_all(vol_period, annualize=True).iloc[-1]
+    volatilities = volatilities[volatilities > 0]
     
-    if not volatilities:
+    if volatilities.empty:
         ctx.log("⚠️ 无法计算波动率")
         return
     
-    # 计算反波动率权重
-    inv_vol = {t: 1/v for t, v in volatilities.items()}
-    total_inv_vol = sum(inv_vol.values())
+    # 反波动率权重，整体归一化到 100%
+    inv_vol = 1 / volatilities
+    target = inv_vol / inv_vol.sum() * 100
     
-    # 归一化权重
     for ticker in ctx.tickers:
-        if ticker in inv_vol:
-            weights[ticker] = (inv_vol[ticker] / total_inv_vol) * 100
-            ctx.log(f"📊 {ticker}: 波动率={volatilities[ticker]:.1%}, 权重={weights[ticker]:.1f}%")
-        else:
-            weights[ticker] = 0
+        weights[ticker] = float(target.get(ticker, 0))
+        if ticker in target.index and ctx.verbose:
+            ctx.log("📊 %s: 波动率=%.1f%%, 权重=%.1f%%", ticker, volatilities[ticker] * 100, weights[ticker])
     
     ctx.set_target_weights(weights)
 '''
@@ -279,7 +258,7 @@ def strategy():
         if n_assets > 0:
             equal_weight = 100.0 / n_assets
             target = {ticker: equal_weight for ticker in ctx.tickers}
-            ctx.log(f"📊 使用等权重分配: {equal_weight:.1f}% x {n_assets} 个标的")
+            ctx.log("📊 使用等权重分配: %.1f%% x %s 个标的", equal_weight, n_assets)
         else:
             ctx.log("⚠️ 组合中没有标的")
             return
@@ -289,21 +268,20 @@ def strategy():
     # 再平衡阈值
     rebalance_threshold = 5  # 偏离超过 5% 触发
     
-    needs_rebalance = False
+    # 按 ctx.tickers 顺序转为向量，一次完成偏离检查（超阈值时自动设置目标权重）
+    current_vec = ctx.weights_vec(current)
+    target_vec = ctx.weights_vec(target)
+    needs = ctx.rebalance_linear(current_vec, target_vec, rebalance_threshold)
     
-    # 检查是否需要再平衡
-    for ticker in ctx.tickers:
-        target_weight = target.get(ticker, 0)
-        current_weight = current.get(ticker, 0)
-        deviation = abs(current_weight - target_weight)
-        
-        if deviation > rebalance_threshold:
-            needs_rebalance = True
-            ctx.log(f"⚖️ {ticker}: 当前 {current_weight:.1f}% vs 目标 {target_weight:.1f}%, 偏离 {deviation:.1f}%")
+    # 只为偏离的标的输出日志
+    if ctx.verbose:
+        for i, ticker in enumerate(ctx.tickers):
+            if needs[i]:
+                deviation = abs(current_vec[i] - target_vec[i])
+                ctx.log("⚖️ %s: 当前 %.1f%% vs 目标 %.1f%%, 偏离 %.1f%%", ticker, current_vec[i], target_vec[i], deviation)
     
-    if needs_rebalance:
+    if needs.any():
         ctx.log("🔄 触发再平衡")
-        ctx.set_target_weights(target)
     else:
         ctx.log("✅ 无需再平衡，配置在容忍范围内")
 '''
@@ -327,9 +305,9 @@ def strategy():
     # 计算各资产动量
     momentums = {}
     for ticker in risk_assets:
-        mom = ctx.momentum(ticker, lookback)
-        if not mom.empty:
-            momentums[ticker] = mom.iloc[-1]
+        mom = ctx.momentum_last(ticker, lookback)
+        if mom is not None:
+            momentums[ticker] = mom
     
     if not momentums:
         ctx.log("⚠️ 无法计算动量")
@@ -339,19 +317,19 @@ def strategy():
     best_asset = max(momentums, key=momentums.get)
     best_momentum = momentums[best_asset]
     
-    ctx.log(f"📊 最强动量: {best_asset} ({best_momentum:.1f}%)")
+    ctx.log("📊 最强动量: %s (%.1f%%)", best_asset, best_momentum)
     
     # 绝对动量检查：最强资产动量必须为正
     if best_momentum > 0:
         # 相对动量选择：投资最强资产
         for ticker in ctx.tickers:
             weights[ticker] = 100 if ticker == best_asset else 0
-        ctx.log(f"🚀 绝对动量为正，全仓 {best_asset}")
+        ctx.log("🚀 绝对动量为正，全仓 %s", best_asset)
     else:
         # 负动量：转入避险资产
         for ticker in ctx.tickers:
             weights[ticker] = 100 if ticker == safe_asset else 0
-        ctx.log(f"🛡️ 绝对动量为负，转入避险资产 {safe_asset}")
+        ctx.log("🛡️ 绝对动量为负，转入避险资产 %s", safe_asset)
     
     ctx.set_target_weights(weights)
 '''
@@ -363,36 +341,34 @@ MACD 趋势策略
 """
 
 def strategy():
-    weights = ctx.get_current_weights()
-    
-    for ticker in ctx.tickers:
-        current_weight = weights.get(ticker, 0)
-        
-        # 获取 MACD 数据
-        macd_data = ctx.macd(ticker)
-        if macd_data.empty or len(macd_data) < 2:
-            continue
-        
-        macd_line = macd_data['macd'].iloc[-1]
-        signal_line = macd_data['signal'].iloc[-1]
-        histogram = macd_data['histogram'].iloc[-1]
-        prev_histogram = macd_data['histogram'].iloc[-2]
-        
-        # MACD 金叉 + 柱状图放大
-        if macd_line > signal_line and histogram > prev_histogram:
-            weights[ticker] = min(current_weight + 15, 50)
-            ctx.log(f"🟢 {ticker} MACD金叉+柱状图扩张，增仓")
-        
-        # MACD 死叉 + 柱状图缩小
-        elif macd_line < signal_line and histogram < prev_histogram:
-            weights[ticker] = max(current_weight - 15, 0)
-            ctx.log(f"🔴 {ticker} MACD死叉+柱状图收缩，减仓")
-        
-        # 零轴上方强势
-        elif macd_line > 0 and signal_line > 0:
-            ctx.log(f"📈 {ticker} MACD零轴上方，维持仓位")
-    
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        for ticker in ctx.tickers:
+            current_weight = weights.get(ticker, 0)
+            
+            # 获取 MACD 数据
+            macd_data = ctx.macd(ticker)
+            if macd_data.empty or len(macd_data) < 2:
+                continue
+            
+            macd_line = macd_data['macd'].iloc[-1]
+            signal_line = macd_data['signal'].iloc[-1]
+            histogram = macd_data['histogram'].iloc[-1]
+            prev_histogram = macd_data['histogram'].iloc[-2]
+            
+            # MACD 金叉 + 柱状图放大
+            if macd_line > signal_line and histogram > prev_histogram:
+                weights[ticker] = min(current_weight + 15, 50)
+                ctx.log("🟢 %s MACD金叉+柱状图扩张，增仓", ticker)
+            
+            # MACD 死叉 + 柱状图缩小
+            elif macd_line < signal_line and histogram < prev_histogram:
+                weights[ticker] = max(current_weight - 15, 0)
+                ctx.log("🔴 %s MACD死叉+柱状图收缩，减仓", ticker)
+            
+            # 零轴上方强势
+            elif macd_line > 0 and signal_line > 0:
+                ctx.log("📈 %s MACD零轴上方，维持仓位", ticker)
 '''
 
 # Bollinger Breakout Strategy
@@ -402,47 +378,45 @@ BOLLINGER_BREAKOUT_TEMPLATE = '''"""
 """
 
 def strategy():
-    weights = ctx.get_current_weights()
-    
     # 策略参数
     bb_period = 20
     bb_std = 2.0
     
-    for ticker in ctx.tickers:
-        current_weight = weights.get(ticker, 0)
-        price = ctx.current_price(ticker)
-        
-        # 获取布林带
-        bb = ctx.bollinger(ticker, bb_period, bb_std)
-        if bb.empty:
-            continue
-        
-        upper = bb['upper'].iloc[-1]
-        middle = bb['middle'].iloc[-1]
-        lower = bb['lower'].iloc[-1]
-        
-        # 计算 %B 指标 (价格在布林带中的位置)
-        pct_b = (price - lower) / (upper - lower) if (upper - lower) > 0 else 0.5
-        
-        if price > upper:
-            # 突破上轨：强势信号
-            weights[ticker] = min(current_weight + 10, 40)
-            ctx.log(f"🚀 {ticker} 突破布林上轨 ({price:.2f} > {upper:.2f})")
-        
-        elif price < lower:
-            # 跌破下轨：可能超卖或继续下跌
-            weights[ticker] = max(current_weight - 10, 5)
-            ctx.log(f"⚠️ {ticker} 跌破布林下轨 ({price:.2f} < {lower:.2f})")
-        
-        elif price > middle:
-            # 在中轨上方：偏多
-            ctx.log(f"📊 {ticker} 布林中轨上方，%B={pct_b:.2f}")
-        
-        else:
-            # 在中轨下方：偏空
-            ctx.log(f"📉 {ticker} 布林中轨下方，%B={pct_b:.2f}")
-    
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        for ticker in ctx.tickers:
+            current_weight = weights.get(ticker, 0)
+            price = ctx.current_price(ticker)
+            
+            # 获取最新布林带（只用最后 bb_period 个价格）
+            bb = ctx.bollinger_last(ticker, bb_period, bb_std)
+            if bb is None:
+                continue
+            
+            upper = bb['upper']
+            middle = bb['middle']
+            lower = bb['lower']
+            
+            # 计算 %B 指标 (价格在布林带中的位置)
+            pct_b = (price - lower) / (upper - lower) if (upper - lower) > 0 else 0.5
+            
+            if price > upper:
+                # 突破上轨：强势信号
+                weights[ticker] = min(current_weight + 10, 40)
+                ctx.log("🚀 %s 突破布林上轨 (%.2f > %.2f)", ticker, price, upper)
+            
+            elif price < lower:
+                # 跌破下轨：可能超卖或继续下跌
+                weights[ticker] = max(current_weight - 10, 5)
+                ctx.log("⚠️ %s 跌破布林下轨 (%.2f < %.2f)", ticker, price, lower)
+            
+            elif price > middle:
+                # 在中轨上方：偏多
+                ctx.log("📊 %s 布林中轨上方，%%B=%.2f", ticker, pct_b)
+            
+            else:
+                # 在中轨下方：偏空
+                ctx.log("📉 %s 布林中轨下方，%%B=%.2f", ticker, pct_b)
 '''
 
 # Yield Curve / Macro Strategy
@@ -453,8 +427,6 @@ YIELD_CURVE_TEMPLATE = '''"""
 """
 
 def strategy():
-    weights = ctx.get_current_weights()
-    
     # 获取 VIX 和市场状态
     current_vix = ctx.current_vix()
     vix_series = ctx.vix(20)
@@ -467,28 +439,28 @@ def strategy():
     risk_assets = ['IWY', 'LVHI']  # 根据组合调整
     safe_assets = ['GSD.SI', 'MBH.SI']
     
-    if current_vix > 30 and vix_trending_up:
-        # 类似衰退预警：大幅减少风险敞口
-        ctx.log(f"🔴 VIX={current_vix:.1f} 且上升趋势，衰退预警模式")
-        for ticker in risk_assets:
-            if ticker in weights:
-                weights[ticker] = weights.get(ticker, 0) * 0.3
-        for ticker in safe_assets:
-            if ticker in weights:
-                weights[ticker] = weights.get(ticker, 0) * 1.5
-    
-    elif current_vix > 20:
-        # 风险环境：谨慎配置
-        ctx.log(f"⚠️ VIX={current_vix:.1f}，谨慎模式")
-        for ticker in risk_assets:
-            if ticker in weights:
-                weights[ticker] = weights.get(ticker, 0) * 0.8
-    
-    else:
-        # 正常/低风险环境
-        ctx.log(f"✅ VIX={current_vix:.1f}，正常配置")
-    
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        if current_vix > 30 and vix_trending_up:
+            # 类似衰退预警：大幅减少风险敞口
+            ctx.log("🔴 VIX=%.1f 且上升趋势，衰退预警模式", current_vix)
+            for ticker in risk_assets:
+                if ticker in weights:
+                    weights[ticker] = weights.get(ticker, 0) * 0.3
+            for ticker in safe_assets:
+                if ticker in weights:
+                    weights[ticker] = weights.get(ticker, 0) * 1.5
+        
+        elif current_vix > 20:
+            # 风险环境：谨慎配置
+            ctx.log("⚠️ VIX=%.1f，谨慎模式", current_vix)
+            for ticker in risk_assets:
+                if ticker in weights:
+                    weights[ticker] = weights.get(ticker, 0) * 0.8
+        
+        else:
+            # 正常/低风险环境
+            ctx.log("✅ VIX=%.1f，正常配置", current_vix)
 '''
 
 # Tactical Asset Allocation Strategy
@@ -510,35 +482,38 @@ def strategy():
     else:
         ctx.log("📋 使用当前组合配置作为基础")
     
-    weights = base_allocation.copy()
-    
     # 获取市场环境
     vix = ctx.current_vix()
     
+    # 一次性计算全部标的的指标（最新值），循环中只做查表
+    trend = ctx.price_above_ma_all(200)
+    momentum = ctx.momentum_all(20).iloc[-1].dropna()
+    rsi_now = ctx.rsi_all(14).iloc[-1]
+    
     # 信号评分系统
+    scores = {}
     for ticker in ctx.tickers:
         score = 0
         
         # 1. 趋势信号 (+/-1)
-        if ctx.price_above_ma(ticker, 200):
+        if trend.get(ticker, False):
             score = score + 1
-            ctx.log(f"📈 {ticker}: 趋势向上 +1")
+            ctx.log("📈 %s: 趋势向上 +1", ticker)
         else:
             score = score - 1
-            ctx.log(f"📉 {ticker}: 趋势向下 -1")
+            ctx.log("📉 %s: 趋势向下 -1", ticker)
         
         # 2. 动量信号 (+/-1)
-        mom = ctx.momentum(ticker, 20)
-        if not mom.empty:
-            if mom.iloc[-1] > 0:
+        mom = momentum.get(ticker)
+        if mom is not None:
+            if mom > 0:
                 score = score + 1
             else:
                 score = score - 1
         
         # 3. RSI 信号 (+/-1)
-        rsi = ctx.rsi(ticker)
-        if not rsi.empty:
-            current_rsi = rsi.iloc[-1]
+        current_rsi = rsi_now.get(ticker)
+        if current_rsi is not None:
             if 40 < current_rsi < 60:
                 pass  # 中性
             elif current_rsi < 30:
@@ -546,19 +521,23 @@ def strategy():
             elif current_rsi > 70:
                 score = score - 1  # 超买风险
         
-        # 根据评分调整权重
-        base = weights.get(ticker, 0)
-        adjustment = 1 + (score * 0.15)  # 每分±15%
-        weights[ticker] = max(0, base * adjustment)
-        
-        ctx.log(f"📊 {ticker}: 基础={base:.1f}%, 评分={score}, 调整后={weights[ticker]:.1f}%")
+        scores[ticker] = score
+    
+    # 根据评分一次性调整全部权重：每分±15%，不低于 0
+    base_vec = ctx.weights_vec(base_allocation)
+    score_vec = ctx.weights_vec(scores)
+    weights_vec = (base_vec * (1 + score_vec * 0.15)).clip(min=0)
+    
+    if ctx.verbose:
+        for i, ticker in enumerate(ctx.tickers):
+            ctx.log("📊 %s: 基础=%.1f%%, 评分=%s, 调整后=%.1f%%", ticker, base_vec[i], scores[ticker], weights_vec[i])
     
     # VIX 整体调整
     if vix > 30:
-        ctx.log(f"⚠️ VIX={vix:.1f}，整体降低风险敞口")
-        weights = {k: v * 0.7 for k, v in weights.items()}
+        ctx.log("⚠️ VIX=%.1f，整体降低风险敞口", vix)
+        weights_vec = weights_vec * 0.7
     
-    ctx.set_target_weights(weights)
+    ctx.set_target_weights_vec(weights_vec)
 '''
 
 # Seasonal Rotation Strategy
@@ -568,8 +547,6 @@ SEASONAL_ROTATION_TEMPLATE = '''"""
 """
 
 def strategy():
-    weights = ctx.get_current_weights()
-    
     # 获取当前月份
     month = ctx.current_date.month
     
@@ -581,25 +558,25 @@ def strategy():
     winter_months = [11, 12, 1, 2, 3, 4]
     summer_months = [5, 6, 7, 8, 9, 10]
     
-    if month in winter_months:
-        ctx.log(f"📅 {month}月: 冬季强势期，增加权益配置")
-        for ticker in risk_assets:
-            base = weights.get(ticker, 0)
-            weights[ticker] = min(base * 1.2, 50)
-    
-    elif month in summer_months:
-        ctx.log(f"📅 {month}月: 夏季弱势期，降低权益配置")
-        for ticker in risk_assets:
-            base = weights.get(ticker, 0)
-            weights[ticker] = base * 0.8
-    
-    # 特别注意 9月和10月（历史统计最弱）
-    if month in [9, 10]:
-        ctx.log(f"⚠️ {month}月: 历史统计最弱月份，进一步降低")
-        for ticker in risk_assets:
-            weights[ticker] = weights.get(ticker, 0) * 0.9
-    
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        if month in winter_months:
+            ctx.log("📅 %s月: 冬季强势期，增加权益配置", month)
+            for ticker in risk_assets:
+                base = weights.get(ticker, 0)
+                weights[ticker] = min(base * 1.2, 50)
+        
+        elif month in summer_months:
+            ctx.log("📅 %s月: 夏季弱势期，降低权益配置", month)
+            for ticker in risk_assets:
+                base = weights.get(ticker, 0)
+                weights[ticker] = base * 0.8
+        
+        # 特别注意 9月和10月（历史统计最弱）
+        if month in [9, 10]:
+            ctx.log("⚠️ %s月: 历史统计最弱月份，进一步降低", month)
+            for ticker in risk_assets:
+                weights[ticker] = weights.get(ticker, 0) * 0.9
 '''
 
 # Drawdown Control Strategy
@@ -609,36 +586,34 @@ DRAWDOWN_CONTROL_TEMPLATE = '''"""
 """
 
 def strategy():
-    weights = ctx.get_current_weights()
-    
     # 策略参数
     max_drawdown_threshold = 10  # 回撤超过10%触发
     severe_drawdown = 20         # 严重回撤
     
-    for ticker in ctx.tickers:
-        current_weight = weights.get(ticker, 0)
-        
-        # 获取回撤数据
-        dd = ctx.drawdown(ticker)
-        if dd.empty:
-            continue
-        
-        current_dd = abs(dd['drawdown'].iloc[-1]) * 100  # 转为百分比
-        
-        if current_dd > severe_drawdown:
-            # 严重回撤：大幅减仓
-            weights[ticker] = max(current_weight * 0.3, 0)
-            ctx.log(f"🔴 {ticker} 严重回撤 {current_dd:.1f}%，大幅减仓")
-        
-        elif current_dd > max_drawdown_threshold:
-            # 中度回撤：适度减仓
-            weights[ticker] = max(current_weight * 0.7, 0)
-            ctx.log(f"⚠️ {ticker} 回撤 {current_dd:.1f}%，减仓")
-        
-        else:
-            ctx.log(f"✅ {ticker} 回撤 {current_dd:.1f}%，在可控范围")
-    
-    ctx.set_target_weights(weights)
+    # 在当前权重副本上调整；退出 with 时若有改动，自动设为目标权重
+    with ctx.weights_view() as weights:
+        for ticker in ctx.tickers:
+            current_weight = weights.get(ticker, 0)
+            
+            # 获取当前回撤（百分比）
+            dd = ctx.drawdown_last(ticker)
+            if dd is None:
+                continue
+            
+            current_dd = abs(dd)
+            
+            if current_dd > severe_drawdown:
+                # 严重回撤：大幅减仓
+                weights[ticker] = max(current_weight * 0.3, 0)
+                ctx.log("🔴 %s 严重回撤 %.1f%%，大幅减仓", ticker, current_dd)
+            
+            elif current_dd > max_drawdown_threshold:
+                # 中度回撤：适度减仓
+                weights[ticker] = max(current_weight * 0.7, 0)
+                ctx.log("⚠️ %s 回撤 %.1f%%，减仓", ticker, current_dd)
+            
+            else:
+                ctx.log("✅ %s 回撤 %.1f%%，在可控范围", ticker, current_dd)
 '''
 
 # Multi-Factor Scoring Strategy
@@ -650,37 +625,39 @@ MULTI_FACTOR_TEMPLATE = '''"""
 def strategy():
     scores = {}
     
+    # 一次性计算全部标的的指标（最新值），循环中只做查表
+    momentum = ctx.momentum_all(20).iloc[-1].dropna()
+    trend = ctx.price_above_ma_all(200)
+    rsi_now = ctx.rsi_all(14).iloc[-1]
+    
     for ticker in ctx.tickers:
         score = 0
         
         # 因子1: 动量 (20日)
-        mom = ctx.momentum(ticker, 20)
-        if not mom.empty:
-            mom_score = mom.iloc[-1]
+        mom_score = momentum.get(ticker)
+        if mom_score is not None:
             score = score + mom_score * 2  # 权重2
         
         # 因子2: 趋势 (在200日均线上方)
-        if ctx.price_above_ma(ticker, 200):
+        if trend.get(ticker, False):
             score = score + 10
         
         # 因子3: 波动率 (低波动加分)
-        vol = ctx.volatility(ticker, 20, annualize=True)
-        if not vol.empty:
-            vol_val = vol.iloc[-1]
+        vol_val = ctx.volatility_last(ticker, 20, annualize=True)
+        if vol_val is not None:
             if vol_val < 0.15:
                 score = score + 5  # 低波动
             elif vol_val > 0.30:
                 score = score - 5  # 高波动
         
         # 因子4: RSI (避免极端)
-        rsi = ctx.rsi(ticker)
-        if not rsi.empty:
-            rsi_val = rsi.iloc[-1]
+        rsi_val = rsi_now.get(ticker)
+        if rsi_val is not None:
             if 40 < rsi_val < 60:
                 score = score + 3  # 健康区间
         
         scores[ticker] = score
-        ctx.log(f"📊 {ticker} 综合评分: {score:.1f}")
+        ctx.log("📊 %s 综合评分: %.1f", ticker, score)
     
     # 根据评分分配权重
     total_score = sum(max(s, 0) for s in scores.values())
@@ -702,7 +679,8 @@ def strategy():
 '''
 
 # Strategy templates dictionary
-STRATEGY_TEMPLATES = {
+# 只读映射：模板在进程内共享（引擎启动时会预编译），禁止运行时修改
+STRATEGY_TEMPLATES = MappingProxyType({
     "均线交叉策略": MA_CROSSOVER_TEMPLATE,
     "动量策略": MOMENTUM_TEMPLATE,
     "VIX 波动率策略": VIX_STRATEGY_TEMPLATE,
@@ -718,7 +696,10 @@ STRATEGY_TEMPLATES = {
     "季节性轮动策略": SEASONAL_ROTATION_TEMPLATE,
     "最大回撤控制策略": DRAWDOWN_CONTROL_TEMPLATE,
     "多因子评分策略": MULTI_FACTOR_TEMPLATE,
-}
+})
+
+# 模板名称按定义顺序固定，供下拉框等直接使用
+TEMPLATE_NAMES = tuple(STRATEGY_TEMPLATES)
 
 # API Documentation for users
 STRATEGY_API_DOCS = '''
@@ -750,6 +731,22 @@ STRATEGY_API_DOCS = '''
 | `ctx.volatility(ticker, period)` | 波动率 | 年化波动率 |
 | `ctx.momentum(ticker, period)` | 动量 | 百分比变化 |
 | `ctx.drawdown(ticker)` | 回撤分析 | 返回 DataFrame |
+| `ctx.ma_all(period)` | 全部标的简单移动平均 | 返回 DataFrame，每列一个标的 |
+| `ctx.ema_all(period)` | 全部标的指数移动平均 | 返回 DataFrame，每列一个标的 |
+| `ctx.rsi_all(period)` | 全部标的 RSI | 返回 DataFrame，每列一个标的 |
+| `ctx.volatility_all(period)` | 全部标的年化波动率 | 返回 DataFrame，每列一个标的 |
+| `ctx.momentum_all(period)` | 全部标的动量 (%) | 返回 DataFrame，每列一个标的 |
+| `ctx.price_above_ma_all(period)` | 全部标的价格是否在均线上方 | 返回 bool Series，按标的索引 |
+| `ctx.get_prices_matrix()` | 对齐价格矩阵 (T×N) | 只读 ndarray，列顺序同 `ctx.prices` |
+| `ctx.momentum_last(ticker, period)` | 最新动量 (%) | 数据不足返回 None |
+| `ctx.volatility_last(ticker, period)` | 最新年化波动率 | 数据不足返回 None |
+| `ctx.rsi_last(ticker, period)` | 最新 RSI | 数据不足返回 None |
+| `ctx.drawdown_last(ticker)` | 当前回撤 (%，≤0) | 数据不足返回 None |
+| `ctx.ma_last(ticker, period)` | 最新简单移动平均 | 只计算最后 period 个价格 |
+| `ctx.bollinger_last(ticker, period, std)` | 最新布林带 | 返回 dict (upper/middle/lower)，数据不足返回 None |
+
+> 需要对多个标的计算同一指标时，优先使用 `*_all` 批量方法，一次计算全部标的。
+> 只需要最新值时，使用 `*_last` 方法，避免构建整条序列。
 
 ### 信号检测
 
@@ -759,20 +756,30 @@ STRATEGY_API_DOCS = '''
 | `ctx.price_below_ma(ticker, period)` | 价格是否在均线下方 |
 | `ctx.ma_cross_up(ticker, short, long)` | 短均线是否上穿长均线 |
 | `ctx.ma_cross_down(ticker, short, long)` | 短均线是否下穿长均线 |
+| `ctx.ma_cross_all(short, long)` | 全部标的的交叉信号（Series：1 金叉，-1 死叉，0 无） |
 
 ### 仓位管理
 
 | 方法 | 说明 |
 |------|------|
-| `ctx.get_current_weights()` | 获取当前权重 (dict) |
+| `ctx.get_current_weights()` | 获取当前权重的可修改副本 (dict)；只读时用 `ctx.current_weights` |
 | `ctx.set_target_weights(weights)` | 设置目标权重 |
-| `ctx.log(message)` | 记录信号/日志 |
+| `with ctx.weights_view() as weights:` | 在当前权重副本上修改，退出时有改动才设置目标权重 |
+| `ctx.set_target_weights(weights, bounds={'TLT': (10, 40)})` | 设置目标权重并限制单个标的上下限 (%) |
+| `ctx.normalize_weights_bounded(weights, bounds)` | 带上下限的归一化 |
+| `ctx.weights_vec(weights)` | 权重字典转为向量（按 `ctx.tickers` 顺序） |
+| `ctx.current_weights_vec()` | 当前权重向量 |
+| `ctx.set_target_weights_vec(vec)` | 以向量设置目标权重 |
+| `ctx.rebalance_linear(current_vec, target_vec, threshold)` | 向量化阈值再平衡：返回偏离掩码，有偏离时设置目标权重 |
+| `ctx.log(message, *args)` | 记录信号/日志；`ctx.log("%s RSI=%.0f", ticker, rsi)` 仅在 `ctx.verbose` 时才格式化（也可传入无参函数） |
+| `ctx.verbose` | 是否记录日志（回测中为 False，可用 `if ctx.verbose:` 跳过只为日志做的计算） |
 
 ### 属性
 
 | 属性 | 说明 |
 |------|------|
-| `ctx.tickers` | 可用标的列表 |
+| `ctx.tickers` | 可用标的（只读元组，不能 `append`，需要时用 `list(ctx.tickers)`） |
+| `ctx.current_weights` | 当前权重只读视图，循环中读取无需复制 |
 | `ctx.current_date` | 当前日期 |
 
 ## 示例
@@ -789,6 +796,13 @@ def strategy():
         weights['IWY'] = 50
         ctx.log("IWY 在 200 日均线上方")
     
+    # 均线交叉（一次算出全部标的）
+    cross = ctx.ma_cross_all(20, 50)
+    for ticker in ctx.tickers:
+        if cross[ticker] < 0:
+            weights[ticker] = 0
+            ctx.log("%s 死叉，清仓", ticker)
+    
     # 设置目标权重
     ctx.set_target_weights(weights)
 ```
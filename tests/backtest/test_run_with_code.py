@@ -0,0 +1,43 @@
+"""run_with_code compiles the strategy once before the daily loop."""
+
+from datetime import date
+from unittest.mock import patch
+
+from backtest.engine import BacktestEngine, BacktestConfig
+from strategy.engine import StrategyEngine
+
+
+def _captured_strategy_func(code):
+    captured = {}
+
+    def fake_run_dynamic(self, tickers, initial_weights, strategy_func, config=None):
+        captured["func"] = strategy_func
+
+    engine = BacktestEngine(BacktestConfig(start_date=date(2024, 1, 2), end_date=date(2024, 3, 1)))
+    with patch.object(BacktestEngine, "run_dynamic", fake_run_dynamic):
+        engine.run_with_code(["AAA"], {"AAA": 100}, code)
+    return captured["func"]
+
+
+class _Ctx:
+    tickers = ["AAA"]
+
+    def get_current_weights(self):
+        return {"AAA": 100.0}
+
+
+def test_uncompilable_strategy_is_not_executed_per_bar():
+    func = _captured_strategy_func("def strategy(:\n    pass")
+    with patch.object(StrategyEngine, "execute") as execute:
+        assert func(_Ctx(), date(2024, 1, 3)) is None
+        assert func(_Ctx(), date(2024, 1, 4)) is None
+    execute.assert_not_called()
+
+
+def test_compiled_strategy_executes_without_logs():
+    func = _captured_strategy_func("ctx.set_target_weights({'AAA': 100})")
+    with patch.object(StrategyEngine, "execute") as execute:
+        execute.return_value.success = True
+        execute.return_value.target_weights = {"AAA": 100.0}
+        assert func(_Ctx(), date(2024, 1, 3)) == {"AAA": 100.0}
+    assert execute.call_args.kwargs["verbose"] is False
@@ -0,0 +1,40 @@
+"""Shared JSON helpers: same on-disk format with or without orjson."""
+
+import numpy as np
+import pytest
+
+from config import jsonio
+
+DATA = {"动量": {"code": "x = 1", "weights": {"QQQ": 60.0, "SPY": 40}, "tags": []}}
+
+
+@pytest.mark.skipif(jsonio.orjson is None, reason="orjson not installed")
+def test_json_fallback_matches_orjson_format(monkeypatch):
+    expected = (jsonio.dumps(DATA), jsonio.dumps_line(DATA))
+    monkeypatch.setattr(jsonio, "orjson", None)
+    assert (jsonio.dumps(DATA), jsonio.dumps_line(DATA)) == expected
+    assert jsonio.loads(expected[0]) == jsonio.loads(expected[1]) == DATA
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_numpy_scalars_are_serialized(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(jsonio, "orjson", None)
+    elif jsonio.orjson is None:
+        pytest.skip("orjson not installed")
+    data = {"weights": {"A": np.float64(60.5), "B": np.int64(39)}, "ok": np.bool_(True)}
+    expected = {"weights": {"A": 60.5, "B": 39}, "ok": True}
+    assert jsonio.loads(jsonio.dumps(data)) == expected
+    assert jsonio.loads(jsonio.dumps_line(data)) == expected
+    with pytest.raises(TypeError):
+        jsonio.dumps({"x": object()})
+
+
+def test_read_journal_truncates_torn_tail(tmp_path):
+    path = tmp_path / "x.journal.jsonl"
+    path.write_bytes(jsonio.dumps_line({"op": "put"}) + b'\n{"op": "del')
+    assert jsonio.read_journal(path) == [{"op": "put"}]
+    assert path.read_bytes() == b'{"op":"put"}\n'
+
+    with pytest.raises(FileNotFoundError):
+        jsonio.read_journal(tmp_path / "missing.jsonl")
@@ -0,0 +1,56 @@
+"""DataFetcher batch requests must keep each ticker's own trading calendar."""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import fetcher as fetcher_module
+from data.fetcher import DataFetcher
+from strategy.engine import StrategyContext
+
+
+@pytest.fixture
+def panel() -> pd.DataFrame:
+    """Union calendar of two listings: NEW starts late, SGX skips some US days."""
+    idx = pd.bdate_range("2024-01-02", periods=120)
+    old = pd.Series(50.0 + np.sin(np.arange(120) / 5) * 5, index=idx)
+    new = pd.Series(np.nan, index=idx)
+    new.iloc[-28:] = 40.0 + np.arange(28) * 0.5
+    sgx = pd.Series(30.0 + np.arange(120) * 0.1, index=idx)
+    sgx.iloc[::7] = np.nan  # 其他市场休市日
+    return pd.DataFrame({"OLD": old, "NEW": new, "SGX.SI": sgx})
+
+
+@pytest.fixture
+def data_fetcher(panel, tmp_path, monkeypatch) -> DataFetcher:
+    def download(tickers, start=None, end=None, **kwargs):
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        # 与 yfinance 一致：只返回请求标的中至少一个有数据的交易日
+        raw = panel[tickers].dropna(how="all")
+        raw.columns = pd.MultiIndex.from_product([["Adj Close"], tickers])
+        return raw
+
+    monkeypatch.setattr(fetcher_module.yf, "download", download)
+    return DataFetcher(cache_dir=tmp_path)
+
+
+def test_batch_columns_are_not_gap_filled(data_fetcher, panel):
+    df = data_fetcher.fetch_prices_batch(["OLD", "NEW", "SGX.SI"], end_date="2024-06-30", use_cache=False)
+    for ticker in panel.columns:
+        pd.testing.assert_series_equal(df[ticker].dropna(), panel[ticker].dropna(), check_freq=False)
+
+
+def test_batch_context_matches_per_ticker_fetch(data_fetcher):
+    tickers = ["OLD", "NEW", "SGX.SI"]
+    batched = StrategyContext(tickers, {t: 100 / 3 for t in tickers}, date(2024, 6, 14), data_fetcher=data_fetcher)
+    for ticker in tickers:
+        single = data_fetcher.fetch_prices(ticker, end_date="2024-06-14", use_cache=False)[ticker]
+        ctx = StrategyContext([ticker], {ticker: 100.0}, date(2024, 6, 14), data_fetcher=data_fetcher)
+        assert len(batched.get_price(ticker)) == len(single) == len(ctx.get_price(ticker))
+        assert batched.ma_last(ticker, 100) == pytest.approx(ctx.ma_last(ticker, 100))
+        np.testing.assert_allclose(batched.momentum(ticker, 60).to_numpy(), ctx.momentum(ticker, 60).to_numpy())
+        np.testing.assert_allclose(batched.rsi(ticker).to_numpy(), ctx.rsi(ticker).to_numpy())
+    assert len(batched.get_price("NEW")) == 28
+    assert batched.momentum_last("NEW", 60) is None
@@ -0,0 +1,60 @@
+"""Indicator kernels must match the pandas reference implementations."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.indicators import TechnicalIndicators, _ema_kernel, _macd_kernel, _rsi_kernel, _rsi_last_kernel, _sma_kernel
+
+
+@pytest.fixture
+def close() -> np.ndarray:
+    rng = np.random.default_rng(1)
+    arr = 100 + np.cumsum(rng.normal(size=300))
+    arr[10:14] = arr[9]  # flat stretch: zero gains and losses
+    return arr
+
+
+@pytest.mark.parametrize("period", [1, 3, 14, 50, 400])
+def test_sma_kernel_matches_rolling(close, period):
+    expected = pd.Series(close).rolling(window=period, min_periods=1).mean()
+    np.testing.assert_allclose(_sma_kernel(close, period), expected.to_numpy(), rtol=1e-10)
+
+
+@pytest.mark.parametrize("period", [1, 3, 14, 50])
+def test_ema_kernel_matches_ewm(close, period):
+    expected = pd.Series(close).ewm(span=period, adjust=False).mean()
+    np.testing.assert_allclose(_ema_kernel(close, period), expected.to_numpy(), rtol=1e-10)
+
+
+@pytest.mark.parametrize("fast, slow, signal", [(12, 26, 9), (3, 10, 1)])
+def test_macd_kernel_matches_ewm(close, fast, slow, signal):
+    s = pd.Series(close)
+    macd = s.ewm(span=fast, adjust=False).mean() - s.ewm(span=slow, adjust=False).mean()
+    sig = macd.ewm(span=signal, adjust=False).mean()
+    expected = np.column_stack([macd, sig, macd - sig])
+    np.testing.assert_allclose(_macd_kernel(close, fast, slow, signal), expected, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("period", [2, 14, 50])
+def test_rsi_kernel_matches_pandas(close, period):
+    delta = pd.Series(close).diff()
+    gain = delta.where(delta > 0, 0.0).ewm(com=period - 1, min_periods=period).mean()
+    loss = (-delta).where(delta < 0, 0.0).ewm(com=period - 1, min_periods=period).mean()
+    expected = (100 - 100 / (1 + gain / loss)).fillna(50)
+    np.testing.assert_allclose(_rsi_kernel(close, period), expected.to_numpy(), rtol=1e-9)
+
+
+def test_rsi_kernel_flat_and_rising_edges():
+    assert np.all(_rsi_kernel(np.full(20, 5.0), 14) == 50.0)
+    assert _rsi_kernel(np.arange(20, dtype=np.float64), 14)[-1] == 100.0
+
+
+@pytest.mark.parametrize("period", [2, 14, 50, 400])
+def test_rsi_last_matches_full_series(close, period):
+    assert _rsi_last_kernel(close, period) == pytest.approx(_rsi_kernel(close, period)[-1], rel=1e-12)
+    series = pd.Series(close)
+    assert TechnicalIndicators.rsi_last(series, period) == pytest.approx(
+        TechnicalIndicators.rsi(series, period).iloc[-1], rel=1e-9
+    )
+    assert TechnicalIndicators.rsi_last(series.iloc[:0], period) is None
@@ -0,0 +1,255 @@
+"""Unit tests for AlertScheduler bookkeeping (no network, no real config files)."""
+
+import os
+
+import pytest
+
+from config.settings import Settings
+from notification.scheduler import AlertScheduler
+
+
+@pytest.fixture
+def scheduler(tmp_path) -> AlertScheduler:
+    """Scheduler whose config/lock files live under a temp directory."""
+    s = AlertScheduler()
+    s.settings = Settings(base_dir=tmp_path, parent_project_dir=tmp_path)
+    s.config_file = tmp_path / "scheduler_config.json"
+    s.lock_file = tmp_path / "scheduler.lock"
+    return s
+
+
+def test_callbacks_are_copy_on_write(scheduler):
+    def cb_a():
+        return "a"
+
+    def cb_b():
+        return "b"
+
+    scheduler.add_check_callback(cb_a)
+    snapshot = scheduler._check_callbacks
+    scheduler.add_check_callback(cb_b)
+
+    # An in-flight iteration keeps seeing the snapshot it grabbed
+    assert snapshot == (cb_a,)
+    assert scheduler._check_callbacks == (cb_a, cb_b)
+
+    scheduler.remove_check_callback(cb_a)
+    assert scheduler._check_callbacks == (cb_b,)
+    # Removing an unknown callback is a no-op
+    scheduler.remove_check_callback(cb_a)
+    assert scheduler._check_callbacks == (cb_b,)
+
+
+def test_run_checks_reports_each_callback(scheduler):
+    def ok():
+        return 1
+
+    def boom():
+        raise RuntimeError("fail")
+
+    scheduler.add_check_callback(ok)
+    scheduler.add_check_callback(boom)
+    results = scheduler._run_checks()
+
+    assert [c['callback'] for c in results['checks']] == ['ok', 'boom']
+    assert results['checks'][0] == {'callback': 'ok', 'success': True, 'result': 1}
+    assert results['checks'][1]['success'] is False
+    assert results['checks'][1]['error'] == "fail"
+
+
+def test_engines_cached_until_data_file_changes(scheduler):
+    config = scheduler.settings.load_notification_config()
+    first = scheduler._get_engines(config)
+    assert scheduler._get_engines(config) is first
+
+    strategies_file = scheduler.settings.strategies_file
+    strategies_file.write_text("{}")
+    os.utime(strategies_file, ns=(1, 1))
+    second = scheduler._get_engines(config)
+    assert second is not first
+
+    # 旧版告警配置变化同样触发重建，被替换的推送器会被关闭
+    closed = []
+    second[3].close = lambda: closed.append(True)
+    scheduler.settings.legacy_alert_config_file.write_text("{}")
+    assert scheduler._get_engines(config) is not second
+    assert closed == [True]
+
+
+def test_should_run_now_uses_injected_clock():
+    from datetime import datetime
+    from notification.scheduler import ScheduleConfig
+
+    config = ScheduleConfig(enabled=True, check_time="09:30", last_run="2024-01-01")
+    assert config.should_run_now(datetime(2024, 1, 2, 9, 29)) is False
+    assert config.should_run_now(datetime(2024, 1, 2, 9, 30)) is True
+    # Already ran today
+    assert config.should_run_now(datetime(2024, 1, 1, 10, 0)) is False
+
+
+def test_active_subscriptions_rebuilt_on_config_change(scheduler):
+    from config.settings import NotificationDefaults, NotificationSubscription
+
+    settings = scheduler.settings
+    config = NotificationDefaults(subscriptions=[
+        NotificationSubscription(id="1", strategy_name="s", portfolio_name="p"),
+        NotificationSubscription(id="2", strategy_name="s", portfolio_name="p", enabled=False),
+    ])
+    settings.save_notification_config(config)
+
+    _, active = scheduler._load_active_subscriptions()
+    assert [s.id for s in active] == ["1"]
+    assert scheduler._load_active_subscriptions()[1] is active
+
+    config.subscriptions[1].enabled = True
+    settings.save_notification_config(config)
+    os.utime(settings.notification_config_file, ns=(1, 1))
+    _, active = scheduler._load_active_subscriptions()
+    assert [s.id for s in active] == ["1", "2"]
+
+
+def test_save_config_round_trips_without_leaving_temp_file(scheduler):
+    from notification.scheduler import ScheduleConfig
+
+    config = ScheduleConfig(enabled=True, check_time="10:00", last_run="2024-01-02")
+    assert scheduler.save_config(config) is True
+    assert scheduler.load_config() == config
+    assert list(scheduler.config_file.parent.glob("*.tmp")) == []
+
+
+def test_seconds_until_next_run():
+    from datetime import datetime
+    from notification.scheduler import ScheduleConfig
+
+    config = ScheduleConfig(enabled=True, check_time="09:30", last_run="2024-01-01")
+    assert config.seconds_until_next_run(datetime(2024, 1, 2, 9, 0)) == 30 * 60
+    assert config.seconds_until_next_run(datetime(2024, 1, 2, 10, 0)) == 0
+    # Already ran today -> wait for tomorrow's slot
+    assert config.seconds_until_next_run(datetime(2024, 1, 1, 10, 0)) == 23.5 * 3600
+
+
+def test_scheduler_loop_runs_once_then_sleeps(scheduler, monkeypatch):
+    from notification.scheduler import ScheduleConfig
+
+    scheduler.save_config(ScheduleConfig(enabled=True, check_time="00:00"))
+    calls = []
+    monkeypatch.setattr(scheduler, "run_subscription_checks", lambda: calls.append(1) or [])
+
+    waits = []
+
+    def fake_wait(timeout):
+        waits.append(timeout)
+        return len(waits) >= 2  # stop after the second sleep
+
+    monkeypatch.setattr(scheduler._stop_event, "wait", fake_wait)
+    scheduler._running = True
+    scheduler._scheduler_loop()
+
+    assert calls == [1]
+    assert waits == [scheduler.MAX_SLEEP_SECONDS] * 2
+    assert scheduler.load_config().last_run != ""
+
+
+def test_shared_strategy_executed_once_per_run(scheduler, monkeypatch):
+    from unittest.mock import MagicMock
+    from config.settings import NotificationDefaults, NotificationSubscription
+    from portfolio.manager import Portfolio
+    from strategy.engine import StrategyResult
+
+    subs = [
+        NotificationSubscription(id=str(i), strategy_name="s", portfolio_name="p",
+                                 notify_email=False, notify_wechat=False)
+        for i in range(3)
+    ]
+    config = NotificationDefaults(subscriptions=subs)
+    strategy_engine = MagicMock()
+    strategy_engine.get.return_value = {'code': "pass"}
+    strategy_engine.execute.return_value = StrategyResult(
+        success=True, target_weights={"AAA": 100.0})
+    portfolio_manager = MagicMock()
+    portfolio_manager.get.return_value = Portfolio(
+        name="p", tickers=["AAA"], weights={"AAA": 100.0})
+
+    monkeypatch.setattr(scheduler, "_load_active_subscriptions", lambda: (config, subs))
+    monkeypatch.setattr(scheduler, "_get_engines",
+                        lambda cfg: (strategy_engine, portfolio_manager, MagicMock(), MagicMock()))
+
+    results = scheduler.run_subscription_checks()
+
+    assert [r.success for r in results] == [True, True, True]
+    assert strategy_engine.execute.call_count == 1
+
+
+def test_lock_acquire_and_release(scheduler):
+    assert scheduler._acquire_lock() is True
+    assert scheduler.lock_file.exists()
+    scheduler._release_lock()
+    assert not scheduler.lock_file.exists()
+    # Releasing again is harmless
+    scheduler._release_lock()
+
+
+def test_run_subscription_checks_async_sends_all_channels(scheduler, monkeypatch):
+    import asyncio
+    from unittest.mock import MagicMock
+    from config.settings import NotificationDefaults, NotificationSubscription
+    from portfolio.manager import Portfolio
+    from strategy.engine import StrategyResult
+
+    subs = [
+        NotificationSubscription(id=str(i), strategy_name="s", portfolio_name="p")
+        for i in range(2)
+    ]
+    config = NotificationDefaults(subscriptions=subs)
+    strategy_engine = MagicMock()
+    strategy_engine.get.return_value = {'code': "pass"}
+    strategy_engine.execute.return_value = StrategyResult(
+        success=True, target_weights={"AAA": 50.0, "BBB": 50.0})
+    portfolio_manager = MagicMock()
+    portfolio_manager.get.return_value = Portfolio(
+        name="p", tickers=["AAA", "BBB"], weights={"AAA": 100.0, "BBB": 0.0})
+    email_sender, wechat_push = MagicMock(), MagicMock()
+    email_sender.send_strategy_alert.return_value.success = True
+    wechat_push.send_strategy_alert.return_value.success = True
+
+    monkeypatch.setattr(scheduler, "_load_active_subscriptions", lambda: (config, subs))
+    monkeypatch.setattr(scheduler, "_get_engines",
+                        lambda cfg: (strategy_engine, portfolio_manager, email_sender, wechat_push))
+
+    results = asyncio.run(scheduler.run_subscription_checks_async())
+
+    assert [(r.has_changes, r.email_sent, r.wechat_sent) for r in results] == [(True, True, True)] * 2
+    assert email_sender.send_strategy_alert.call_count == 2
+    assert wechat_push.send_strategy_alert.call_count == 2
+    assert strategy_engine.execute.call_count == 1
+
+
+def test_run_subscription_checks_async_keeps_loop_responsive(scheduler, monkeypatch):
+    import asyncio
+    import time
+    from unittest.mock import MagicMock
+    from config.settings import NotificationDefaults, NotificationSubscription
+
+    subs = [NotificationSubscription(id="0", strategy_name="s", portfolio_name="p")]
+    monkeypatch.setattr(scheduler, "_load_active_subscriptions",
+                        lambda: (NotificationDefaults(subscriptions=subs), subs))
+    monkeypatch.setattr(scheduler, "_get_engines",
+                        lambda cfg: (MagicMock(), MagicMock(), MagicMock(), MagicMock()))
+
+    def slow_evaluate(sub, *args):
+        time.sleep(0.3)  # 模拟耗时的策略执行
+        return MagicMock(), None
+
+    monkeypatch.setattr(scheduler, "_evaluate_subscription", slow_evaluate)
+
+    async def main():
+        ticks = 0
+        task = asyncio.create_task(scheduler.run_subscription_checks_async())
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        await task
+        return ticks
+
+    # 执行期间事件循环仍能调度其他协程
+    assert asyncio.run(main()) > 5
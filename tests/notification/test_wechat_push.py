@@ -0,0 +1,188 @@
+"""Unit tests for WeChatPush (HTTP calls are mocked)."""
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from config.settings import NotificationDefaults
+from notification.wechat_push import WeChatPush
+
+
+@pytest.fixture(autouse=True)
+def clear_dedup_cache():
+    """The dedup cache is process-wide; isolate it per test."""
+    WeChatPush._dedup_cache.clear()
+    yield
+    WeChatPush._dedup_cache.clear()
+
+
+@pytest.fixture
+def push() -> WeChatPush:
+    """WeChatPush with both services configured and a mocked HTTP session."""
+    p = WeChatPush(NotificationDefaults(serverchan_key="SCT", pushplus_token="PP"))
+    p._session = MagicMock()
+    return p
+
+
+def _response(payload):
+    resp = MagicMock()
+    resp.json.return_value = payload
+    return resp
+
+
+def test_sends_go_through_pooled_session(push):
+    push._session.post.return_value = _response({'code': 200})
+    assert push.send_pushplus("t", "c").success
+
+    push._session.post.return_value = _response({'code': 0})
+    assert push.send_serverchan("t", "c").success
+
+    assert push._session.post.call_count == 2
+
+
+def test_context_manager_closes_session(push):
+    session = push._session
+    with push:
+        pass
+    session.close.assert_called_once()
+
+
+def test_send_async_falls_back_on_failure(push):
+    import asyncio
+
+    def post(url, **kwargs):
+        if url == push.PUSHPLUS_API:
+            return _response({'code': 500, 'msg': 'down'})
+        return _response({'code': 0})
+
+    push._session.post.side_effect = post
+    result = asyncio.run(push.send_async("t", "c"))
+
+    assert result.success
+    assert result.service == "serverchan"
+    assert push._session.post.call_count == 2
+
+
+def test_send_async_sends_once_when_first_service_succeeds(push):
+    import asyncio
+
+    push._session.post.side_effect = lambda url, **kwargs: _response({'code': 200, 'data': 'ok'})
+    result = asyncio.run(push.send_async("t", "c"))
+
+    assert result.success
+    assert result.service == "pushplus"
+    assert push._session.post.call_count == 1
+
+
+def test_send_async_without_services():
+    import asyncio
+
+    push = WeChatPush(NotificationDefaults())
+    result = asyncio.run(push.send_async("t", "c"))
+    assert not result.success
+    assert result.service == "none"
+
+
+def test_identical_push_is_deduplicated_within_ttl(push, monkeypatch):
+    push._session.post.return_value = _response({'code': 200})
+    first = push.send_pushplus("t", "c")
+    second = push.send_pushplus("t", "c")
+    assert second is first
+    assert push._session.post.call_count == 1
+
+    # Different content is not deduplicated
+    push.send_pushplus("t", "other")
+    assert push._session.post.call_count == 2
+
+    # Expired entries are sent again
+    monkeypatch.setattr(WeChatPush, "DEDUP_TTL_SECONDS", -1)
+    WeChatPush._dedup_cache.clear()
+    push.send_pushplus("t", "c")
+    push.send_pushplus("t", "c")
+    assert push._session.post.call_count == 4
+
+
+def test_failed_push_is_not_cached(push):
+    push._session.post.return_value = _response({'code': 500, 'msg': 'err'})
+    push.send_pushplus("t", "c")
+    push.send_pushplus("t", "c")
+    assert push._session.post.call_count == 2
+
+
+def _alert(name):
+    return {
+        'strategy_name': name,
+        'current_weights': {"AAA": 100.0},
+        'target_weights': {"AAA": 50.0, "BBB": 50.0},
+        'reason': "signal",
+    }
+
+
+def test_batch_alerts_coalesce_into_one_post(push):
+    push._session.post.return_value = _response({'code': 200})
+    result = push.send_strategy_alerts_batch([_alert("s1"), _alert("s2"), _alert("s3")])
+
+    assert result.success
+    assert push._session.post.call_count == 1
+    payload = push._session.post.call_args.kwargs['json']
+    assert payload['title'] == "🔄 3个策略调仓提醒"
+    assert payload['template'] == "markdown"
+    for name in ("s1", "s2", "s3"):
+        assert f"**策略名称:** {name}" in payload['content']
+
+
+def test_batch_alerts_split_when_over_size_cap(push, monkeypatch):
+    push._session.post.return_value = _response({'code': 200})
+    single = len(push._build_alert(**_alert("s1")).encode('utf-8'))
+    monkeypatch.setattr(WeChatPush, "MAX_CONTENT_BYTES", 2 * single + 200)
+
+    push.send_strategy_alerts_batch([_alert(f"s{i}") for i in range(4)])
+    assert push._session.post.call_count == 2
+
+
+def test_alert_markdown_rows_sorted_and_deduplicated():
+    body = WeChatPush._build_alert(
+        "s",
+        current_weights={"BBB": 50.0, "AAA": 50.0, "CCC": 0.0},
+        target_weights={"AAA": 20.0, "DDD": 30.0, "BBB": 50.0},
+    )
+    rows = [line for line in body.splitlines() if line.startswith("| ") and "%" in line]
+    assert [row.split(" | ")[0] for row in rows] == ["| AAA", "| DDD"]
+
+
+def test_weight_changes_filter_small_diffs():
+    changes = list(WeChatPush._iter_weight_changes(
+        {"AAA": 10.0, "BBB": 10.0},
+        {"AAA": 10.05, "BBB": 12.5, "CCC": 0.2},
+    ))
+    assert changes == [("BBB", 10.0, 12.5, 2.5), ("CCC", 0.0, 0.2, 0.2)]
+    assert list(WeChatPush._iter_weight_changes({}, {})) == []
+
+
+def test_fire_and_forget_queues_and_flushes_on_shutdown(push):
+    push._session.post.return_value = _response({'code': 200})
+    result = push.send_strategy_alert(**_alert("s1"), fire_and_forget=True)
+    assert result.success and result.message == "queued"
+    WeChatPush.shutdown()
+    assert push._session.post.call_count == 1
+    assert WeChatPush._executor is None
+
+
+def test_batch_alerts_share_one_timestamp(push, monkeypatch):
+    push._session.post.return_value = _response({'code': 200})
+    calls = []
+    real_now = datetime.now
+
+    class _Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            calls.append(1)
+            return real_now(tz)
+
+    monkeypatch.setattr("notification.wechat_push.datetime", _Clock)
+    push.send_strategy_alerts_batch([_alert("s1"), _alert("s2"), _alert("s3")])
+    body = push._session.post.call_args.kwargs['json']['content']
+    assert body.count("*此消息由 Quant Platform 自动发送*") == 1
+    # 一次用于检测时间，PushResult 的时间戳另计
+    assert len(calls) == 2
@@ -0,0 +1,246 @@
+"""Unit tests for PortfolioManager persistence (temp storage only)."""
+
+import json
+
+import numpy as np
+import pytest
+
+from portfolio.manager import Portfolio, PortfolioManager
+
+
+@pytest.fixture
+def storage_path(tmp_path):
+    """Portfolio file with two portfolios."""
+    path = tmp_path / "portfolios.json"
+    data = {
+        "Growth": Portfolio(name="Growth", tickers=["QQQ", "SPY"],
+                            weights={"QQQ": 60.0, "SPY": 40.0}).to_dict(),
+        "Income": Portfolio(name="Income", tickers=["TLT"],
+                            weights={"TLT": 100.0}).to_dict(),
+    }
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def manager(storage_path) -> PortfolioManager:
+    return PortfolioManager(storage_path=storage_path)
+
+
+def test_portfolios_materialized_lazily(manager):
+    assert manager.get_portfolio_names() == ["Growth", "Income"]
+    assert manager._portfolios == {}
+
+    growth = manager.get("Growth")
+    assert growth.weights == {"QQQ": 60.0, "SPY": 40.0}
+    assert list(manager._portfolios) == ["Growth"]
+    assert manager.get("Growth") is growth
+    assert manager.get("Missing") is None
+
+
+def test_mutations_round_trip(manager, storage_path):
+    growth = manager.get("Growth")
+    growth.weights["QQQ"] = 70.0
+    assert manager.update(growth)
+    assert manager.rename("Income", "Bonds")
+    assert manager.create(Portfolio(name="Gold", tickers=["GLD"], weights={"GLD": 100.0}))
+    assert manager.delete("Gold")
+    assert not manager.create(Portfolio(name="Growth", tickers=[], weights={}))
+
+    reloaded = PortfolioManager(storage_path=storage_path)
+    assert reloaded.get_portfolio_names() == ["Growth", "Bonds"]
+    assert reloaded.get("Growth").weights["QQQ"] == 70.0
+    assert reloaded.get("Bonds").name == "Bonds"
+    assert reloaded.get("Bonds").tickers == ("TLT",)
+
+
+def test_duplicate(manager):
+    assert manager.duplicate("Growth", "Growth Copy")
+    copy = manager.get("Growth Copy")
+    assert copy.weights == manager.get("Growth").weights
+    assert copy.description == "Copy of Growth"
+    assert copy.tickers is manager.get("Growth").tickers
+    assert copy.weights is not manager.get("Growth").weights
+    assert not manager.duplicate("Growth", "Income")
+
+
+def test_save_is_atomic_and_skipped_when_clean(manager, storage_path):
+    manager.get_all()
+    mtime = storage_path.stat().st_mtime_ns
+    assert manager.save()
+    assert storage_path.stat().st_mtime_ns == mtime  # nothing modified -> no write
+
+    manager.delete("Income")
+    assert manager._modified
+    assert manager.save()
+    assert json.loads(storage_path.read_text(encoding="utf-8")).keys() == {"Growth"}
+    assert list(storage_path.parent.glob("*.tmp")) == []
+
+
+def test_portfolio_total_weight_cache(manager):
+    growth = manager.get("Growth")
+    assert growth.total_weight == 100.0
+    assert not hasattr(growth, "__dict__")
+
+    growth.weights["QQQ"] = 80.0
+    assert manager.update(growth)
+    assert growth.total_weight == 120.0
+    assert growth.normalized_weights == {"QQQ": 80.0 / 120.0, "SPY": 40.0 / 120.0}
+
+
+def test_post_init_drops_stray_weights_and_caches_total():
+    p = Portfolio(name="P", tickers=["A", "B"], weights={"A": 30.0, "C": 50.0})
+    assert p.weights == {"A": 30.0, "B": 0.0}
+    assert p._total_weight == 30.0
+    assert p.total_weight == 30.0
+
+
+def test_portfolio_drops_weights_for_unknown_tickers():
+    p = Portfolio(name="p", tickers=["A", "B"], weights={"A": 50.0, "C": 50.0})
+    assert p.weights == {"A": 50.0, "B": 0.0}
+
+
+def test_missing_file_falls_back_to_example(tmp_path):
+    example = tmp_path / "portfolios.json.example"
+    example.write_text(json.dumps({
+        "Demo": {"name": "Demo", "tickers": ["SPY"], "weights": {"SPY": 100.0}},
+    }), encoding="utf-8")
+    storage_path = tmp_path / "portfolios.json"
+
+    manager = PortfolioManager(storage_path=storage_path)
+    assert manager.get_portfolio_names() == ["Demo"]
+    assert storage_path.exists()
+
+
+def test_missing_file_without_example(tmp_path):
+    manager = PortfolioManager(storage_path=tmp_path / "portfolios.json")
+    assert manager.get_all() == {}
+
+
+def test_sidecar_used_only_when_in_sync(manager, storage_path):
+    import os
+
+    growth = manager.get("Growth")
+    growth.description = "saved"
+    manager.update(growth)
+    manager.save()
+    sidecar = storage_path.with_suffix(".sidecar")
+    assert sidecar.exists()
+
+    reloaded = PortfolioManager(storage_path=storage_path)
+    assert reloaded.get("Growth").description == "saved"
+
+    # Hand-edited JSON wins over a stale sidecar, even when its mtime is preserved
+    st = storage_path.stat()
+    data = json.loads(storage_path.read_text(encoding="utf-8"))
+    data["Growth"]["description"] = "edited"
+    storage_path.write_text(json.dumps(data), encoding="utf-8")
+    os.utime(storage_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert PortfolioManager(storage_path=storage_path).get("Growth").description == "edited"
+
+
+def test_sidecar_is_never_unpickled(manager, storage_path):
+    import pickle
+
+    manager._modified = True
+    manager.save()
+    sidecar = storage_path.with_suffix(".sidecar")
+    header = sidecar.read_bytes()[:len(PortfolioManager._SIDECAR_MAGIC) + 16]
+    sidecar.write_bytes(header + pickle.dumps({"Evil": {}}))
+    assert PortfolioManager(storage_path=storage_path).get_portfolio_names() == ["Growth", "Income"]
+
+
+def test_mutations_are_journaled_and_replayed(storage_path):
+    # Pad the main file so two small edits stay under the compaction threshold
+    data = json.loads(storage_path.read_text(encoding="utf-8"))
+    data["Filler"] = Portfolio(name="Filler", tickers=["SPY"], weights={"SPY": 100.0},
+                               description="x" * 2000).to_dict()
+    storage_path.write_text(json.dumps(data), encoding="utf-8")
+    manager = PortfolioManager(storage_path=storage_path)
+    base = storage_path.read_bytes()
+    journal = storage_path.with_suffix(".journal.jsonl")
+
+    growth = manager.get("Growth")
+    growth.description = "journaled"
+    assert manager.update(growth)
+    assert manager.rename("Income", "Bonds")
+
+    # Small edits only append to the journal; the main file is untouched
+    assert storage_path.read_bytes() == base
+    assert len(journal.read_bytes().splitlines()) == 2
+
+    reloaded = PortfolioManager(storage_path=storage_path)
+    assert reloaded.get_portfolio_names() == ["Growth", "Filler", "Bonds"]
+    assert reloaded.get("Growth").description == "journaled"
+
+    # Compaction folds the journal into the main file
+    assert reloaded.save()
+    assert not journal.exists()
+    assert json.loads(storage_path.read_text(encoding="utf-8")).keys() == {"Growth", "Filler", "Bonds"}
+
+
+def test_journal_compacts_when_large(manager, storage_path):
+    journal = storage_path.with_suffix(".journal.jsonl")
+    growth = manager.get("Growth")
+    for i in range(20):
+        growth.description = "x" * 50 + str(i)
+        assert manager.update(growth)
+    journal_size = journal.stat().st_size if journal.exists() else 0
+    assert journal_size <= storage_path.stat().st_size / 2 + 200
+    assert PortfolioManager(storage_path=storage_path).get("Growth").description.endswith("19")
+
+
+@pytest.fixture
+def large_manager(storage_path) -> PortfolioManager:
+    """Main file large enough that a few appends never trigger compaction."""
+    data = json.loads(storage_path.read_text(encoding="utf-8"))
+    data["Growth"]["description"] = "x" * 4000
+    storage_path.write_text(json.dumps(data), encoding="utf-8")
+    return PortfolioManager(storage_path=storage_path)
+
+
+def test_torn_journal_tail_is_ignored(large_manager, storage_path):
+    assert large_manager.delete("Income")
+    journal = storage_path.with_suffix(".journal.jsonl")
+    with open(journal, "ab") as f:
+        f.write(b'{"op": "delete", "na')
+    reloaded = PortfolioManager(storage_path=storage_path)
+    assert reloaded.get_portfolio_names() == ["Growth"]
+
+    # 之后追加的记录不能接在半行后面
+    assert reloaded.create(Portfolio(name="B", tickers=["GLD"], weights={"GLD": 100.0}))
+    assert journal.exists()
+    assert PortfolioManager(storage_path=storage_path).get_portfolio_names() == ["Growth", "B"]
+
+
+def test_journal_record_missing_newline_is_terminated(large_manager, storage_path):
+    assert large_manager.delete("Income")
+    journal = storage_path.with_suffix(".journal.jsonl")
+    journal.write_bytes(journal.read_bytes().rstrip(b"\n"))
+    reloaded = PortfolioManager(storage_path=storage_path)
+    assert reloaded.create(Portfolio(name="B", tickers=["GLD"], weights={"GLD": 100.0}))
+    assert journal.exists()
+    assert PortfolioManager(storage_path=storage_path).get_portfolio_names() == ["Growth", "B"]
+
+
+def test_streamed_file_is_valid_json(manager, storage_path):
+    manager.load()
+    manager._modified = True
+    assert manager.save()
+    data = json.loads(storage_path.read_text(encoding="utf-8"))
+    assert list(data) == ["Growth", "Income"]
+    assert data["Growth"]["weights"] == {"QQQ": 60.0, "SPY": 40.0}
+
+    manager.delete("Growth")
+    manager.delete("Income")
+    assert manager.save()
+    assert json.loads(storage_path.read_text(encoding="utf-8")) == {}
+
+
+def test_numpy_weights_are_saved(manager, storage_path):
+    weights = {"GLD": np.float64(70.0), "TLT": np.int64(30)}
+    assert manager.create(Portfolio(name="Gold", tickers=["GLD", "TLT"], weights=weights))
+    manager._modified = True
+    assert manager.save()
+    reloaded = json.loads(storage_path.read_text(encoding="utf-8"))
+    assert reloaded["Gold"]["weights"] == {"GLD": 70.0, "TLT": 30}
@@ -0,0 +1,609 @@
+"""Unit tests for StrategyContext / StrategyEngine (no network access)."""
+
+import ast
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from strategy import sandbox
+from strategy.engine import StrategyContext, StrategyEngine, _ffill_bfill_2d, _ffill_bfill_2d_numpy
+from strategy.templates import STRATEGY_TEMPLATES, TEMPLATE_NAMES
+
+
+class FakeFetcher:
+    """Stand-in for DataFetcher serving a fixed price panel and counting calls."""
+
+    def __init__(self, prices: pd.DataFrame):
+        self.prices = prices
+        self.batch_calls = []
+        self.single_calls = []
+
+    def fetch_prices_batch(self, tickers, end_date=None, lookback_days=252, use_cache=True):
+        self.batch_calls.append(list(tickers))
+        return self.prices.reindex(columns=list(tickers))
+
+    def fetch_prices(self, tickers, start_date=None, end_date=None, lookback_days=252, use_cache=True):
+        self.single_calls.append(tickers)
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        return self.prices[[t for t in tickers if t in self.prices.columns]]
+
+
+@pytest.fixture
+def prices() -> pd.DataFrame:
+    idx = pd.bdate_range("2024-01-02", periods=60)
+    return pd.DataFrame({
+        "AAA": 100.0 + np.arange(60),
+        "BBB": 200.0 - np.arange(60) * 0.5,
+        "^VIX": np.full(60, 18.0),
+    }, index=idx)
+
+
+@pytest.fixture
+def fetcher(prices) -> FakeFetcher:
+    return FakeFetcher(prices)
+
+
+def make_ctx(fetcher, tickers=("AAA", "BBB")) -> StrategyContext:
+    return StrategyContext(
+        tickers=list(tickers),
+        current_weights={t: 100.0 / len(tickers) for t in tickers},
+        current_date=date(2024, 3, 29),
+        data_fetcher=fetcher,
+    )
+
+
+def test_universe_prices_fetched_in_one_batch(fetcher, prices):
+    ctx = make_ctx(fetcher)
+    assert ctx.get_price("BBB").iloc[-1] == prices["BBB"].iloc[-1]
+    ctx.ma("AAA", 5)
+    df = ctx.get_prices()
+    assert list(df.columns) == ["AAA", "BBB"]
+    assert fetcher.batch_calls == [["AAA", "BBB"]]
+    assert fetcher.single_calls == []
+
+
+def test_out_of_universe_ticker_fetched_separately(fetcher):
+    ctx = make_ctx(fetcher)
+    assert ctx.current_vix() == 18.0
+    assert fetcher.batch_calls == []
+    assert fetcher.single_calls == ["^VIX"]
+
+
+def test_universe_price_table_built_once(fetcher, monkeypatch):
+    ctx = make_ctx(fetcher)
+    first = ctx.prices
+    built = []
+    monkeypatch.setattr(StrategyContext, "_build_prices", lambda *a, **k: built.append(a))
+    assert ctx.price.equals(first)
+    assert list(ctx.get_prices(["BBB"], lookback=10).columns) == ["BBB"]
+    assert len(ctx.get_prices(lookback=10)) == 10
+    assert built == []
+
+
+def test_context_has_no_instance_dict(fetcher):
+    ctx = make_ctx(fetcher)
+    assert not hasattr(ctx, "__dict__")
+    with pytest.raises(AttributeError):
+        ctx.extra = 1
+
+
+def test_prices_copy_does_not_leak_new_columns(fetcher):
+    ctx = make_ctx(fetcher)
+    df = ctx.prices
+    df["extra"] = 1.0
+    assert "extra" not in ctx.prices.columns
+
+
+@pytest.mark.parametrize("fill", [_ffill_bfill_2d, _ffill_bfill_2d_numpy])
+def test_ffill_bfill_matches_pandas(fill):
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        arr = rng.normal(size=(rng.integers(1, 30), rng.integers(1, 6)))
+        arr[rng.random(arr.shape) < 0.4] = np.nan
+        expected = pd.DataFrame(arr).ffill().bfill().to_numpy()
+        np.testing.assert_array_equal(fill(arr.copy()), expected)
+
+
+@pytest.mark.parametrize("period", [1, 3, 10, 200])
+@pytest.mark.parametrize("ticker", ["BBB", "^VIX"])
+def test_ma_tail_matches_rolling_sma(fetcher, prices, ticker, period):
+    ctx = make_ctx(fetcher)
+    expected = prices[ticker].rolling(period, min_periods=1).mean().iloc[-2:].tolist()
+    assert ctx._ma_tail(ticker, period) == pytest.approx(tuple(expected))
+
+
+def test_rolling_ma_computed_once_per_period(fetcher, prices, monkeypatch):
+    ctx = make_ctx(fetcher)
+    calls = []
+    sma = ctx._indicators.sma
+    monkeypatch.setattr(ctx, "_indicators", type("I", (), {
+        "sma": staticmethod(lambda data, period: calls.append(period) or sma(data, period)),
+    })())
+    for ticker in ("AAA", "BBB"):
+        ctx.ma_cross_up(ticker, 5, 20)
+        ctx.price_above_ma(ticker, 20)
+        pd.testing.assert_series_equal(
+            ctx.ma(ticker, 5), prices[ticker].rolling(5, min_periods=1).mean(), check_freq=False
+        )
+    assert sorted(calls) == [5, 20]
+    ma = ctx.ma("AAA", 5)
+    ma.iloc[-1] = -1.0
+    assert ctx.ma_all(5)["AAA"].iloc[-1] > 0
+
+
+def test_ma_cross_detection():
+    idx = pd.bdate_range("2024-01-02", periods=30)
+    # 持续下跌后最后一根大阳线：短均线上穿长均线
+    close = np.r_[np.linspace(120, 100, 29), 140.0]
+    ctx = make_ctx(FakeFetcher(pd.DataFrame({"AAA": close, "BBB": close}, index=idx)))
+    assert ctx.ma_cross_up("AAA", 3, 10)
+    assert not ctx.ma_cross_down("AAA", 3, 10)
+    assert ctx.ma_cross_down("BBB", 10, 3)
+
+
+def test_ma_cross_all_matches_per_ticker():
+    idx = pd.bdate_range("2024-01-02", periods=30)
+    up = np.r_[np.linspace(120, 100, 29), 140.0]
+    down = np.r_[np.linspace(100, 120, 29), 80.0]
+    flat = pd.Series(100.0 + np.arange(20.0), index=idx[-20:])  # 序列较短：逐个计算
+    prices = pd.DataFrame({"AAA": up, "BBB": down, "CCC": flat}, index=idx)
+    ctx = make_ctx(FakeFetcher(prices), tickers=("AAA", "BBB", "CCC", "ZZZ"))
+    cross = ctx.ma_cross_all(3, 10)
+    assert cross.to_dict() == {"AAA": 1, "BBB": -1, "CCC": 0, "ZZZ": 0}
+    for t in ctx.tickers:
+        assert (cross[t] > 0) == ctx.ma_cross_up(t, 3, 10)
+        assert (cross[t] < 0) == ctx.ma_cross_down(t, 3, 10)
+
+
+@pytest.fixture
+def engine(tmp_path) -> StrategyEngine:
+    eng = StrategyEngine()
+    eng.storage_path = tmp_path / "strategies.json"
+    eng.load()
+    return eng
+
+
+def test_strategies_round_trip_with_atomic_save(engine, tmp_path):
+    assert engine.save_strategy("动量", "ctx.log('hi')", description="测试")
+    assert not (tmp_path / "strategies.json.tmp").exists()
+
+    reloaded = StrategyEngine()
+    reloaded.storage_path = engine.storage_path
+    reloaded.load()
+    assert reloaded.get("动量")["code"] == "ctx.log('hi')"
+    assert reloaded.get("动量")["description"] == "测试"
+
+
+def test_execute_compiles_each_source_once(engine, fetcher, monkeypatch):
+    monkeypatch.setattr(sandbox.SafeExecutor, "_CODE_CACHE", type(sandbox.SafeExecutor._CODE_CACHE)())
+    compiled = []
+    real_compile = sandbox.compile_restricted
+    monkeypatch.setattr(sandbox, "compile_restricted", lambda src, **kw: compiled.append(ast.unparse(src)) or real_compile(src, **kw))
+    monkeypatch.setattr("strategy.engine.get_data_fetcher", lambda: fetcher)
+
+    code = "ctx.set_target_weights({'AAA': 70, 'BBB': 30})"
+    for _ in range(3):
+        result = engine.execute(code, ["AAA", "BBB"], {"AAA": 50, "BBB": 50}, date(2024, 3, 29))
+        assert result.success, result.message
+        assert result.target_weights == pytest.approx({"AAA": 70, "BBB": 30})
+    assert compiled == [code]
+
+
+def test_templates_precompiled_once_per_process(fetcher, monkeypatch):
+    monkeypatch.setattr(sandbox.SafeExecutor, "_CODE_CACHE", type(sandbox.SafeExecutor._CODE_CACHE)())
+    monkeypatch.setattr(StrategyEngine, "_templates_warmed", False)
+    eng = StrategyEngine()
+    keys = {sandbox.SafeExecutor._source_key(code) for code in STRATEGY_TEMPLATES.values()}
+    assert keys <= set(sandbox.SafeExecutor._CODE_CACHE)
+
+    def no_compile(src, **kw):
+        raise AssertionError("template recompiled")
+
+    monkeypatch.setattr(sandbox, "compile_restricted", no_compile)
+    monkeypatch.setattr("strategy.engine.get_data_fetcher", lambda: fetcher)
+    StrategyEngine()  # 已预编译，不会再次编译
+    result = eng.execute(STRATEGY_TEMPLATES["动量策略"], ["AAA", "BBB"], {"AAA": 50, "BBB": 50}, date(2024, 3, 29))
+    assert result.success, result.message
+
+
+def test_templates_are_read_only():
+    assert TEMPLATE_NAMES == tuple(STRATEGY_TEMPLATES)
+    with pytest.raises(TypeError):
+        STRATEGY_TEMPLATES["新策略"] = "def strategy(): pass"
+
+
+def test_execute_reports_syntax_errors(engine):
+    result = engine.execute("def broken(:\n    pass", ["AAA"], {"AAA": 100}, date(2024, 3, 29))
+    assert not result.success
+    assert "Syntax error" in result.message
+
+
+def test_set_target_weights_filters_and_normalizes(fetcher):
+    ctx = make_ctx(fetcher)
+    ctx.set_target_weights({"AAA": 30, "BBB": -5, "ZZZ": 10, "YYY": 1})
+    assert ctx.get_target_weights() == {"AAA": 100.0, "BBB": 0.0}
+    assert "⚠️ 忽略未知标的: ZZZ, YYY" in ctx.signals
+
+    ctx.set_target_weights({"AAA": 30, "BBB": 20}, normalize=False)
+    assert ctx.get_target_weights() == {"AAA": 30.0, "BBB": 20.0}
+
+    ctx.set_target_weights({"AAA": 0, "BBB": 0})
+    assert ctx.get_target_weights() == ctx.get_current_weights()
+
+
+def test_batch_indicators_match_per_ticker(fetcher):
+    ctx = make_ctx(fetcher)
+    for batch, single in ((ctx.ma_all(5), ctx.ma), (ctx.ema_all(5), ctx.ema), (ctx.rsi_all(5), ctx.rsi)):
+        assert list(batch.columns) == ["AAA", "BBB"]
+        for t in ("AAA", "BBB"):
+            pd.testing.assert_series_equal(batch[t], single(t, 5), check_names=False, check_freq=False)
+
+
+def test_execute_batch_preserves_date_order(engine, fetcher, monkeypatch):
+    monkeypatch.setattr("strategy.engine.get_data_fetcher", lambda: fetcher)
+    code = (
+        "w = ctx.get_current_weights()\n"
+        "ctx.set_target_weights({'AAA': w['AAA'] + 10, 'BBB': w['BBB']}, normalize=False)\n"
+    )
+    dates = [date(2024, 3, d) for d in (25, 26, 27, 28)]
+    weights = [{"AAA": float(i), "BBB": 50.0} for i in range(4)]
+    results = engine.execute_batch(code, ["AAA", "BBB"], dates, weights, max_workers=4)
+    assert [r.target_weights["AAA"] for r in results] == [10.0, 11.0, 12.0, 13.0]
+    assert all(r.success for r in results)
+
+    failed = engine.execute_batch("def (:", ["AAA"], dates[:2], [{"AAA": 100}] * 2)
+    assert [r.success for r in failed] == [False, False]
+
+    with pytest.raises(ValueError):
+        engine.execute_batch(code, ["AAA"], dates, weights[:1])
+
+
+def test_read_only_accessors_do_not_copy(fetcher):
+    ctx = make_ctx(fetcher)
+    assert ctx.tickers is ctx.tickers
+    assert ctx.tickers == ("AAA", "BBB")
+    assert ctx.current_weights is ctx.current_weights
+    assert ctx.current_weights["AAA"] == 50.0
+    with pytest.raises(TypeError):
+        ctx.current_weights["AAA"] = 10.0
+    # get_current_weights 仍返回可修改的副本
+    weights = ctx.get_current_weights()
+    weights["AAA"] = 10.0
+    assert ctx.current_weights["AAA"] == 50.0
+
+
+def test_normalize_weights_bounded(fetcher):
+    ctx = make_ctx(fetcher)
+    result = ctx.normalize_weights_bounded({"A": 80, "B": 10, "C": 10}, {"A": (0, 50), "B": (30, 100)})
+    assert result == pytest.approx({"A": 50.0, "B": 30.0, "C": 20.0})
+    # 上限总和不足目标时返回裁剪后的最接近解
+    capped = ctx.normalize_weights_bounded({"A": 1, "B": 1}, {"A": (0, 20), "B": (0, 20)})
+    assert capped == pytest.approx({"A": 20.0, "B": 20.0})
+
+
+def test_set_target_weights_respects_bounds(fetcher):
+    ctx = make_ctx(fetcher)
+    ctx.set_target_weights({"AAA": 90, "BBB": 10}, bounds={"AAA": (0, 60)})
+    assert ctx.get_target_weights() == pytest.approx({"AAA": 60.0, "BBB": 40.0})
+
+    ctx.set_target_weights({"AAA": 90, "BBB": 10}, normalize=False, bounds={"AAA": (0, 60)})
+    assert ctx.get_target_weights() == pytest.approx({"AAA": 60.0, "BBB": 10.0})
+
+
+def test_strategies_decoded_lazily(engine, monkeypatch):
+    engine.save_strategy("A", "x = '{\"}'")
+    engine.save_strategy("B", "ctx.log('b')")
+    engine.save_strategy("C", "ctx.log('c')")
+    engine.save()  # 压缩日志，使三条策略都只存在于主文件中
+
+    reloaded = StrategyEngine()
+    reloaded.storage_path = engine.storage_path
+    reloaded.load()
+    assert reloaded._strategies == {}
+    assert reloaded.get("A")["code"] == "x = '{\"}'"
+    assert list(reloaded._strategies) == ["A"]
+
+    assert reloaded.delete_strategy("B")
+    assert list(reloaded.get_all()) == ["A", "C"]
+    assert reloaded.get("missing") is None
+
+
+def test_malformed_strategies_file_loads_empty(engine):
+    engine.storage_path.write_text("[1, 2", encoding="utf-8")
+    engine.load()
+    assert engine.get_all() == {}
+
+
+@pytest.mark.parametrize("raw", [
+    '{"A": {"code": "pass"}, "version": 2, "B": {"code": "x = 1"}}',
+    '{"A": {"code": "pass"}, "B": {"code": "x = 1"}, "enabled": true}',
+])
+def test_scalar_top_level_entries_survive_save(engine, raw):
+    engine.storage_path.write_text(raw, encoding="utf-8")
+    engine.load()
+    assert engine.get("B")["code"] == "x = 1"
+    engine.save()
+    assert json.loads(engine.storage_path.read_text(encoding="utf-8")) == json.loads(raw)
+
+
+def test_price_table_aligns_series_with_different_calendars(prices):
+    # BBB 缺少前 5 个交易日：走索引对齐路径，并用后向填充补齐
+    ragged = prices.copy()
+    ragged.loc[ragged.index[:5], "BBB"] = np.nan
+    ctx = make_ctx(FakeFetcher(ragged))
+    df = ctx.get_prices()
+    assert df.index.equals(prices.index)
+    assert (df["BBB"].iloc[:5] == prices["BBB"].iloc[5]).all()
+    pd.testing.assert_series_equal(df["AAA"], prices["AAA"], check_freq=False)
+
+
+@pytest.fixture
+def mixed_fetcher(prices) -> FakeFetcher:
+    """BBB trades on a different calendar: every 4th day of the union is missing."""
+    mixed = prices.copy()
+    mixed.loc[mixed.index[::4], "BBB"] = np.nan
+    mixed["BBB"] *= 1.0 + np.sin(np.arange(len(mixed))) * 0.02
+    return FakeFetcher(mixed)
+
+
+def test_subset_prices_use_own_calendar(mixed_fetcher):
+    ctx = make_ctx(mixed_fetcher)
+    own = ctx.get_price("BBB")
+    sub = ctx.get_prices(["BBB"])
+    assert len(sub) == len(own) == 45
+    pd.testing.assert_series_equal(sub["BBB"], own, check_names=False, check_freq=False)
+    assert len(ctx.get_prices(["BBB"], lookback=30)) == 30
+    # 全日历标的仍直接切片对齐表
+    assert len(ctx.get_prices(["AAA"])) == len(ctx.get_prices()) == 60
+
+
+def test_batch_indicators_use_own_calendar(mixed_fetcher):
+    ctx = make_ctx(mixed_fetcher)
+    own = ctx.get_price("BBB").index
+    for batch, single, period in (
+        (ctx.ma_all, ctx.ma, 20), (ctx.ema_all, ctx.ema, 20),
+        (ctx.rsi_all, ctx.rsi, 14), (ctx.momentum_all, ctx.momentum, 20),
+    ):
+        table = batch(period)
+        assert table.index.equals(ctx.get_prices().index)
+        for t in ("AAA", "BBB"):
+            expected = single(t, period)
+            pd.testing.assert_series_equal(table[t].loc[expected.index], expected, check_names=False, check_freq=False)
+        # 休市日沿用上一个交易日的值
+        assert table["BBB"].iloc[-1] == single("BBB", period).loc[own[-1]]
+    for period in (5, 20, 200):
+        above = ctx.price_above_ma_all(period)
+        for t in ("AAA", "BBB"):
+            assert bool(above[t]) == ctx.price_above_ma(t, period)
+
+
+def test_volatility_all_uses_own_calendar(mixed_fetcher):
+    # 填充的休市日会引入零收益率，压低波动率
+    ctx = make_ctx(mixed_fetcher)
+    vol = ctx.volatility_all(20)
+    for t in ("AAA", "BBB"):
+        expected = ctx.volatility(t, 20)
+        pd.testing.assert_series_equal(vol[t].loc[expected.index], expected, check_names=False, check_freq=False)
+        assert vol[t].iloc[-1] == pytest.approx(ctx.volatility_last(t, 20))
+
+
+def test_get_returns_matches_pct_change(fetcher, prices):
+    ctx = make_ctx(fetcher)
+    expected = prices["AAA"].pct_change().fillna(0)
+    pd.testing.assert_series_equal(ctx.get_returns("AAA"), expected, check_names=False, check_freq=False)
+    assert len(ctx.get_returns("AAA", lookback=10)) == 10
+
+
+def test_current_price_reads_scalar_cache(fetcher, prices):
+    ctx = make_ctx(fetcher)
+    assert ctx.current_price("AAA") == prices["AAA"].iloc[-1]
+    assert isinstance(ctx.current_price("AAA"), float)
+    assert ctx.current_price("NOPE") == 0.0
+    assert ctx.current_vix() == 18.0
+    assert ctx.price_above_ma("AAA", 20)
+
+
+def test_strategy_mutations_are_journaled(engine):
+    engine.save_strategy("Base", "x = 1\n" * 500)
+    engine.save()
+    base_bytes = engine.storage_path.read_bytes()
+
+    engine.save_strategy("New", "ctx.log('n')")
+    assert engine.delete_strategy("Base")
+    assert engine.storage_path.read_bytes() == base_bytes
+    journal = engine.storage_path.with_suffix(".journal.jsonl")
+    assert len(journal.read_bytes().splitlines()) == 2
+
+    # 末尾半行（写入中断）被忽略
+    with open(journal, "ab") as f:
+        f.write(b'{"op": "delete", "na')
+    reloaded = StrategyEngine()
+    reloaded.storage_path = engine.storage_path
+    reloaded.load()
+    assert list(reloaded.get_all()) == ["New"]
+
+    # 半行被截掉，之后保存的策略写在新的一行上
+    assert reloaded.save_strategy("After", "ctx.log('a')")
+    assert journal.exists()
+    again = StrategyEngine()
+    again.storage_path = engine.storage_path
+    again.load()
+    assert list(again.get_all()) == ["New", "After"]
+
+
+def test_strategy_journal_compacts_when_large(engine):
+    engine.save_strategy("A", "ctx.log('a')")
+    engine.save()
+    engine.save_strategy("Big", "x = 1\n" * 500)
+    journal = engine.storage_path.with_suffix(".journal.jsonl")
+    assert not journal.exists()
+    assert "Big" in json.loads(engine.storage_path.read_text(encoding="utf-8"))
+
+
+def test_scalar_indicators_match_series(fetcher):
+    ctx = make_ctx(fetcher)
+    for ticker in ("AAA", "BBB"):
+        assert ctx.momentum_last(ticker, 20) == pytest.approx(ctx.momentum(ticker, 20).iloc[-1])
+        for annualize in (True, False):
+            assert ctx.volatility_last(ticker, 20, annualize) == pytest.approx(
+                ctx.volatility(ticker, 20, annualize).iloc[-1]
+            )
+        assert ctx.volatility_last(ticker, 500) == pytest.approx(ctx.volatility(ticker, 500).iloc[-1])
+        assert ctx.drawdown_last(ticker) == pytest.approx(ctx.drawdown(ticker)["drawdown_pct"].iloc[-1])
+        assert ctx.rsi_last(ticker, 14) == pytest.approx(ctx.rsi(ticker, 14).iloc[-1])
+    assert ctx.momentum_last("AAA", 60) is None
+    assert ctx.drawdown_last("ZZZ") is None
+    assert ctx.rsi_last("ZZZ") is None
+
+
+@pytest.mark.parametrize("verbose", [True, False])
+@pytest.mark.parametrize("name", list(STRATEGY_TEMPLATES))
+def test_templates_execute(engine, fetcher, monkeypatch, name, verbose):
+    monkeypatch.setattr("strategy.engine.get_data_fetcher", lambda: fetcher)
+    result = engine.execute(
+        STRATEGY_TEMPLATES[name], ["AAA", "BBB"], {"AAA": 50, "BBB": 50}, date(2024, 3, 29), verbose=verbose,
+    )
+    assert result.success, result.message
+    assert sum(result.target_weights.values()) == pytest.approx(100)
+    if not verbose:
+        # 只剩引擎自身的提示（如归一化），没有逐标的日志
+        assert not any("AAA" in s or "BBB" in s for s in result.signals)
+
+
+def test_batch_signals_match_per_ticker(fetcher, prices):
+    ctx = make_ctx(fetcher)
+    mom = ctx.momentum_all(20).iloc[-1]
+    for period in (5, 200):
+        above = ctx.price_above_ma_all(period)
+        assert list(above.index) == ["AAA", "BBB"]
+        for t in ("AAA", "BBB"):
+            assert bool(above[t]) == ctx.price_above_ma(t, period)
+    vol = ctx.volatility_all(20).iloc[-1]
+    for t in ("AAA", "BBB"):
+        assert mom[t] == pytest.approx(ctx.momentum_last(t, 20))
+        assert vol[t] == pytest.approx(ctx.volatility_last(t, 20))
+
+    matrix = ctx.get_prices_matrix()
+    np.testing.assert_array_equal(matrix, prices[["AAA", "BBB"]].to_numpy())
+    with pytest.raises(ValueError):
+        matrix[0, 0] = 0.0
+
+
+def test_weight_vectors_follow_ticker_order(fetcher):
+    ctx = make_ctx(fetcher)
+    np.testing.assert_array_equal(ctx.weights_vec({"BBB": 30.0, "ZZZ": 5.0}), [0.0, 30.0])
+    np.testing.assert_array_equal(ctx.current_weights_vec(), [50.0, 50.0])
+
+    ctx.set_target_weights_vec(np.array([3.0, 1.0]))
+    assert ctx.get_target_weights() == {"AAA": 75.0, "BBB": 25.0}
+    with pytest.raises(ValueError):
+        ctx.set_target_weights_vec(np.array([1.0, 2.0, 3.0]))
+
+
+def test_rebalance_linear_only_sets_targets_past_threshold(fetcher):
+    ctx = make_ctx(fetcher)
+    current = ctx.current_weights_vec()
+    needs = ctx.rebalance_linear(current, np.array([52.0, 48.0]), 5)
+    assert not needs.any()
+    assert ctx.get_target_weights() is None
+
+    needs = ctx.rebalance_linear(current, np.array([60.0, 40.0]), 5)
+    assert needs.tolist() == [True, True]
+    assert ctx.get_target_weights() == {"AAA": 60.0, "BBB": 40.0}
+
+
+def test_log_is_lazy_and_skipped_when_quiet(fetcher):
+    calls = []
+
+    def message():
+        calls.append(1)
+        return "lazy"
+
+    ctx = make_ctx(fetcher)
+    ctx.log("plain")
+    ctx.log(message)
+    assert ctx.signals == ("plain", "lazy")
+
+    quiet = StrategyContext(["AAA"], {"AAA": 100.0}, date(2024, 3, 29), data_fetcher=fetcher, verbose=False)
+    quiet.log("plain")
+    quiet.log(message)
+    assert not quiet.verbose
+    assert quiet.signals == ()
+    assert len(calls) == 1
+
+
+def test_log_formats_args_only_when_verbose(fetcher):
+    class Tracked:
+        def __str__(self):
+            calls.append(1)
+            return "AAA"
+
+    calls = []
+    ctx = make_ctx(fetcher)
+    ctx.log("%s RSI=%.0f", Tracked(), 31.4)
+    ctx.log("100%")  # 无参数时原样记录，不做 % 格式化
+    assert ctx.signals == ("AAA RSI=31", "100%")
+
+    quiet = StrategyContext(["AAA"], {"AAA": 100.0}, date(2024, 3, 29), data_fetcher=fetcher, verbose=False)
+    quiet.log("%s RSI=%.0f", Tracked(), 31.4)
+    assert quiet.signals == ()
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("period", [1, 5, 20, 200])
+def test_last_value_accessors_match_full_series(fetcher, prices, period):
+    ctx = make_ctx(fetcher)
+    for ticker in ("AAA", "^VIX"):
+        assert ctx.ma_last(ticker, period) == pytest.approx(
+            prices[ticker].rolling(period, min_periods=1).mean().iloc[-1]
+        )
+        if period > 1:
+            bb = ctx.bollinger(ticker, period, 2.0).iloc[-1]
+            assert ctx.bollinger_last(ticker, period, 2.0) == pytest.approx(bb.to_dict())
+    # 只取最新值时不构建整条均线矩阵
+    assert ctx._rolling_cache == {}
+    assert ctx.ma_last("ZZZ", period) is None
+    assert ctx.bollinger_last("AAA", 1) is None
+
+    above = ctx.price_above_ma_all(period)
+    ctx.ma_all(period)
+    pd.testing.assert_series_equal(ctx.price_above_ma_all(period), above)
+
+
+def test_indicators_memoized_per_context(fetcher, monkeypatch):
+    ctx = make_ctx(fetcher)
+    calls = []
+    rsi = ctx._indicators.rsi
+    monkeypatch.setattr(ctx, "_indicators", type("I", (), {
+        "rsi": staticmethod(lambda data, period: calls.append(period) or rsi(data, period)),
+    })())
+    first = ctx.rsi("AAA", 14)
+    first.iloc[-1] = -1.0
+    again = ctx.rsi("AAA", 14)
+    assert again.iloc[-1] >= 0
+    ctx.rsi_all(14)
+    ctx.rsi_all(14)
+    assert calls == [14, 14]
+    # 新的上下文（下一个交易日）重新计算
+    assert make_ctx(fetcher)._indicator_cache == {}
+
+
+def test_weights_view_sets_targets_only_on_change(fetcher):
+    ctx = make_ctx(fetcher)
+    with ctx.weights_view() as weights:
+        weights["AAA"] = weights["AAA"]
+    assert ctx.get_target_weights() is None
+
+    with pytest.raises(RuntimeError):
+        with ctx.weights_view() as weights:
+            weights["AAA"] = 90.0
+            raise RuntimeError("abort")
+    assert ctx.get_target_weights() is None
+    assert ctx.current_weights["AAA"] == 50.0
+
+    with ctx.weights_view() as weights:
+        weights["AAA"] = 150.0
+    assert ctx.get_target_weights() == pytest.approx({"AAA": 75.0, "BBB": 25.0})
@@ -0,0 +1,270 @@
+"""Unit tests for the RestrictedPython sandbox."""
+
+import ast
+import threading
+
+import pytest
+
+from strategy import sandbox
+from strategy.sandbox import ExecutionTimeout, SafeExecutor, StrategyError
+
+
+@pytest.fixture
+def compile_calls(monkeypatch):
+    monkeypatch.setattr(SafeExecutor, "_CODE_CACHE", type(SafeExecutor._CODE_CACHE)())
+    monkeypatch.setattr(SafeExecutor, "_VALIDATE_CACHE", type(SafeExecutor._VALIDATE_CACHE)())
+    calls = []
+    real_compile = sandbox.compile_restricted
+    monkeypatch.setattr(sandbox, "compile_restricted", lambda src, **kw: calls.append(ast.unparse(src)) or real_compile(src, **kw))
+    return calls
+
+
+def test_compile_code_cached_by_source(compile_calls):
+    executor = SafeExecutor()
+    first = executor.compile_code("x = 1")
+    assert SafeExecutor().compile_code("x = 1") is first
+    assert executor.validate_code("x = 1")["valid"]
+    assert executor.execute("result = 2", {}) == 2
+    assert executor.execute("result = 2", {}) == 2
+    assert compile_calls == ["x = 1", "result = 2"]
+
+
+def test_compile_cache_evicts_least_recently_used(compile_calls, monkeypatch):
+    monkeypatch.setattr(SafeExecutor, "CODE_CACHE_SIZE", 2)
+    executor = SafeExecutor()
+    for src in ("a = 1", "b = 1", "a = 1", "c = 1", "a = 1", "b = 1"):
+        executor.compile_code(src)
+    assert compile_calls == ["a = 1", "b = 1", "c = 1", "b = 1"]
+
+
+def test_compile_errors_not_cached(compile_calls):
+    executor = SafeExecutor()
+    for source in ("def broken(:", "exec('1')", "exec('1')"):
+        with pytest.raises(StrategyError):
+            executor.compile_code(source)
+    assert compile_calls == ["exec('1')", "exec('1')"]
+    assert not SafeExecutor._CODE_CACHE
+
+
+def test_execute_reuses_shared_pool():
+    executor = SafeExecutor()
+    assert executor.execute("result = 1", {}) == 1
+    pool = SafeExecutor._pool
+    assert pool is not None
+    assert SafeExecutor(timeout_seconds=5).execute("result = 2", {}) == 2
+    assert SafeExecutor._pool is pool
+
+
+def test_execute_rejects_code_objects():
+    # 普通 compile() 的结果会绕过 RestrictedPython，只接受源码
+    executor = SafeExecutor()
+    for code in (compile("result = open", "<x>", "exec"), executor.compile_code("result = 1")):
+        with pytest.raises(TypeError):
+            executor.execute(code, {})
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    """Fresh two-worker pool; releases any blocked strategies on teardown."""
+    monkeypatch.setattr(SafeExecutor, "MAX_WORKERS", 2)
+    monkeypatch.setattr(SafeExecutor, "MAX_ABANDONED_WORKERS", 4)
+    monkeypatch.setattr(SafeExecutor, "_pool", None)
+    monkeypatch.setattr(SafeExecutor, "_stuck", set())
+    monkeypatch.setattr(SafeExecutor, "_abandoned", set())
+    release = threading.Event()
+    yield release
+    release.set()
+
+
+def test_runaway_strategies_do_not_starve_the_pool(small_pool):
+    executor = SafeExecutor(timeout_seconds=0.2)
+    blocking = {"block": small_pool.wait}
+    first_pool = executor._get_pool()
+    for _ in range(2):
+        with pytest.raises(ExecutionTimeout):
+            executor.execute("result = block()", blocking)
+
+    # 两个工作线程都被占用：换新池，正常策略照常执行
+    assert executor.execute("result = 42", {}) == 42
+    assert SafeExecutor._pool is not first_pool
+    assert len(SafeExecutor._abandoned) == 2
+
+    # 占用的线程结束后释放计数
+    small_pool.set()
+    first_pool.shutdown(wait=True)
+    assert not SafeExecutor._abandoned
+
+
+def test_sandbox_fails_fast_when_workers_exhausted(small_pool):
+    executor = SafeExecutor(timeout_seconds=0.2)
+    for _ in range(4):
+        with pytest.raises(ExecutionTimeout):
+            executor.execute("result = block()", {"block": small_pool.wait})
+    with pytest.raises(StrategyError, match="workers exhausted"):
+        executor.execute("result = 42", {})
+
+
+def test_timed_out_queued_call_is_cancelled(small_pool, monkeypatch):
+    monkeypatch.setattr(SafeExecutor, "MAX_WORKERS", 1)
+    executor = SafeExecutor(timeout_seconds=0.2)
+    pool = executor._get_pool()
+    pool.submit(small_pool.wait)  # 占住唯一的工作线程（不经过 execute，不计入超时）
+    ran = []
+    with pytest.raises(ExecutionTimeout):
+        executor.execute("result = mark()", {"mark": lambda: ran.append(1)})
+    small_pool.set()
+    pool.shutdown(wait=True)
+    assert ran == []
+    assert not SafeExecutor._stuck
+
+
+def test_validate_flags_blocked_names_as_whole_identifiers():
+    result = SafeExecutor().validate_code(
+        "positions = ctx.tickers  # open later\nx = eval('1')\ny = open('f')\nz = eval('exec')\n"
+    )
+    unsafe = [w for w in result["warnings"] if "unsafe name" in w]
+    assert unsafe == [
+        "Code contains potentially unsafe name: 'eval'",
+        "Code contains potentially unsafe name: 'open'",
+    ]
+
+
+@pytest.mark.parametrize("source, flagged", [
+    ("import math", True),
+    ("def strategy():\n    from\tmath import sqrt", True),
+    ("ctx.log('import the data')  # import nothing", False),
+    ("x = 1", False),
+])
+def test_validate_detects_import_statements(source, flagged):
+    warnings = SafeExecutor().validate_code(source)["warnings"]
+    assert any("Import statements" in w for w in warnings) is flagged
+
+
+def test_builtins_shared_and_read_only():
+    with pytest.raises(TypeError):
+        SafeExecutor.ALLOWED_BUILTINS["open"] = open
+    executor = SafeExecutor()
+    assert executor._create_safe_globals({})["__builtins__"] is SafeExecutor._BUILTINS
+    assert executor.execute("result = sorted([3, 1, 2])", {}) == [1, 2, 3]
+    with pytest.raises(StrategyError):
+        executor.execute("__builtins__['x'] = 1", {})
+
+
+def test_safe_globals_filter_blocked_context_keys():
+    executor = SafeExecutor()
+    first = executor._create_safe_globals({"ctx": 1, "np": 2})
+    assert first["ctx"] == 1 and first["_getattr_"] is sandbox._safe_getattr
+    second = executor._create_safe_globals({"ctx": 3, "np": 4})
+    assert second["ctx"] == 3 and second is not first
+    blocked = executor._create_safe_globals({"ctx": 5, "open": open, "eval": eval})
+    assert blocked["ctx"] == 5
+    assert "open" not in blocked and "eval" not in blocked
+    again = executor._create_safe_globals({"ctx": 6, "open": open, "eval": eval})
+    assert again["ctx"] == 6 and "open" not in again
+
+
+@pytest.mark.parametrize("source, direct", [
+    ('"""doc"""\ndef helper():\n    return 1\n\ndef strategy():\n    return [len(ctx), 2]\n', True),
+    ("def strategy(x=1):\n    return [len(ctx), x]\n", False),
+    ("n = 3\ndef strategy():\n    return [len(ctx), 3]\n", False),
+    ("result = [len(ctx)]", False),
+])
+def test_function_only_modules_skip_module_exec(source, direct, monkeypatch):
+    executor = SafeExecutor()
+    code, functions = executor._compile_entry(source)
+    assert (functions is not None) is direct
+    fast = executor.execute(source, {"ctx": "abc"})
+
+    # 关闭快速路径（重新编译且不提取顶层函数），走模块级 exec
+    monkeypatch.setattr(SafeExecutor, "_CODE_CACHE", type(SafeExecutor._CODE_CACHE)())
+    monkeypatch.setattr(sandbox, "_top_level_functions", lambda names, code: None)
+    slow = executor.execute(source, {"ctx": "abc"})
+    assert fast == slow and fast[0] == 3
+
+
+@pytest.mark.parametrize("name, message", [
+    ("_hidden", "private attribute"),
+    ("__class__", "private attribute"),
+    ("gi_frame", "Access to attribute 'gi_frame'"),
+])
+def test_safe_getattr_blocks_private_and_dangerous(name, message):
+    with pytest.raises(AttributeError, match=message):
+        sandbox._safe_getattr(object(), name)
+    assert sandbox._safe_getattr("abc", "upper")() == "ABC"
+
+
+def test_iter_unpack_sequence_paths():
+    unpack = sandbox._safe_iter_unpack_sequence
+    items = [("a", 1), ["b", 2], "cd", iter((3, 4))]
+    assert [tuple(x) for x in unpack(items, {"min_len": 2}, iter)] == [("a", 1), ("b", 2), ("c", "d"), (3, 4)]
+    with pytest.raises(ValueError):
+        list(unpack([(1, 2, 3)], 2, iter))
+    with pytest.raises(TypeError):
+        list(unpack([5], 2, iter))
+    assert SafeExecutor().execute(
+        "result = [k + str(v) for k, v in {'x': 1, 'y': 2}.items()]", {}
+    ) == ["x1", "y2"]
+
+
+def test_trusted_sources_run_inline_without_timeout(monkeypatch):
+    monkeypatch.setattr(SafeExecutor, "_TRUSTED_HASHES", set())
+    probe = {"ctx": lambda: threading.current_thread().name}
+    source = "def strategy():\n    return ctx()"
+    inline = SafeExecutor(timeout_seconds=0)
+    caller = threading.current_thread().name
+
+    assert SafeExecutor().execute(source, probe) != caller
+
+    inline.warmup(source)
+    assert inline.execute(source, probe) == caller
+    assert SafeExecutor().execute(source, probe) != caller
+
+
+def test_execution_errors_keep_cause_and_strategy_line():
+    source = "def strategy():\n    x = 1\n    return {}['missing']\n"
+    with pytest.raises(StrategyError) as info:
+        SafeExecutor().execute(source, {})
+    assert str(info.value) == "Strategy execution error: KeyError: 'missing' (line 3)"
+    assert isinstance(info.value.__cause__, KeyError)
+
+
+def test_function_only_module_dispatch():
+    class Ctx:
+        def get_target_weights(self):
+            return {"AAA": 100.0}
+
+    executor = SafeExecutor()
+    source = "def helper():\n    return 1\n\ndef strategy():\n    return 'entry'\n"
+    assert executor.execute(source, {"ctx": Ctx()}) == "entry"
+    assert executor.execute(source, {"ctx": Ctx()}, entry_function="main") == {"AAA": 100.0}
+    assert executor.execute(source, {}, entry_function="main") is None
+
+
+def test_safe_globals_share_prebuilt_helpers():
+    a = SafeExecutor()._create_safe_globals({"ctx": 1})
+    b = SafeExecutor()._create_safe_globals({"ctx": 2})
+    for name in ("_write_", "_print_", "_getattr_", "__builtins__"):
+        assert a[name] is b[name]
+
+
+def test_fast_getattr_uses_fixed_message():
+    source = "def strategy():\n    return ctx.func_globals\n"
+    with pytest.raises(StrategyError, match="attribute 'func_globals' is not allowed"):
+        SafeExecutor().execute(source, {"ctx": 1})
+    with pytest.raises(StrategyError, match=sandbox._ACCESS_DENIED):
+        SafeExecutor(verbose=False).execute(source, {"ctx": 1})
+    assert SafeExecutor(verbose=False).execute("result = 'a'.upper()", {}) == "A"
+
+
+def test_validate_code_memoized_and_warms_compile_cache(compile_calls):
+    executor = SafeExecutor()
+    source = "x = eval('1')"
+    first = executor.validate_code(source)
+    first["warnings"].append("mutated")
+    second = SafeExecutor().validate_code(source)
+    assert second["warnings"] == ["Code contains potentially unsafe name: 'eval'"]
+    assert not second["valid"]
+
+    assert executor.validate_code("result = 3")["valid"]
+    assert executor.execute("result = 3", {}) == 3
+    assert compile_calls == ["x = eval('1')", "result = 3"]
@@ -1,27 +1,33 @@
 """Reusable UI components."""
 
-from .code_editor import render_code_editor
-from .charts import (
-    render_equity_curve,
-    render_drawdown_chart,
-    render_monthly_returns_heatmap,
-    render_correlation_matrix
-)
-from .data_coverage import (
-    render_data_coverage_banner,
-    render_data_coverage_summary,
-    render_inline_coverage_indicator,
-    render_pre_backtest_validation,
-)
+import importlib
 
-__all__ = [
-    'render_code_editor',
-    'render_equity_curve',
-    'render_drawdown_chart',
-    'render_monthly_returns_heatmap',
-    'render_correlation_matrix',
-    'render_data_coverage_banner',
-    'render_data_coverage_summary',
-    'render_inline_coverage_indicator',
-    'render_pre_backtest_validation',
-]
+# 组件按需加载（PEP 562）：页面导入某个子模块（如 code_editor）时，
+# 不会连带导入 charts / data_coverage 及其 pandas、plotly 依赖
+_LAZY = {
+    'render_code_editor': '.code_editor',
+    'render_equity_curve': '.charts',
+    'render_drawdown_chart': '.charts',
+    'render_monthly_returns_heatmap': '.charts',
+    'render_correlation_matrix': '.charts',
+    'render_data_coverage_banner': '.data_coverage',
+    'render_data_coverage_summary': '.data_coverage',
+    'render_inline_coverage_indicator': '.data_coverage',
+    'render_pre_backtest_validation': '.data_coverage',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value  # 之后直接命中模块属性，不再经过 __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -5,22 +5,71 @@ Provides reusable chart functions for backtest visualization.
 
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from typing import List, Dict, Optional, Any
+from typing import TYPE_CHECKING, List, Dict, Optional, Any
 import streamlit as st
 
+# plotly 在各 render_* 函数内按需导入：导入本模块（或只用表格组件）的页面不必加载 plotly
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
 # pandas >= 2.2 uses 'ME'/'YE', older versions use 'M'/'Y'
 _MONTH_FREQ = 'ME' if pd.__version__ >= '2.2' else 'M'
 _YEAR_FREQ = 'YE' if pd.__version__ >= '2.2' else 'Y'
 
+# 超过 _MAX_PLOT_POINTS 的曲线先用 LTTB 降采样到 _PLOT_POINTS 再交给 Plotly
+# （数据按点序列化到浏览器，长回测的传输和渲染成本随点数线性增长）
+_MAX_PLOT_POINTS = 4000
+_PLOT_POINTS = 2000
+
+
+def _lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling of an evenly spaced series.
+    
+    Args:
+        y: Values (no NaN)
+        n_out: Number of points to keep (first and last are always kept)
+        
+    Returns:
+        Sorted positions of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    # 中间 n_out-2 个桶，每个桶保留与前一个选中点、下一桶均值构成最大三角形的点
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = (end + next_end - 1) / 2.0
+        avg_y = y[end:next_end].mean()
+        xs = np.arange(start, end)
+        area = np.abs((a - avg_x) * (y[start:end] - y[a]) - (a - xs) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def _plot_series(series: pd.Series) -> pd.Series:
+    """Series as drawn: LTTB-downsampled when longer than _MAX_PLOT_POINTS."""
+    if len(series) <= _MAX_PLOT_POINTS:
+        return series
+    y = series.to_numpy(dtype=np.float64)
+    if np.isnan(y).any():
+        return series
+    return series.iloc[_lttb_indices(y, _PLOT_POINTS)]
+
 
 def render_equity_curve(
     portfolio_values: pd.Series,
     benchmark_values: Optional[Dict[str, pd.Series]] = None,
     title: str = "Portfolio Value",
     height: int = 500,
-) -> go.Figure:
+) -> "go.Figure":
     """
     Render equity curve chart.
     
@@ -31,14 +80,35 @@ def render_equity_curve(
         height: Chart height
         
     Returns:
-        Plotly figure
+        Plotly figure (shared by the cache; do not modify)
     """
+    fig = _equity_figure(portfolio_values, benchmark_values, title, height)
+    st.plotly_chart(fig, width="stretch")
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _equity_figure(
+    portfolio_values: pd.Series,
+    benchmark_values: Optional[Dict[str, pd.Series]],
+    title: str,
+    height: int,
+) -> "go.Figure":
+    """
+    Build the equity curve figure, cached on the series contents.
+    
+    Reruns triggered by unrelated widgets reuse the same Figure instead of
+    rebuilding its traces; st.plotly_chart only serializes it.
+    """
+    import plotly.graph_objects as go
+    
     fig = go.Figure()
     
     # Main portfolio line
+    plotted = _plot_series(portfolio_values)
     fig.add_trace(go.Scatter(
-        x=portfolio_values.index,
-        y=portfolio_values.values,
+        x=plotted.index,
+        y=plotted.values,
         name="Portfolio",
         line=dict(width=2.5, color='#2962FF'),
         hovertemplate='%{x}<br>Value: $%{y:,.2f}<extra></extra>'
@@ -48,6 +118,7 @@ def render_equity_curve(
     if benchmark_values:
         colors = ['#FF6D00', '#00C853', '#AA00FF', '#FFD600', '#D50000']
         for i, (name, values) in enumerate(benchmark_values.items()):
+            values = _plot_series(values)
             fig.add_trace(go.Scatter(
                 x=values.index,
                 y=values.values,
@@ -72,8 +143,6 @@ def render_equity_curve(
         ),
         margin=dict(l=60, r=30, t=60, b=50),
     )
-    
-    st.plotly_chart(fig, width="stretch")
     return fig
 
 
@@ -82,7 +151,7 @@ def render_drawdown_chart(
     benchmark_drawdowns: Optional[Dict[str, pd.Series]] = None,
     title: str = "Drawdown",
     height: int = 400,
-) -> go.Figure:
+) -> "go.Figure":
     """
     Render drawdown chart.
     
@@ -93,14 +162,31 @@ def render_drawdown_chart(
         height: Chart height
         
     Returns:
-        Plotly figure
+        Plotly figure (shared by the cache; do not modify)
     """
+    fig = _drawdown_figure(drawdown_series, benchmark_drawdowns, title, height)
+    st.plotly_chart(fig, width="stretch")
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _drawdown_figure(
+    drawdown_series: pd.Series,
+    benchmark_drawdowns: Optional[Dict[str, pd.Series]],
+    title: str,
+    height: int,
+) -> "go.Figure":
+    """Build the drawdown figure, cached on the series contents."""
+    import plotly.graph_objects as go
+    
     fig = go.Figure()
     
     # Main drawdown (filled area)
+    # 回撤为百分比，float32 精度足够，序列化数据量减半
+    plotted = _plot_series(drawdown_series)
     fig.add_trace(go.Scatter(
-        x=drawdown_series.index,
-        y=drawdown_series.values,
+        x=plotted.index,
+        y=plotted.to_numpy(dtype=np.float32),
         name="Portfolio",
         fill='tozeroy',
         line=dict(width=1.5, color='#2962FF'),
@@ -112,14 +198,19 @@ def render_drawdown_chart(
     if benchmark_drawdowns:
         colors = ['#FF6D00', '#00C853', '#AA00FF']
         for i, (name, dd) in enumerate(benchmark_drawdowns.items()):
+            dd = _plot_series(dd)
             fig.add_trace(go.Scatter(
                 x=dd.index,
-                y=dd.values,
+                y=dd.to_numpy(dtype=np.float32),
                 name=name,
                 line=dict(width=1, color=colors[i % len(colors)]),
                 hovertemplate='%{x}<br>' + name + ': %{y:.2f}%<extra></extra>'
             ))
     
+    # y 轴下限：直接在 numpy 数组上取最小值（忽略 NaN；全为 NaN 时与 Series.min() 一致）
+    vals = drawdown_series.to_numpy(dtype=np.float64, copy=False)
+    lo = float(np.nanmin(vals)) if np.isfinite(vals).any() else np.nan
+    
     fig.update_layout(
         title=title,
         xaxis_title="Date",
@@ -129,20 +220,78 @@ def render_drawdown_chart(
         hovermode="x unified",
         yaxis=dict(
             ticksuffix="%",
-            range=[min(drawdown_series.min() * 1.1, -5), 1]
+            range=[min(lo * 1.1, -5), 1]
         ),
         margin=dict(l=60, r=30, t=60, b=50),
     )
-    
-    st.plotly_chart(fig, width="stretch")
     return fig
 
 
+_MONTH_LABELS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec', 'YTD']
+
+
+@st.cache_data(show_spinner=False)
+def _monthly_returns_grid(values: pd.Series) -> Optional[tuple]:
+    """
+    Monthly returns (%) laid out for the heatmap.
+    
+    Cached on the series contents, so widget-driven reruns with the same
+    backtest skip the resample work.
+    
+    Returns:
+        (z, years): z is a (n_years, 13) array of Jan..Dec returns plus the
+        yearly return in the last column (NaN where missing); None if there
+        are no monthly returns
+    """
+    # Calculate monthly returns
+    monthly = (values.resample(_MONTH_FREQ).last().pct_change() * 100).dropna()
+    
+    if monthly.empty:
+        return None
+    
+    # 直接按 (年, 月) 填充二维数组，无需 pivot_table
+    years, rows = np.unique(monthly.index.year.to_numpy(), return_inverse=True)
+    z = np.full((len(years), 13), np.nan)
+    z[rows, monthly.index.month.to_numpy() - 1] = monthly.to_numpy()
+    
+    # Add yearly total (one value per year, only for years shown)
+    years = years.tolist()
+    row_of = {year: i for i, year in enumerate(years)}
+    yearly = values.resample(_YEAR_FREQ).last().pct_change() * 100
+    for year, ret in zip(yearly.index.year, yearly.to_numpy()):
+        row = row_of.get(year)
+        if row is not None:
+            z[row, 12] = ret
+    return z, years
+
+
+@st.cache_data(show_spinner=False)
+def _returns_correlation(prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Correlation of daily returns, cached on the price table contents.
+    
+    Same result as prices.pct_change().dropna().corr(), computed with one
+    np.corrcoef call on the returns array.
+    """
+    # pct_change 默认先前向填充缺失价格；首行及仍含 NaN 的行整体丢弃（同 dropna）
+    arr = prices.ffill().to_numpy(dtype=np.float64)
+    returns = arr[1:] / arr[:-1] - 1.0
+    returns = returns[~np.isnan(returns).any(axis=1)]
+    n = prices.shape[1]
+    if len(returns) < 2:
+        corr = np.full((n, n), np.nan)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):  # 常数列的相关系数为 NaN
+            corr = np.corrcoef(returns, rowvar=False)
+    return pd.DataFrame(corr, index=prices.columns, columns=prices.columns)
+
+
 def render_monthly_returns_heatmap(
     values: pd.Series,
     title: str = "Monthly Returns",
     height: int = 400,
-) -> go.Figure:
+) -> "go.Figure":
     """
     Render monthly returns heatmap.
     
@@ -154,38 +303,23 @@ def render_monthly_returns_heatmap(
     Returns:
         Plotly figure
     """
-    # Calculate monthly returns
-    monthly = values.resample(_MONTH_FREQ).last().pct_change() * 100
+    import plotly.graph_objects as go
     
-    if monthly.empty:
+    grid = _monthly_returns_grid(values)
+    
+    if grid is None:
         st.info("Not enough data for monthly analysis")
         return None
-    
-    # Create pivot table
-    monthly_df = monthly.to_frame(name='Return')
-    monthly_df['Year'] = monthly_df.index.year
-    monthly_df['Month'] = monthly_df.index.month_name().str[:3]
-    
-    month_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                   'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    
-    pivot = monthly_df.pivot_table(index='Year', columns='Month', values='Return')
-    pivot = pivot.reindex(columns=month_order)
-    
-    # Add yearly total
-    yearly = values.resample(_YEAR_FREQ).last().pct_change() * 100
-    yearly.index = yearly.index.year
-    pivot['YTD'] = yearly
+    z, years = grid
     
     # Create heatmap
     fig = go.Figure(data=go.Heatmap(
-        z=pivot.values,
-        x=pivot.columns.tolist(),
-        y=[str(y) for y in pivot.index.tolist()],
+        z=z,
+        x=_MONTH_LABELS,
+        y=[str(y) for y in years],
         colorscale='RdBu',
         zmid=0,
-        text=np.round(pivot.values, 1),
-        texttemplate="%{text}%",
+        texttemplate="%{z:.1f}%",  # 标签由浏览器按 z 格式化，不再单独传 text 数组
         textfont={"size": 10},
         showscale=True,
         colorbar=dict(title="Return %"),
@@ -194,7 +328,7 @@ def render_monthly_returns_heatmap(
     
     fig.update_layout(
         title=title,
-        height=max(height, len(pivot) * 35 + 100),
+        height=max(height, len(years) * 35 + 100),
         yaxis=dict(autorange="reversed", type='category'),
         xaxis=dict(side='top'),
         margin=dict(l=60, r=30, t=80, b=30),
@@ -208,7 +342,7 @@ def render_correlation_matrix(
     prices: pd.DataFrame,
     title: str = "Correlation Matrix",
     height: int = 500,
-) -> go.Figure:
+) -> "go.Figure":
     """
     Render asset correlation matrix heatmap.
     
@@ -220,13 +354,14 @@ def render_correlation_matrix(
     Returns:
         Plotly figure
     """
+    import plotly.graph_objects as go
+    
     if prices.shape[1] < 2:
         st.info("Need at least 2 assets for correlation analysis")
         return None
     
     # Calculate correlation
-    returns = prices.pct_change().dropna()
-    corr = returns.corr()
+    corr = _returns_correlation(prices)
     
     # Create heatmap
     fig = go.Figure(data=go.Heatmap(
@@ -236,8 +371,7 @@ def render_correlation_matrix(
         colorscale='RdBu',
         zmin=-1,
         zmax=1,
-        text=np.round(corr.values, 2),
-        texttemplate="%{text}",
+        texttemplate="%{z:.2f}",
         textfont={"size": 11},
         showscale=True,
         colorbar=dict(title="Correlation"),
@@ -259,7 +393,7 @@ def render_allocation_pie(
     weights: Dict[str, float],
     title: str = "Portfolio Allocation",
     height: int = 400,
-) -> go.Figure:
+) -> "go.Figure":
     """
     Render portfolio allocation pie chart.
     
@@ -271,6 +405,8 @@ def render_allocation_pie(
     Returns:
         Plotly figure
     """
+    import plotly.graph_objects as go
+    
     # Filter out zero weights
     weights = {k: v for k, v in weights.items() if v > 0}
     
@@ -317,10 +453,20 @@ def render_trade_history(
         st.info("No trades recorded")
         return
     
-    df = pd.DataFrame(trades)
+    # st.dataframe 内部按 Arrow 序列化；直接构建 Arrow 表可省去 pandas 的逐行类型推断和再转换
+    try:
+        import pyarrow as pa
+    except ImportError:
+        table = pd.DataFrame(trades)
+    else:
+        try:
+            table = pa.Table.from_pylist(trades)
+        except pa.ArrowException:
+            # 同一列类型不一致（如 date 混有字符串和日期）时 Arrow 无法推断，交给 pandas 处理
+            table = pd.DataFrame(trades)
     
     st.dataframe(
-        df,
+        table,
         width="stretch",
         height=height,
         column_config={
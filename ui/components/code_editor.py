@@ -3,8 +3,15 @@ Code editor component using streamlit-ace.
 Provides Python code editing with syntax highlighting.
 """
 
+import hashlib
+
 import streamlit as st
-from typing import Optional, Callable
+from typing import Optional, Callable, Mapping
+
+
+def _content_key(code: str) -> str:
+    """Stable short digest of code, used in widget keys (hash() is salted per process)."""
+    return hashlib.blake2b(code.encode('utf-8'), digest_size=8).hexdigest()
 
 
 def render_code_editor(
@@ -76,7 +83,7 @@ def render_code_editor_with_toolbar(
     default_code: str = "",
     key: str = "code_editor_toolbar",
     height: int = 400,
-    templates: dict = None,
+    templates: Optional[Mapping[str, str]] = None,
 ) -> str:
     """
     Render code editor with toolbar for templates and actions.
@@ -85,7 +92,7 @@ def render_code_editor_with_toolbar(
         default_code: Initial code
         key: Component key
         height: Editor height
-        templates: Dictionary of template name -> code
+        templates: Mapping of template name -> code
         
     Returns:
         Current code content
@@ -106,7 +113,7 @@ def render_code_editor_with_toolbar(
     
     with col1:
         if templates:
-            template_names = ["选择模板..."] + list(templates.keys())
+            template_names = ("选择模板...", *templates)
             selected_template = st.selectbox(
                 "策略模板",
                 template_names,
@@ -116,11 +123,13 @@ def render_code_editor_with_toolbar(
             
             if selected_template != "选择模板..." and selected_template in templates:
                 if st.session_state.get(f"{key}_last_template") != selected_template:
-                    st.session_state[state_key] = templates[selected_template]
                     st.session_state[f"{key}_last_template"] = selected_template
-                    # Increment version to force editor re-render with new key
-                    st.session_state[editor_version_key] += 1
-                    st.rerun()
+                    # 内容未变时不重建编辑器（换 key 会让 ACE 重新初始化）
+                    if st.session_state[state_key] != templates[selected_template]:
+                        st.session_state[state_key] = templates[selected_template]
+                        # Increment version to force editor re-render with new key
+                        st.session_state[editor_version_key] += 1
+                        st.rerun()
     
     with col2:
         theme_options = {
@@ -148,7 +157,7 @@ def render_code_editor_with_toolbar(
         )
     
     with col4:
-        if st.button("🗑️ 清空", key=f"{key}_clear", width="stretch"):
+        if st.button("🗑️ 清空", key=f"{key}_clear", width="stretch") and st.session_state[state_key]:
             st.session_state[state_key] = ""
             # Increment version to force editor re-render
             st.session_state[editor_version_key] += 1
@@ -191,7 +200,7 @@ def render_code_viewer(
     
     render_code_editor(
         default_code=code,
-        key=f"viewer_{hash(code)}",
+        key=f"viewer_{_content_key(code)}",
         height=height,
         language=language,
         readonly=True,
@@ -251,7 +251,7 @@ def render_portfolio_editor(manager: PortfolioManager, portfolio_name: str):
                 with st.spinner(f"正在验证并添加 {normalized}..."):
                     is_valid, message, _ = validate_ticker(new_ticker, selected_market)
                     if is_valid:
-                        portfolio.tickers.append(normalized)
+                        portfolio.tickers = portfolio.tickers + (normalized,)
                         portfolio.weights[normalized] = new_weight
                         manager.update(portfolio)
                         st.success(f"已添加 {normalized}")
@@ -298,7 +298,7 @@ def render_portfolio_editor(manager: PortfolioManager, portfolio_name: str):
             col_idx = i % 6
             with cols[col_idx]:
                 if st.button(f"🗑️ {ticker}", key=f"del_{ticker}", width="stretch"):
-                    portfolio.tickers.remove(ticker)
+                    portfolio.tickers = tuple(t for t in portfolio.tickers if t != ticker)
                     if ticker in portfolio.weights:
                         del portfolio.weights[ticker]
                     manager.update(portfolio)
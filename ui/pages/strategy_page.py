@@ -351,6 +351,13 @@ ma20 = ctx.ma('IWY', 20)    # 简单均线
 ema20 = ctx.ema('IWY', 20)  # 指数均线
 ```
 
+### 批量计算（全部标的）
+```python
+ma50_all = ctx.ma_all(50)   # DataFrame，每列一个标的
+rsi_all = ctx.rsi_all(14)
+above = [t for t in ctx.tickers if ctx.current_price(t) > ma50_all[t].iloc[-1]]
+```
+
 ### 动量/波动
 ```python
 rsi = ctx.rsi('IWY', 14)